@@ -0,0 +1,58 @@
+/*
+ * See the NOTICE file distributed with this work for additional
+ * information regarding copyright ownership.
+ *
+ * This program is free software: you can redistribute it and/or modify
+ * it under the terms of the GNU Affero General Public License as published by
+ * the Free Software Foundation, either version 3 of the License, or
+ * (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU Affero General Public License for more details.
+ *
+ * You should have received a copy of the GNU Affero General Public License
+ * along with this program.  If not, see http://www.gnu.org/licenses/
+ */
+package org.phenotips.test.deployment.rest;
+
+import org.phenotips.data.rest.PatientResource;
+import org.phenotips.rest.ParentResource;
+
+import org.xwiki.stability.Unstable;
+
+import javax.ws.rs.GET;
+import javax.ws.rs.Path;
+import javax.ws.rs.PathParam;
+import javax.ws.rs.Produces;
+import javax.ws.rs.core.MediaType;
+import javax.ws.rs.core.Response;
+
+/**
+ * Status of a patient reindexing job, see {@link PatientReindexResource#reindexPatients(String)}. Needed because
+ * reindexing all the patients of a big instance takes too long to wait for the end of it in a single request.
+ *
+ * @version $Id$
+ * @since 1.2
+ */
+@Unstable("New API introduced in 1.2")
+@Path("/patients/reindex/jobs/{job-id}")
+@ParentResource(PatientResource.class)
+public interface PatientReindexJobResource
+{
+    /**
+     * Status of a reindexing job.
+     *
+     * @param jobId the identifier of the job, as returned when the job was started
+     * @return a response with a JSON object with the {@code id} of the job, its {@code state} (one of
+     *         {@code waiting}, {@code running}, {@code finished} and {@code failed}), the {@code total} number of
+     *         patients to reindex, the number of {@code indexed} patients, the identifiers of the {@code failed}
+     *         patients, the {@code started} and {@code finished} times in milliseconds since the epoch, the
+     *         {@code rate} of reindexing in patients per second and the estimated number of seconds left
+     *         ({@code eta}, {@code -1} if unknown); or a 404 response if there is no such recent job
+     */
+    @GET
+    @Produces(MediaType.APPLICATION_JSON)
+    Response getReindexJobStatus(@PathParam("job-id") String jobId);
+}
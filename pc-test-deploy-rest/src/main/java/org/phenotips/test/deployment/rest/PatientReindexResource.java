@@ -22,7 +22,9 @@
 
 import org.xwiki.stability.Unstable;
 
+import javax.ws.rs.Consumes;
 import javax.ws.rs.GET;
+import javax.ws.rs.POST;
 import javax.ws.rs.Path;
 import javax.ws.rs.Produces;
 import javax.ws.rs.core.MediaType;
@@ -47,4 +49,20 @@
     @GET
     @Produces(MediaType.APPLICATION_JSON)
     Response reindexPatients();
+
+    /**
+     * Reindex some patients: either the patients listed in the {@code ids} array of the request, or all the patients
+     * modified since the {@code modifiedSince} time (in milliseconds since the epoch) of the request. If {@code async}
+     * is {@code true} in the request, patients are reindexed by a background job, and the progress can be followed
+     * using the {@link PatientReindexJobResource}; in this case, if neither {@code ids} nor {@code modifiedSince} are
+     * given, all the patients are reindexed.
+     *
+     * @param json the request, a JSON object with either {@code ids} or {@code modifiedSince}, and {@code async}
+     * @return a response with the reindexing status, see {@link PatientReindexJobResource#getReindexJobStatus(String)}
+     * @since 1.2
+     */
+    @POST
+    @Consumes(MediaType.APPLICATION_JSON)
+    @Produces(MediaType.APPLICATION_JSON)
+    Response reindexPatients(String json);
 }
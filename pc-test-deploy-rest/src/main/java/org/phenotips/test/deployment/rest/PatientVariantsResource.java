@@ -0,0 +1,59 @@
+/*
+ * See the NOTICE file distributed with this work for additional
+ * information regarding copyright ownership.
+ *
+ * This program is free software: you can redistribute it and/or modify
+ * it under the terms of the GNU Affero General Public License as published by
+ * the Free Software Foundation, either version 3 of the License, or
+ * (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU Affero General Public License for more details.
+ *
+ * You should have received a copy of the GNU Affero General Public License
+ * along with this program.  If not, see http://www.gnu.org/licenses/
+ */
+package org.phenotips.test.deployment.rest;
+
+import org.phenotips.data.rest.PatientResource;
+import org.phenotips.rest.ParentResource;
+
+import org.xwiki.stability.Unstable;
+
+import java.io.InputStream;
+
+import javax.ws.rs.Consumes;
+import javax.ws.rs.PUT;
+import javax.ws.rs.Path;
+import javax.ws.rs.PathParam;
+import javax.ws.rs.Produces;
+import javax.ws.rs.core.MediaType;
+import javax.ws.rs.core.Response;
+
+/**
+ * Stores the processed VCF (Exomiser output) file of a patient, where the variant store of the instance expects it.
+ * Needed because test datasets can only be loaded remotely, while processed VCF files are normally placed in the data
+ * directory by the Exomiser.
+ *
+ * @version $Id$
+ * @since 1.2
+ */
+@Unstable("New API introduced in 1.2")
+@Path("/patients/{patient-id}/variants")
+@ParentResource(PatientResource.class)
+public interface PatientVariantsResource
+{
+    /**
+     * Replaces the processed VCF file of the patient with the request body, which is streamed to the disk.
+     *
+     * @param patientId the identifier of the patient
+     * @param variants the content of the processed VCF file
+     * @return a response with a JSON object containing the {@code size} of the stored file
+     */
+    @PUT
+    @Consumes({ MediaType.TEXT_PLAIN, MediaType.APPLICATION_OCTET_STREAM })
+    @Produces(MediaType.APPLICATION_JSON)
+    Response uploadVariants(@PathParam("patient-id") String patientId, InputStream variants);
+}
@@ -0,0 +1,151 @@
+/*
+ * See the NOTICE file distributed with this work for additional
+ * information regarding copyright ownership.
+ *
+ * This program is free software: you can redistribute it and/or modify
+ * it under the terms of the GNU Affero General Public License as published by
+ * the Free Software Foundation, either version 3 of the License, or
+ * (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU Affero General Public License for more details.
+ *
+ * You should have received a copy of the GNU Affero General Public License
+ * along with this program.  If not, see http://www.gnu.org/licenses/
+ */
+package org.phenotips.test.deployment.rest.internal;
+
+import org.phenotips.consents.ConsentManager;
+import org.phenotips.data.Patient;
+import org.phenotips.data.PatientRepository;
+import org.phenotips.test.deployment.rest.PatientImportResource;
+
+import org.xwiki.component.annotation.Component;
+import org.xwiki.model.reference.WikiReference;
+import org.xwiki.rest.XWikiResource;
+import org.xwiki.security.authorization.ContextualAuthorizationManager;
+import org.xwiki.security.authorization.Right;
+
+import java.util.LinkedList;
+import java.util.List;
+
+import javax.inject.Inject;
+import javax.inject.Named;
+import javax.inject.Singleton;
+import javax.ws.rs.core.MediaType;
+import javax.ws.rs.core.Response;
+
+import org.json.JSONArray;
+import org.json.JSONException;
+import org.json.JSONObject;
+
+import com.xpn.xwiki.XWiki;
+import com.xpn.xwiki.XWikiContext;
+
+/**
+ * Default implementation of the {@link PatientImportResource}.
+ *
+ * @version $Id$
+ * @since 1.2
+ */
+@Component
+@Named("org.phenotips.test.deployment.rest.internal.DefaultPatientImportResource")
+@Singleton
+public class DefaultPatientImportResource extends XWikiResource implements PatientImportResource
+{
+    private static final String PATIENTS = "patients";
+
+    private static final String CONSENTS = "consents";
+
+    private static final String ERROR = "error";
+
+    private static final String ID = "id";
+
+    @Inject
+    private PatientRepository repository;
+
+    @Inject
+    private ConsentManager consentManager;
+
+    @Inject
+    private ContextualAuthorizationManager access;
+
+    @Override
+    public Response importPatients(String json)
+    {
+        if (!this.access.hasAccess(Right.ADMIN, new WikiReference(getXWikiContext().getWikiId()))) {
+            return Response.status(Response.Status.FORBIDDEN).build();
+        }
+
+        JSONArray patients;
+        List<String> consents = new LinkedList<>();
+        try {
+            JSONObject request = new JSONObject(json);
+            patients = request.getJSONArray(PATIENTS);
+            JSONArray requestedConsents = request.optJSONArray(CONSENTS);
+            if (requestedConsents != null) {
+                for (int i = 0; i < requestedConsents.length(); i++) {
+                    consents.add(requestedConsents.getString(i));
+                }
+            }
+        } catch (final JSONException e) {
+            this.slf4Jlogger.error("Invalid patient import request: {}", e.getMessage());
+            return Response.status(Response.Status.BAD_REQUEST).build();
+        }
+
+        JSONArray results = new JSONArray();
+        for (int i = 0; i < patients.length(); i++) {
+            results.put(importPatient(patients.optJSONObject(i), consents));
+        }
+
+        JSONObject response = new JSONObject();
+        response.put(PATIENTS, results);
+        return Response.ok(response.toString(), MediaType.APPLICATION_JSON_TYPE).build();
+    }
+
+    private JSONObject importPatient(JSONObject patientJSON, List<String> consents)
+    {
+        JSONObject result = new JSONObject();
+        if (patientJSON == null) {
+            result.put(ERROR, "not a JSON object");
+            return result;
+        }
+        Patient patient = null;
+        try {
+            patient = this.repository.create();
+            if (patient == null) {
+                result.put(ERROR, "failed to create a new patient");
+                return result;
+            }
+            result.put(ID, patient.getId());
+            patient.updateFromJSON(patientJSON);
+            // same as assigning consents via the consents REST resource: patients are still created on
+            // instances which do not have all (or any) of the requested consents configured
+            result.put(CONSENTS, this.consentManager.setPatientConsents(patient, consents));
+        } catch (final Exception e) {
+            this.slf4Jlogger.error("Error while importing patient: {}", e.getMessage(), e);
+            result.put(ERROR, String.valueOf(e.getMessage()));
+            // failed imports should not leave empty patients behind; if deleting fails as well,
+            // the id stays in the result, so that the partially imported patient can be found
+            if (patient != null) {
+                deletePatient(patient, result);
+            }
+        }
+        return result;
+    }
+
+    private void deletePatient(Patient patient, JSONObject result)
+    {
+        try {
+            XWikiContext context = getXWikiContext();
+            XWiki xwiki = context.getWiki();
+            xwiki.deleteDocument(xwiki.getDocument(patient.getDocument(), context), context);
+            result.remove(ID);
+        } catch (final Exception e) {
+            this.slf4Jlogger.error("Failed to delete the partially imported patient {}: {}", patient.getId(),
+                e.getMessage(), e);
+        }
+    }
+}
@@ -21,13 +21,22 @@
 import org.phenotips.test.deployment.rest.PatientReindexResource;
 
 import org.xwiki.component.annotation.Component;
+import org.xwiki.query.QueryException;
 import org.xwiki.rest.XWikiResource;
 
+import java.util.ArrayList;
+import java.util.List;
+
 import javax.inject.Inject;
 import javax.inject.Named;
 import javax.inject.Singleton;
+import javax.ws.rs.core.MediaType;
 import javax.ws.rs.core.Response;
 
+import org.json.JSONArray;
+import org.json.JSONException;
+import org.json.JSONObject;
+
 
 /**
  * Default implementation of the {@link PatientReindexResource}.
@@ -40,9 +49,16 @@
 @Singleton
 public class DefaultPatientReindexResource extends XWikiResource implements PatientReindexResource
 {
+    private static final String IDS = "ids";
+
+    private static final String MODIFIED_SINCE = "modifiedSince";
+
     @Inject
     private PatientIndexer indexer;
 
+    @Inject
+    private PatientReindexer reindexer;
+
     @Override
     public Response reindexPatients()
     {
@@ -54,4 +70,44 @@ public Response reindexPatients()
             return Response.status(Response.Status.BAD_REQUEST).build();
         }
     }
+
+    @Override
+    public Response reindexPatients(String json)
+    {
+        List<String> patientIds = null;
+        boolean async;
+        try {
+            JSONObject request = new JSONObject(json);
+            async = request.optBoolean("async", false);
+            if (request.has(IDS)) {
+                JSONArray ids = request.getJSONArray(IDS);
+                patientIds = new ArrayList<>(ids.length());
+                for (int i = 0; i < ids.length(); i++) {
+                    patientIds.add(ids.getString(i));
+                }
+            } else if (request.has(MODIFIED_SINCE)) {
+                patientIds = this.reindexer.getPatientIds(request.getLong(MODIFIED_SINCE));
+            } else if (!async) {
+                // reindexing all patients synchronously is done by the GET request
+                return Response.status(Response.Status.BAD_REQUEST).build();
+            }
+        } catch (final JSONException e) {
+            this.slf4Jlogger.error("Invalid reindex request: {}", e.getMessage());
+            return Response.status(Response.Status.BAD_REQUEST).build();
+        } catch (final QueryException e) {
+            this.slf4Jlogger.error("Error while listing patients to reindex: {}", e.getMessage(), e);
+            return Response.status(Response.Status.INTERNAL_SERVER_ERROR).build();
+        }
+
+        PatientReindexStatus status;
+        if (async && patientIds == null) {
+            status = this.reindexer.reindexAllInBackground();
+        } else if (async) {
+            status = this.reindexer.reindexInBackground(patientIds);
+        } else {
+            status = this.reindexer.reindex(patientIds);
+        }
+        return Response.status(async ? Response.Status.ACCEPTED : Response.Status.OK)
+            .entity(status.toJSON().toString()).type(MediaType.APPLICATION_JSON_TYPE).build();
+    }
 }
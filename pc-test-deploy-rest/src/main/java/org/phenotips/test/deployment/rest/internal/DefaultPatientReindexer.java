@@ -0,0 +1,216 @@
+/*
+ * See the NOTICE file distributed with this work for additional
+ * information regarding copyright ownership.
+ *
+ * This program is free software: you can redistribute it and/or modify
+ * it under the terms of the GNU Affero General Public License as published by
+ * the Free Software Foundation, either version 3 of the License, or
+ * (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU Affero General Public License for more details.
+ *
+ * You should have received a copy of the GNU Affero General Public License
+ * along with this program.  If not, see http://www.gnu.org/licenses/
+ */
+package org.phenotips.test.deployment.rest.internal;
+
+import org.phenotips.data.Patient;
+import org.phenotips.data.PatientRepository;
+import org.phenotips.data.indexing.PatientIndexer;
+
+import org.xwiki.component.annotation.Component;
+import org.xwiki.component.manager.ComponentLifecycleException;
+import org.xwiki.component.phase.Disposable;
+import org.xwiki.context.Execution;
+import org.xwiki.context.ExecutionContext;
+import org.xwiki.context.ExecutionContextManager;
+import org.xwiki.query.Query;
+import org.xwiki.query.QueryException;
+import org.xwiki.query.QueryManager;
+
+import java.util.Collection;
+import java.util.Collections;
+import java.util.Date;
+import java.util.LinkedHashMap;
+import java.util.List;
+import java.util.Map;
+import java.util.UUID;
+import java.util.concurrent.ExecutorService;
+import java.util.concurrent.Executors;
+
+import javax.inject.Inject;
+import javax.inject.Singleton;
+
+import org.slf4j.Logger;
+
+/**
+ * Default implementation of the {@link PatientReindexer}: background jobs are run by a single thread, one job after
+ * the other, and the status of the latest {@link #MAX_KEPT_JOBS} jobs is kept.
+ *
+ * @version $Id$
+ * @since 1.2
+ */
+@Component
+@Singleton
+public class DefaultPatientReindexer implements PatientReindexer, Disposable
+{
+    private static final String PATIENTS_QUERY = "select doc.name from Document doc, doc.object(PhenoTips.PatientClass)"
+        + " as patient where doc.name <> 'PatientTemplate'";
+
+    private static final String MODIFIED_SINCE = "modifiedSince";
+
+    private static final int MAX_KEPT_JOBS = 20;
+
+    @Inject
+    private Logger logger;
+
+    @Inject
+    private PatientRepository repository;
+
+    @Inject
+    private PatientIndexer indexer;
+
+    @Inject
+    private QueryManager queryManager;
+
+    @Inject
+    private Execution execution;
+
+    @Inject
+    private ExecutionContextManager executionContextManager;
+
+    private final ExecutorService executor = Executors.newSingleThreadExecutor();
+
+    private final Map<String, PatientReindexStatus> jobs =
+        Collections.synchronizedMap(new LinkedHashMap<String, PatientReindexStatus>()
+        {
+            private static final long serialVersionUID = 1L;
+
+            @Override
+            protected boolean removeEldestEntry(Map.Entry<String, PatientReindexStatus> eldest)
+            {
+                return size() > MAX_KEPT_JOBS;
+            }
+        });
+
+    private volatile PatientReindexStatus status;
+
+    @Override
+    public List<String> getPatientIds(Long modifiedSince) throws QueryException
+    {
+        Query query;
+        if (modifiedSince == null) {
+            query = this.queryManager.createQuery(PATIENTS_QUERY, Query.XWQL);
+        } else {
+            query = this.queryManager.createQuery(PATIENTS_QUERY + " and doc.date >= :" + MODIFIED_SINCE, Query.XWQL);
+            query.bindValue(MODIFIED_SINCE, new Date(modifiedSince));
+        }
+        return query.execute();
+    }
+
+    @Override
+    public PatientReindexStatus reindex(Collection<String> patientIds)
+    {
+        PatientReindexStatus newStatus = createStatus(patientIds);
+        reindex(newStatus);
+        return newStatus;
+    }
+
+    @Override
+    public PatientReindexStatus reindexInBackground(Collection<String> patientIds)
+    {
+        final PatientReindexStatus newStatus = createStatus(patientIds);
+        this.executor.submit(new Runnable()
+        {
+            @Override
+            public void run()
+            {
+                reindexInNewContext(newStatus, false);
+            }
+        });
+        return newStatus;
+    }
+
+    @Override
+    public PatientReindexStatus reindexAllInBackground()
+    {
+        // the patients are listed when the job starts, the total is only known from then on
+        final PatientReindexStatus newStatus = createStatus(Collections.<String>emptyList());
+        this.executor.submit(new Runnable()
+        {
+            @Override
+            public void run()
+            {
+                reindexInNewContext(newStatus, true);
+            }
+        });
+        return newStatus;
+    }
+
+    @Override
+    public PatientReindexStatus getStatus()
+    {
+        return this.status;
+    }
+
+    @Override
+    public PatientReindexStatus getStatus(String jobId)
+    {
+        return this.jobs.get(jobId);
+    }
+
+    @Override
+    public void dispose() throws ComponentLifecycleException
+    {
+        this.executor.shutdownNow();
+    }
+
+    private PatientReindexStatus createStatus(Collection<String> patientIds)
+    {
+        PatientReindexStatus newStatus = new PatientReindexStatus(UUID.randomUUID().toString(), patientIds);
+        this.jobs.put(newStatus.getId(), newStatus);
+        this.status = newStatus;
+        return newStatus;
+    }
+
+    private void reindexInNewContext(PatientReindexStatus reindexStatus, boolean allPatients)
+    {
+        try {
+            // background threads don't have an execution context, and patients can't be loaded without one
+            this.executionContextManager.initialize(new ExecutionContext());
+            if (allPatients) {
+                reindexStatus.setPatientIds(getPatientIds(null));
+            }
+            reindex(reindexStatus);
+        } catch (final Exception e) {
+            // whatever goes wrong, the job must end as failed, otherwise clients wait for it until they time out
+            this.logger.error("Failed to reindex patients: {}", e.getMessage(), e);
+            reindexStatus.fail();
+        } finally {
+            this.execution.removeContext();
+        }
+    }
+
+    private void reindex(PatientReindexStatus reindexStatus)
+    {
+        reindexStatus.start();
+        for (String patientId : reindexStatus.getPatientIds()) {
+            try {
+                Patient patient = this.repository.get(patientId);
+                if (patient == null) {
+                    reindexStatus.failed(patientId);
+                    continue;
+                }
+                this.indexer.index(patient);
+                reindexStatus.indexed();
+            } catch (final Exception e) {
+                this.logger.error("Error while reindexing patient {}: {}", patientId, e.getMessage());
+                reindexStatus.failed(patientId);
+            }
+        }
+        reindexStatus.finish();
+    }
+}
@@ -0,0 +1,115 @@
+/*
+ * See the NOTICE file distributed with this work for additional
+ * information regarding copyright ownership.
+ *
+ * This program is free software: you can redistribute it and/or modify
+ * it under the terms of the GNU Affero General Public License as published by
+ * the Free Software Foundation, either version 3 of the License, or
+ * (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU Affero General Public License for more details.
+ *
+ * You should have received a copy of the GNU Affero General Public License
+ * along with this program.  If not, see http://www.gnu.org/licenses/
+ */
+package org.phenotips.test.deployment.rest.internal;
+
+import org.phenotips.data.Patient;
+import org.phenotips.data.PatientRepository;
+import org.phenotips.test.deployment.rest.PatientVariantsResource;
+
+import org.xwiki.component.annotation.Component;
+import org.xwiki.environment.Environment;
+import org.xwiki.model.reference.WikiReference;
+import org.xwiki.rest.XWikiResource;
+import org.xwiki.security.authorization.ContextualAuthorizationManager;
+import org.xwiki.security.authorization.Right;
+
+import java.io.File;
+import java.io.IOException;
+import java.io.InputStream;
+import java.nio.file.Files;
+import java.nio.file.Path;
+import java.nio.file.StandardCopyOption;
+
+import javax.inject.Inject;
+import javax.inject.Named;
+import javax.inject.Singleton;
+import javax.ws.rs.core.MediaType;
+import javax.ws.rs.core.Response;
+
+import org.json.JSONObject;
+
+/**
+ * Default implementation of the {@link PatientVariantsResource}.
+ *
+ * @version $Id$
+ * @since 1.2
+ */
+@Component
+@Named("org.phenotips.test.deployment.rest.internal.DefaultPatientVariantsResource")
+@Singleton
+public class DefaultPatientVariantsResource extends XWikiResource implements PatientVariantsResource
+{
+    /** The directory, relative to the permanent directory, where processed VCF files are read from. */
+    private static final String VARIANTS_DIRECTORY = "exomiser";
+
+    private static final String VARIANTS_FILE_SUFFIX = ".variants.tsv";
+
+    @Inject
+    private PatientRepository repository;
+
+    @Inject
+    private Environment environment;
+
+    @Inject
+    private ContextualAuthorizationManager access;
+
+    @Override
+    public Response uploadVariants(String patientId, InputStream variants)
+    {
+        if (!this.access.hasAccess(Right.ADMIN, new WikiReference(getXWikiContext().getWikiId()))) {
+            return Response.status(Response.Status.FORBIDDEN).build();
+        }
+
+        // only existing patient identifiers are used in file names
+        Patient patient = this.repository.get(patientId);
+        if (patient == null) {
+            return Response.status(Response.Status.NOT_FOUND).build();
+        }
+
+        File directory = new File(this.environment.getPermanentDirectory(), VARIANTS_DIRECTORY);
+        Path target = new File(directory, patient.getId() + VARIANTS_FILE_SUFFIX).toPath();
+        Path temporary = null;
+        try {
+            Files.createDirectories(directory.toPath());
+            // written next to the target and then moved, so that a partially uploaded file is never read
+            temporary = Files.createTempFile(directory.toPath(), patient.getId(), ".tmp");
+            long size = Files.copy(variants, temporary, StandardCopyOption.REPLACE_EXISTING);
+            Files.move(temporary, target, StandardCopyOption.REPLACE_EXISTING, StandardCopyOption.ATOMIC_MOVE);
+
+            JSONObject response = new JSONObject();
+            response.put("size", size);
+            return Response.ok(response.toString(), MediaType.APPLICATION_JSON_TYPE).build();
+        } catch (final IOException e) {
+            this.slf4Jlogger.error("Error while storing variants of patient {}: {}", patientId, e.getMessage(), e);
+            deleteQuietly(temporary);
+            return Response.status(Response.Status.INTERNAL_SERVER_ERROR).build();
+        }
+    }
+
+    private void deleteQuietly(Path file)
+    {
+        if (file == null) {
+            return;
+        }
+        try {
+            Files.deleteIfExists(file);
+        } catch (final IOException e) {
+            this.slf4Jlogger.warn("Failed to delete temporary file {}: {}", file, e.getMessage());
+        }
+    }
+}
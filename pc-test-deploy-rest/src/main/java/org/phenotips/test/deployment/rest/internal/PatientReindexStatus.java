@@ -0,0 +1,207 @@
+/*
+ * See the NOTICE file distributed with this work for additional
+ * information regarding copyright ownership.
+ *
+ * This program is free software: you can redistribute it and/or modify
+ * it under the terms of the GNU Affero General Public License as published by
+ * the Free Software Foundation, either version 3 of the License, or
+ * (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU Affero General Public License for more details.
+ *
+ * You should have received a copy of the GNU Affero General Public License
+ * along with this program.  If not, see http://www.gnu.org/licenses/
+ */
+package org.phenotips.test.deployment.rest.internal;
+
+import java.util.ArrayList;
+import java.util.Collection;
+import java.util.Collections;
+import java.util.List;
+import java.util.Locale;
+import java.util.concurrent.atomic.AtomicInteger;
+
+import org.json.JSONArray;
+import org.json.JSONObject;
+
+/**
+ * Status of a reindexing job, updated by the thread doing the reindexing and read by REST requests.
+ *
+ * @version $Id$
+ * @since 1.2
+ */
+public class PatientReindexStatus
+{
+    /** The possible states of the reindexing. */
+    public enum State
+    {
+        /** Not started yet. */
+        WAITING,
+        /** Being reindexed. */
+        RUNNING,
+        /** All the patients were processed, successfully or not. */
+        FINISHED,
+        /** The reindexing could not be done at all. */
+        FAILED
+    }
+
+    private static final double MILLISECONDS_PER_SECOND = 1000.0;
+
+    private final String id;
+
+    private volatile List<String> patientIds;
+
+    private final List<String> failed = Collections.synchronizedList(new ArrayList<String>());
+
+    private volatile State state = State.WAITING;
+
+    private final AtomicInteger indexed = new AtomicInteger();
+
+    private volatile long started;
+
+    private volatile long finished;
+
+    /**
+     * Simple constructor.
+     *
+     * @param id the identifier of the reindexing job
+     * @param patientIds the identifiers of the patients to reindex
+     */
+    public PatientReindexStatus(String id, Collection<String> patientIds)
+    {
+        this.id = id;
+        this.patientIds = Collections.unmodifiableList(new ArrayList<>(patientIds));
+    }
+
+    /**
+     * @return the identifier of the reindexing job
+     */
+    public String getId()
+    {
+        return this.id;
+    }
+
+    /**
+     * @return the identifiers of the patients to reindex
+     */
+    public List<String> getPatientIds()
+    {
+        return this.patientIds;
+    }
+
+    /**
+     * Sets the patients to reindex, for jobs where they are only known right before the reindexing starts.
+     *
+     * @param patientIds the identifiers of the patients to reindex
+     */
+    public void setPatientIds(Collection<String> patientIds)
+    {
+        this.patientIds = Collections.unmodifiableList(new ArrayList<>(patientIds));
+    }
+
+    /**
+     * @return the current state
+     */
+    public State getState()
+    {
+        return this.state;
+    }
+
+    /** Marks the reindexing as started. */
+    public void start()
+    {
+        this.started = System.currentTimeMillis();
+        this.state = State.RUNNING;
+    }
+
+    /** Records that a patient was reindexed. */
+    public void indexed()
+    {
+        this.indexed.incrementAndGet();
+    }
+
+    /**
+     * Records that a patient could not be reindexed.
+     *
+     * @param patientId the identifier of the patient
+     */
+    public void failed(String patientId)
+    {
+        this.failed.add(patientId);
+    }
+
+    /** Marks the reindexing as finished. */
+    public void finish()
+    {
+        this.finished = System.currentTimeMillis();
+        this.state = State.FINISHED;
+    }
+
+    /** Marks the reindexing as failed. */
+    public void fail()
+    {
+        this.finished = System.currentTimeMillis();
+        this.state = State.FAILED;
+    }
+
+    /**
+     * @return the number of patients processed (successfully or not) per second since the reindexing started, or
+     *         {@code 0} if it did not start yet
+     */
+    public double getRate()
+    {
+        if (this.started == 0) {
+            return 0;
+        }
+        long end = this.finished > 0 ? this.finished : System.currentTimeMillis();
+        return getProcessed() * MILLISECONDS_PER_SECOND / Math.max(1, end - this.started);
+    }
+
+    /**
+     * @return the estimated number of seconds until all the patients are processed, at the current rate, or
+     *         {@code -1} if it cannot be estimated yet
+     */
+    public long getEstimatedSecondsLeft()
+    {
+        if (this.state == State.FINISHED || this.state == State.FAILED) {
+            return 0;
+        }
+        double rate = getRate();
+        if (rate <= 0) {
+            return -1;
+        }
+        return Math.round((this.patientIds.size() - getProcessed()) / rate);
+    }
+
+    private int getProcessed()
+    {
+        return this.indexed.get() + this.failed.size();
+    }
+
+    /**
+     * @return the status as a JSON object, see the {@code PatientReindexStatusResource}
+     */
+    public JSONObject toJSON()
+    {
+        JSONObject result = new JSONObject();
+        result.put("id", this.id);
+        result.put("state", this.state.name().toLowerCase(Locale.ROOT));
+        result.put("total", this.patientIds.size());
+        result.put("indexed", this.indexed.get());
+        synchronized (this.failed) {
+            result.put("failed", new JSONArray(this.failed));
+        }
+        if (this.started > 0) {
+            result.put("started", this.started);
+        }
+        if (this.finished > 0) {
+            result.put("finished", this.finished);
+        }
+        result.put("rate", getRate());
+        result.put("eta", getEstimatedSecondsLeft());
+        return result;
+    }
+}
@@ -0,0 +1,79 @@
+/*
+ * See the NOTICE file distributed with this work for additional
+ * information regarding copyright ownership.
+ *
+ * This program is free software: you can redistribute it and/or modify
+ * it under the terms of the GNU Affero General Public License as published by
+ * the Free Software Foundation, either version 3 of the License, or
+ * (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU Affero General Public License for more details.
+ *
+ * You should have received a copy of the GNU Affero General Public License
+ * along with this program.  If not, see http://www.gnu.org/licenses/
+ */
+package org.phenotips.test.deployment.rest.internal;
+
+import org.xwiki.component.annotation.Role;
+import org.xwiki.query.QueryException;
+
+import java.util.Collection;
+import java.util.List;
+
+/**
+ * Reindexes patients, either in the calling thread or as a background job, and keeps the status of the recent
+ * reindexing jobs.
+ *
+ * @version $Id$
+ * @since 1.2
+ */
+@Role
+public interface PatientReindexer
+{
+    /**
+     * Lists patients.
+     *
+     * @param modifiedSince if not {@code null}, only list patients modified at or after this time, in milliseconds
+     *            since the epoch
+     * @return the identifiers of the patients
+     * @throws QueryException if patients cannot be queried
+     */
+    List<String> getPatientIds(Long modifiedSince) throws QueryException;
+
+    /**
+     * Reindexes the patients in the calling thread.
+     *
+     * @param patientIds the identifiers of the patients to reindex
+     * @return the status of the reindexing, finished
+     */
+    PatientReindexStatus reindex(Collection<String> patientIds);
+
+    /**
+     * Starts a background job reindexing the patients, after any previously started job is finished.
+     *
+     * @param patientIds the identifiers of the patients to reindex
+     * @return the status of the job, updated as patients are reindexed
+     */
+    PatientReindexStatus reindexInBackground(Collection<String> patientIds);
+
+    /**
+     * Starts a background job reindexing all the patients, after any previously started job is finished.
+     *
+     * @return the status of the job, updated as patients are reindexed
+     */
+    PatientReindexStatus reindexAllInBackground();
+
+    /**
+     * @return the status of the latest started reindexing, or {@code null} if no reindexing was started
+     */
+    PatientReindexStatus getStatus();
+
+    /**
+     * @param jobId the identifier of a reindexing job
+     * @return the status of the job, or {@code null} if there is no such job, or it is not a recent one
+     */
+    PatientReindexStatus getStatus(String jobId);
+}
@@ -28,6 +28,8 @@
 import java.io.FileReader;
 import java.io.FileWriter;
 import java.io.IOException;
+import java.util.Collections;
+import java.util.List;
 
 import javax.inject.Inject;
 import javax.inject.Named;
@@ -188,20 +190,48 @@ public boolean deleteServer(String buildName)
      * @return true if the data was successfully loaded
      */
     public boolean loadTestData(String ip, String dataName)
+    {
+        if (StringUtils.isBlank(ip) || StringUtils.isBlank(dataName)) {
+            return false;
+        }
+        return loadTestData(Collections.singletonList(ip), Collections.singletonList(dataName));
+    }
+
+    /**
+     * Load each of the given test datasets to each of the server instances specified by IP, with a single run of the
+     * script, which authenticates to each server only once.
+     *
+     * @param ips the IP addresses of the servers to load data to
+     * @param dataNames names of the test data directories, loaded in the given order
+     * @return true if all the data was successfully loaded to all the servers
+     */
+    public boolean loadTestData(List<String> ips, List<String> dataNames)
     {
         try {
-            this.logger.error("Loading test data to VM with IP [{}]", ip);
+            this.logger.error("Loading test data {} to VMs with IPs {}", dataNames, ips);
 
-            if (StringUtils.isBlank(ip) || StringUtils.isBlank(dataName)) {
+            if (ips == null || ips.isEmpty() || dataNames == null || dataNames.isEmpty()) {
                 return false;
             }
 
-            String scriptArguments = " --action upload-dataset --ip " + ip + " --dataset-name " + dataName;
+            StringBuilder scriptArguments = new StringBuilder(" --action upload-dataset");
+            for (String ip : ips) {
+                if (StringUtils.isBlank(ip)) {
+                    return false;
+                }
+                scriptArguments.append(" --ip ").append(ip);
+            }
+            for (String dataName : dataNames) {
+                if (StringUtils.isBlank(dataName)) {
+                    return false;
+                }
+                scriptArguments.append(" --dataset-name ").append(dataName);
+            }
 
             // execute the script, expected return code is 0
-            return executeScript(this.scriptLoadDataFile, scriptArguments, 0);
+            return executeScript(this.scriptLoadDataFile, scriptArguments.toString(), 0);
         } catch (Exception ex) {
-            this.logger.error("Error loading test data [{}] to VM with IP [{}] : {}", dataName, ip, ex);
+            this.logger.error("Error loading test data {} to VMs with IPs {} : {}", dataNames, ips, ex);
         }
         return false;
     }
@@ -12,10 +12,25 @@ import sys
 import os
 import subprocess
 import logging
+import resource
 import shutil
+import socket
 import json
 import re
+import glob
+import stat
+import zipfile
+import zlib
+import hashlib
+import tarfile
+import time
+import threading
 import traceback
+import http.client
+import urllib.request
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from xml.etree import ElementTree
 from git import Repo
 from argparse import ArgumentParser
 from argparse import RawTextHelpFormatter
@@ -23,8 +38,45 @@ from argparse import RawTextHelpFormatter
 VM_METADATA_URL = "http://169.254.169.254/openstack/2017-02-22/meta_data.json"
 
 DEFAULT_GITHUB_FOLDER = "github"
+DEFAULT_GIT_CACHE_FOLDER = "git_cache"
+DEFAULT_GIT_CACHE_MAX_SIZE_MB = 4096
+DEFAULT_BUILD_CACHE_FOLDER = "build_cache"
+DEFAULT_BUILD_CACHE_MAX_SIZE_MB = 8192
+
+MAVEN_LOCAL_REPOSITORY = os.path.join(os.path.expanduser("~"), ".m2", "repository")
+BUILD_CACHE_MANIFEST_FILENAME = "manifest.json"
+
+# "properties" of the build instructions configuring the maven local repository snapshot
+MAVEN_SNAPSHOT_DIR_PROPERTY = "maven_repository_snapshot_dir"
+MAVEN_SNAPSHOT_MAX_DELTAS_PROPERTY = "maven_repository_snapshot_max_deltas"
+MAVEN_SNAPSHOT_MANIFEST_FILENAME = "snapshot.json"
+DEFAULT_MAVEN_SNAPSHOT_MAX_DELTAS = 5
+
+DEPLOY_METRICS_FILENAME = "deploy_metrics.json"
+
+# defaults for the "wait_for" run steps
+DEFAULT_WAIT_FOR_HOST = "localhost"
+DEFAULT_WAIT_FOR_TIMEOUT = 600
+DEFAULT_WAIT_FOR_EXPECTED_STATUS = [200]
+DEFAULT_WAIT_FOR_INITIAL_INTERVAL = 0.5
+DEFAULT_WAIT_FOR_MAX_INTERVAL = 10
+DEFAULT_WAIT_FOR_REQUEST_TIMEOUT = 10
 DEFAULT_DEPLOY_ROOT_FOLDER = "deploy"
 DEFAULT_BUILD_NAME = "default_build"
+# builds of independent repositories all install into the one local maven repository, which is not safe for
+# concurrent writes (maven-metadata-local.xml, _remote.repositories, partial downloads), so by default
+# repositories are built one at a time
+DEFAULT_BUILD_WORKERS = 1
+DEFAULT_CLONE_WORKERS = 4
+DEFAULT_CLONE_DEPTH = 1
+DEFAULT_UNZIP_WORKERS = 4
+
+# zip entries at least this big are extracted by the worker pool, smaller ones directly
+UNZIP_LARGE_ENTRY_SIZE = 1024 * 1024
+UNZIP_BUFFER_SIZE = 1024 * 1024
+
+# list of (path, size, hash) of all the files deployed into the build deployment directory
+DEPLOY_MANIFEST_FILENAME = ".deploy_manifest.json"
 
 def setup_folders(settings):
     # Wipe GitHub directory for a fresh checkout
@@ -38,12 +90,23 @@ def setup_folders(settings):
     if not os.path.isdir(settings.git_dir):
         os.mkdir(settings.git_dir)
 
+    # Git mirror cache and build cache are kept between deployments
+    if settings.use_git_cache and not os.path.isdir(settings.git_cache_dir):
+        os.makedirs(settings.git_cache_dir)
+    if settings.use_build_cache and not os.path.isdir(settings.build_cache_dir):
+        os.makedirs(settings.build_cache_dir)
+
     # Create general deployment directory for all deployments
     if not os.path.isdir(settings.deploy_dir):
         os.mkdir(settings.deploy_dir)
 
     # Create deployment directory for this current build inside of general deployment directory
     if os.path.isdir(settings.this_build_deploy_dir):
+        if settings.incremental_deploy:
+            # keep the previous deployment (including instance data, e.g. the Solr index) and only
+            # update the files which have changed, see perform_deploy()
+            logging.info('Deployment folder already exists and will be updated incrementally')
+            return
         shutil.rmtree(settings.this_build_deploy_dir)
     os.mkdir(settings.this_build_deploy_dir)
 
@@ -57,60 +120,635 @@ def check_object_has_mandatory_keys(instructions_object, key_list, object_descri
 def perform_build(build_instructions, settings):
     logging.info('==> Started build phase...')
 
+    build_steps = []
     for repository in build_instructions:
         check_object_has_mandatory_keys(repository, ["repo", "branch", "command"], "repository", settings)
 
-        repo_url           = repository["repo"]
-        repo_branch        = repository["branch"]
-        repo_build_command = repository["command"]
-
-        repo_continue_on_fail = repository["continue_on_fail"] if "continue_on_fail" in repository else False
-        repo_subdir = repository["sub_dir"] if "sub_dir" in repository else None
-
-        build_repo(repo_url, repo_branch, repo_build_command, settings, repo_subdir, repo_continue_on_fail)
-
-def build_repo(repo_url, repo_branch, repo_build_command, settings, sub_dir = None, continue_on_fail = False):
-    repo_name = os.path.basename(repo_url)
+        step = {}
+        step["repo"]             = repository["repo"]
+        step["branch"]           = repository["branch"]
+        step["command"]          = repository["command"]
+        step["name"]             = os.path.basename(repository["repo"])
+        step["shortcut"]         = repository["repo_shortcut"] if "repo_shortcut" in repository else None
+        step["continue_on_fail"] = repository["continue_on_fail"] if "continue_on_fail" in repository else False
+        step["sub_dir"]          = repository["sub_dir"] if "sub_dir" in repository else None
+        step["succeeded"]        = False
+
+        # entries without an explicit "depends_on" depend on all the entries listed before them,
+        # which keeps the build order of the existing instructions intact
+        if "depends_on" in repository:
+            step["depends_on"] = repository["depends_on"]
+            if not isinstance(step["depends_on"], list):
+                step["depends_on"] = [step["depends_on"]]
+        else:
+            step["depends_on"] = [previous["name"] for previous in build_steps]
+
+        build_steps.append(step)
+
+    resolve_build_dependencies(build_steps, settings)
+
+    measurement = start_measurement()
+    maven_snapshot = restore_maven_snapshot(settings)
+    if maven_snapshot is not None:
+        record_metrics("build", "maven_snapshot_restore", "maven repository", finish_measurement(measurement), True, settings)
+
+    build_start_time = time.time()
+
+    prefetch_repositories(build_steps, settings)
+
+    if settings.use_build_cache:
+        restore_cached_builds(build_steps, settings)
+
+    run_build_graph(build_steps, settings)
+
+    measurement = start_measurement()
+    update_maven_snapshot(maven_snapshot, time.time() - build_start_time, settings)
+    if maven_snapshot is not None:
+        record_metrics("build", "maven_snapshot_update", "maven repository", finish_measurement(measurement), True, settings)
+
+# returns the maven local repository snapshot directory configured in the instructions properties, or None
+def get_maven_snapshot_dir(settings):
+    properties = settings.build_instructions["properties"] if "properties" in settings.build_instructions else {}
+    if MAVEN_SNAPSHOT_DIR_PROPERTY not in properties:
+        return None
+    return properties[MAVEN_SNAPSHOT_DIR_PROPERTY]
+
+def read_maven_snapshot_manifest(snapshot_dir):
+    manifest_file_name = os.path.join(snapshot_dir, MAVEN_SNAPSHOT_MANIFEST_FILENAME)
+    if not os.path.isfile(manifest_file_name):
+        return None
+    with open(manifest_file_name) as manifest_file:
+        return json.load(manifest_file)
+
+def write_maven_snapshot_manifest(snapshot_dir, manifest):
+    manifest_file_name = os.path.join(snapshot_dir, MAVEN_SNAPSHOT_MANIFEST_FILENAME)
+    with open(manifest_file_name + '.tmp', 'w') as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+    os.replace(manifest_file_name + '.tmp', manifest_file_name)
+
+def list_maven_repository_files():
+    repository_files = []
+    for root, dirs, files in os.walk(MAVEN_LOCAL_REPOSITORY):
+        for file in files:
+            repository_files.append(os.path.relpath(os.path.join(root, file), MAVEN_LOCAL_REPOSITORY))
+    return repository_files
+
+# restores the maven local repository from the snapshot (a base archive followed by incremental deltas) configured
+# in the instructions properties; returns the information needed to update the snapshot after the build, or None
+# if no snapshot is configured
+def restore_maven_snapshot(settings):
+    snapshot_dir = get_maven_snapshot_dir(settings)
+    if snapshot_dir is None:
+        return None
+
+    maven_snapshot = {'dir': snapshot_dir, 'restored_files': set(), 'restored_bytes': 0}
+
+    manifest = read_maven_snapshot_manifest(snapshot_dir)
+    if manifest is None:
+        logging.info('No maven repository snapshot in {0} yet, it will be created after the build'.format(snapshot_dir))
+    else:
+        logging.info('Restoring maven repository snapshot version {0} from {1}...'.format(manifest['version'], snapshot_dir))
+        start_time = time.time()
+        try:
+            for archive in manifest['archives']:
+                with tarfile.open(os.path.join(snapshot_dir, archive)) as tar:
+                    for member in tar:
+                        if member.isfile():
+                            maven_snapshot['restored_files'].add(member.name)
+                            maven_snapshot['restored_bytes'] += member.size
+                        tar.extract(member, MAVEN_LOCAL_REPOSITORY)
+        except:
+            # the build still works with a partially restored repository, just slower
+            logging.error('Failed to restore maven repository snapshot: [{0}]'.format(traceback.format_exc()))
+        maven_snapshot['restore_seconds'] = time.time() - start_time
+        logging.info('Restored {0} MB ({1} files) of the maven repository in {2:.1f} seconds'\
+                     .format(maven_snapshot['restored_bytes'] // (1024 * 1024), len(maven_snapshot['restored_files']), maven_snapshot['restore_seconds']))
+
+    maven_snapshot['manifest'] = manifest
+    # extracted files get the access time of the archive member, so any file read by the build after this point
+    # gets a newer access time, which is used to prune unused artifacts from the snapshot
+    maven_snapshot['restore_finished_time'] = time.time()
+    return maven_snapshot
+
+# writes the files added to the maven local repository by the build as a new incremental delta of the snapshot;
+# once there are too many deltas, the snapshot is compacted into a new base archive without the unused artifacts
+def update_maven_snapshot(maven_snapshot, build_seconds, settings):
+    if maven_snapshot is None:
+        return
+
+    snapshot_dir = maven_snapshot['dir']
+    if not os.path.isdir(snapshot_dir):
+        os.makedirs(snapshot_dir)
+
+    manifest = maven_snapshot['manifest']
+    properties = settings.build_instructions["properties"]
+    max_deltas = properties[MAVEN_SNAPSHOT_MAX_DELTAS_PROPERTY] if MAVEN_SNAPSHOT_MAX_DELTAS_PROPERTY in properties else DEFAULT_MAVEN_SNAPSHOT_MAX_DELTAS
+
+    repository_files = list_maven_repository_files()
+    new_files = [file for file in repository_files if file not in maven_snapshot['restored_files']]
+
+    if manifest is None:
+        # a build without a snapshot is the reference for how much time the snapshot saves
+        manifest = {'version': 0, 'archives': [], 'reference_build_seconds': build_seconds}
+    else:
+        restore_seconds = maven_snapshot['restore_seconds']
+        logging.info('Maven repository snapshot: restored {0} MB in {1:.1f} seconds, estimated time saved {2:.0f} seconds '\
+                     '(build took {3:.0f} seconds vs {4:.0f} seconds without a snapshot)'\
+                     .format(maven_snapshot['restored_bytes'] // (1024 * 1024), restore_seconds,
+                             manifest['reference_build_seconds'] - build_seconds - restore_seconds, build_seconds, manifest['reference_build_seconds']))
+
+    version = manifest['version'] + 1
+
+    if len(manifest['archives']) > max_deltas:
+        # only keep artifact folders which were read by this build, or were just added to the repository
+        used_folders = set(os.path.dirname(file) for file in new_files)
+        used_restored_files = 0
+        for file in maven_snapshot['restored_files']:
+            file_path = os.path.join(MAVEN_LOCAL_REPOSITORY, file)
+            if os.path.isfile(file_path) and os.path.getatime(file_path) > maven_snapshot['restore_finished_time']:
+                used_folders.add(os.path.dirname(file))
+                used_restored_files += 1
+
+        if used_restored_files == 0:
+            # access times are not updated on this file system (e.g. "noatime"), so usage is unknown
+            logging.info('Can not detect unused maven artifacts, compacting the snapshot without pruning')
+            snapshot_files = repository_files
+        else:
+            snapshot_files = [file for file in repository_files if os.path.dirname(file) in used_folders]
+
+        archive = 'm2-base-{0:04d}.tar'.format(version)
+        archive_size = write_maven_snapshot_archive(snapshot_dir, archive, snapshot_files)
+        logging.info('Compacted maven repository snapshot into {0} ({1} MB, pruned {2} unused files)'\
+                     .format(archive, archive_size // (1024 * 1024), len(repository_files) - len(snapshot_files)))
+
+        old_archives = manifest['archives']
+        manifest['archives'] = [archive]
+        manifest['version'] = version
+        write_maven_snapshot_manifest(snapshot_dir, manifest)
+        for old_archive in old_archives:
+            os.remove(os.path.join(snapshot_dir, old_archive))
+    elif new_files:
+        archive = ('m2-base-{0:04d}.tar' if not manifest['archives'] else 'm2-delta-{0:04d}.tar').format(version)
+        archive_size = write_maven_snapshot_archive(snapshot_dir, archive, new_files)
+        logging.info('Added {0} new files ({1} MB) to the maven repository snapshot as {2}'\
+                     .format(len(new_files), archive_size // (1024 * 1024), archive))
+
+        manifest['archives'].append(archive)
+        manifest['version'] = version
+        write_maven_snapshot_manifest(snapshot_dir, manifest)
+    else:
+        logging.info('Maven repository snapshot is up to date')
+
+# returns the size of the written archive
+def write_maven_snapshot_archive(snapshot_dir, archive, files):
+    archive_file_name = os.path.join(snapshot_dir, archive)
+    with tarfile.open(archive_file_name + '.tmp', 'w') as tar:
+        for file in files:
+            tar.add(os.path.join(MAVEN_LOCAL_REPOSITORY, file), arcname=file, recursive=False)
+    os.replace(archive_file_name + '.tmp', archive_file_name)
+    return os.path.getsize(archive_file_name)
+
+# replaces repo names or repo shortcuts used in "depends_on" with indices of the corresponding build steps
+def resolve_build_dependencies(build_steps, settings):
+    step_index = {}
+    for index, step in enumerate(build_steps):
+        step_index[step["name"]] = index
+        if step["shortcut"] is not None:
+            step_index[step["shortcut"]] = index
+
+    for index, step in enumerate(build_steps):
+        dependencies = set()
+        for dependency in step["depends_on"]:
+            if dependency not in step_index:
+                logging.error('Error: repository {0} depends on an unknown repository [{1}]'.format(step["name"], dependency))
+                exit_on_fail(settings)
+            if step_index[dependency] == index:
+                logging.error('Error: repository {0} depends on itself'.format(step["name"]))
+                exit_on_fail(settings)
+            dependencies.add(step_index[dependency])
+        step["dependencies"] = dependencies
+
+    # check there are no dependency cycles, since those would never get scheduled
+    resolved = set()
+    while len(resolved) < len(build_steps):
+        ready = [index for index, step in enumerate(build_steps)
+                 if index not in resolved and step["dependencies"] <= resolved]
+        if not ready:
+            cycle = [build_steps[index]["name"] for index in range(len(build_steps)) if index not in resolved]
+            logging.error('Error: circular build dependencies between repositories {0}'.format(str(cycle)))
+            exit_on_fail(settings)
+        resolved.update(ready)
+
+# builds all the repositories in the dependency order, building independent repositories
+# in parallel using at most settings.build_workers concurrent builds
+def run_build_graph(build_steps, settings):
+    logging.info('Building {0} repositories using up to {1} parallel builds'.format(len(build_steps), settings.build_workers))
+
+    finished = set()
+    scheduled = set()
+    running = {}
+    failed = False
+
+    with ThreadPoolExecutor(max_workers=settings.build_workers) as executor:
+        while True:
+            if not failed:
+                for index, step in enumerate(build_steps):
+                    if index not in scheduled and step["dependencies"] <= finished:
+                        logging.info('Scheduling build of repo {0}'.format(step["name"]))
+                        scheduled.add(index)
+                        # outputs built against a failed dependency (i.e. against whatever older artifacts of
+                        # it are in the local maven repository) must not be stored in the build cache
+                        step["failed_dependencies"] = [build_steps[dependency]["name"] for dependency in sorted(step["dependencies"])
+                                                       if not build_steps[dependency]["succeeded"]]
+                        running[executor.submit(build_repo, step, settings)] = index
+
+            if not running:
+                break
+
+            done, _ = wait(running.keys(), return_when=FIRST_COMPLETED)
+            for future in done:
+                index = running.pop(future)
+                step = build_steps[index]
+                try:
+                    success = future.result()
+                except Exception:
+                    logging.error('Exception while building repo {0}: [{1}]'.format(step["name"], traceback.format_exc()))
+                    success = False
+                step["succeeded"] = success
+                if not success and not step["continue_on_fail"]:
+                    # let the builds which are already running finish, but do not start any new ones
+                    failed = True
+                finished.add(index)
+
+    if settings.use_build_cache:
+        used_cache_entries = [step["cache_key"] for step in build_steps if "cache_key" in step]
+        evict_lru_cache_entries(settings.build_cache_dir, settings.build_cache_max_size, used_cache_entries)
+
+    if failed:
+        exit_on_fail(settings)
+
+# clones all the repositories at once before any of them is built, so that network time is not
+# serialized behind the builds; each step is marked with the result in step["cloned"]
+def prefetch_repositories(build_steps, settings):
+    logging.info('Cloning {0} repositories using up to {1} parallel clones'.format(len(build_steps), settings.clone_workers))
+
+    with ThreadPoolExecutor(max_workers=settings.clone_workers) as executor:
+        futures = [executor.submit(measure_clone_repo, step, settings) for step in build_steps]
+        for step, future in zip(build_steps, futures):
+            try:
+                step["cloned"] = future.result()
+            except Exception:
+                logging.error('Exception while cloning repo {0}: [{1}]'.format(step["name"], traceback.format_exc()))
+                step["cloned"] = False
+
+    if settings.use_git_cache:
+        used_mirrors = [get_mirror_name(step["repo"]) for step in build_steps]
+        evict_lru_cache_entries(settings.git_cache_dir, settings.git_cache_max_size, used_mirrors)
+
+    for step in build_steps:
+        if not step["cloned"] and not step["continue_on_fail"]:
+            exit_on_fail(settings)
 
-    logging.info('Started building repo {0} @ [{1}] ...'.format(repo_name, repo_url))
-    os.chdir(settings.git_dir)
-    os.mkdir(repo_name)
-    os.chdir(repo_name)
+def measure_clone_repo(step, settings):
+    measurement = start_measurement()
+    success = clone_repo(step, settings)
+    metrics = finish_measurement(measurement)
+    # what a clone "writes" is the checkout, git child processes are not tracked individually
+    metrics["bytes_written"] = get_directory_size(os.path.join(settings.git_dir, step["name"]))
+    record_metrics("build", "clone", step["name"], metrics, success, settings)
+    return success
+
+# returns True if the repository was cloned successfully, False otherwise
+def clone_repo(step, settings):
+    repo_url    = step["repo"]
+    repo_branch = step["branch"]
+    repo_name   = step["name"]
+
+    logging.info('Cloning repo {0} @ [{1}] ...'.format(repo_name, repo_url))
+    repo_dir = os.path.join(settings.git_dir, repo_name)
+    os.mkdir(repo_dir)
+
+    if settings.use_git_cache:
+        mirror_dir = update_mirror(repo_url, settings)
+        if mirror_dir is not None:
+            try:
+                # a local clone hardlinks the mirror objects, so it is fast and keeps working
+                # even if the mirror is evicted from the cache later
+                cloned = Repo.clone_from(mirror_dir, repo_dir, branch=repo_branch, single_branch=True)
+                cloned.git.remote('set-url', 'origin', repo_url + '.git')
+                logging.info('Successfully checked out branch [{0}] for repo {1} from the git cache'.format(repo_branch, repo_name))
+                return True
+            except:
+                logging.error('Failed to check out branch [{0}] for repo {1} from the git cache, cloning from {2}'.format(repo_branch, repo_name, repo_url))
+                shutil.rmtree(repo_dir)
+                os.mkdir(repo_dir)
+
+    # only the requested branch is needed for the build, and (by default) only its latest commit
+    clone_options = {'branch': repo_branch, 'single_branch': True}
+    if settings.clone_depth > 0:
+        clone_options['depth'] = settings.clone_depth
 
     try:
-        Repo.clone_from(repo_url + '.git', '.', branch=repo_branch)
+        Repo.clone_from(repo_url + '.git', repo_dir, **clone_options)
     except:
         logging.error('Error: failed to check out branch [{0}] for repo {1} @ {2}'.format(repo_branch, repo_name, repo_url))
-        if continue_on_fail:
-            return
-        else:
-            exit_on_fail(settings)
+        return False
 
     logging.info('Successfully cloned and checked out branch [{0}] for repo {1}'.format(repo_branch, repo_name))
+    return True
+
+# protects the mirrors from being updated by two clones of the same repository at the same time
+git_cache_locks = {}
+git_cache_locks_guard = threading.Lock()
 
-    if sub_dir is not None:
-        os.chdir(sub_dir)
+def get_mirror_name(repo_url):
+    return re.sub(r'[^A-Za-z0-9._-]', '_', repo_url) + '.git'
+
+# fetches new commits of all branches and tags of the repository into a bare mirror in the git cache,
+# creating the mirror if needed; returns the mirror directory or None if the mirror could not be updated
+def update_mirror(repo_url, settings):
+    mirror_name = get_mirror_name(repo_url)
+    mirror_dir = os.path.join(settings.git_cache_dir, mirror_name)
+
+    with git_cache_locks_guard:
+        lock = git_cache_locks.setdefault(mirror_name, threading.Lock())
+
+    with lock:
+        try:
+            if os.path.isdir(mirror_dir):
+                logging.info('Fetching new commits for {0} into the git cache...'.format(repo_url))
+                Repo(mirror_dir).git.fetch('--prune', 'origin')
+            else:
+                logging.info('Creating git cache mirror for {0}...'.format(repo_url))
+                # mirror into a temporary directory first, so that an interrupted fetch does not leave a broken mirror
+                temp_mirror_dir = mirror_dir + '.tmp'
+                if os.path.isdir(temp_mirror_dir):
+                    shutil.rmtree(temp_mirror_dir)
+                mirror = Repo.init(temp_mirror_dir, bare=True)
+                mirror.git.remote('add', 'origin', repo_url + '.git')
+                # only branches and tags are mirrored, pull request refs are not needed for the builds
+                mirror.git.config('remote.origin.fetch', '+refs/heads/*:refs/heads/*')
+                mirror.git.config('--add', 'remote.origin.fetch', '+refs/tags/*:refs/tags/*')
+                mirror.git.fetch('--prune', 'origin')
+                os.rename(temp_mirror_dir, mirror_dir)
+        except:
+            logging.error('Error: failed to update git cache mirror for {0}: [{1}]'.format(repo_url, traceback.format_exc()))
+            return None
+
+        # the modification time of the mirror is used to evict least recently used mirrors
+        os.utime(mirror_dir)
+
+    return mirror_dir
+
+def get_directory_size(directory):
+    total_size = 0
+    for root, dirs, files in os.walk(directory):
+        for file in files:
+            file_path = os.path.join(root, file)
+            if not os.path.islink(file_path):
+                total_size += os.path.getsize(file_path)
+    return total_size
+
+# removes least recently used entries (by modification time) from the cache directory until the total
+# size of the cache is at most max_size_mb megabytes; entries listed in keep_entries are never removed
+def evict_lru_cache_entries(cache_dir, max_size_mb, keep_entries):
+    entries = []
+    total_size = 0
+    for entry in os.listdir(cache_dir):
+        entry_path = os.path.join(cache_dir, entry)
+        if not os.path.isdir(entry_path):
+            continue
+        entry_size = get_directory_size(entry_path)
+        entries.append((os.path.getmtime(entry_path), entry, entry_size))
+        total_size += entry_size
+
+    logging.info('Cache {0} uses {1} MB (limit {2} MB)'.format(cache_dir, total_size // (1024 * 1024), max_size_mb))
+
+    for _, entry, entry_size in sorted(entries):
+        if total_size <= max_size_mb * 1024 * 1024:
+            break
+        if entry in keep_entries:
+            continue
+        logging.info('Evicting {0} ({1} MB) from cache {2}'.format(entry, entry_size // (1024 * 1024), cache_dir))
+        shutil.rmtree(os.path.join(cache_dir, entry))
+        total_size -= entry_size
+
+# returns True if the repository was built successfully, False otherwise
+def build_repo(step, settings):
+    repo_name = step["name"]
+
+    if not step["cloned"]:
+        logging.error('Error: skipping build of repo {0} which failed to check out'.format(repo_name))
+        return False
+
+    logging.info('Started building repo {0} @ [{1}] ...'.format(repo_name, step["repo"]))
+
+    build_dir = os.path.join(settings.git_dir, repo_name)
+    if step["sub_dir"] is not None:
+        build_dir = os.path.join(build_dir, step["sub_dir"])
+
+    if step.get("restored", False):
+        logging.info('-> Using build outputs of repo {0} restored from the build cache.'.format(repo_name))
+        return True
+
+    build_log_file_name = os.path.join(build_dir, 'build-' + repo_name + '.log')
 
     # generate the list for subprocess.call(), first entry being the executable,
     # the rest command line parameters, e.g. ['mvn', 'clean', 'install', '-Pquick']
-    exec_list = repo_build_command.split();
-
-    # make python wait for os.system build process to finish before building next repo
-    log_file = setup_stdout_redirect_file('build-' + repo_name + '.log')
-    retcode = subprocess.call(exec_list, shell=True, stdout=log_file, stderr=log_file)
+    exec_list = step["command"].split();
+
+    # builds may run in parallel, so instead of changing the working directory of the whole
+    # script the build process is started in the build directory
+    log_file = setup_stdout_redirect_file(build_log_file_name)
+    retcode, metrics = run_measured(exec_list, stdout=log_file, stderr=log_file, cwd=build_dir)
+    log_file.close()
+    record_metrics("build", "build", repo_name, metrics, retcode == 0, settings)
     if retcode != 0:
         logging.error('Error: building repo {0} failed'.format(repo_name))
-        if continue_on_fail:
-            return
+        return False
+
+    if settings.use_build_cache and step.get("cache_key") is not None:
+        if step["failed_dependencies"]:
+            logging.info('-> Not storing build outputs of repo {0} in the build cache: dependencies {1} failed to build'\
+                         .format(repo_name, str(step["failed_dependencies"])))
         else:
-            exit_on_fail(settings)
+            store_build_outputs(step, build_dir, settings)
 
     logging.info('-> Finished building repo {0}.'.format(repo_name))
+    return True
+
+# restores the outputs of all the repositories which are in the build cache before any build starts: restoring
+# replaces artifacts in the local maven repository, which running builds may be reading
+def restore_cached_builds(build_steps, settings):
+    # cache keys include the cache keys of the dependencies, so they are computed in the dependency order
+    resolved = set()
+    while len(resolved) < len(build_steps):
+        for index, step in enumerate(build_steps):
+            if index in resolved or not step["dependencies"] <= resolved:
+                continue
+            resolved.add(index)
+            if not step["cloned"]:
+                continue
+
+            # outputs of the dependencies (e.g. bundled into a distribution) are part of the build outputs
+            step["dependency_cache_keys"] = [build_steps[dependency].get("cache_key") for dependency in sorted(step["dependencies"])]
+            if None in step["dependency_cache_keys"]:
+                # a dependency was not cloned, so the outputs can not be identified
+                continue
+            step["cache_key"] = get_build_cache_key(step, settings)
+
+            build_dir = os.path.join(settings.git_dir, step["name"])
+            if step["sub_dir"] is not None:
+                build_dir = os.path.join(build_dir, step["sub_dir"])
+
+            measurement = start_measurement()
+            step["restored"] = restore_build_outputs(step["cache_key"], build_dir, settings)
+            record_metrics("build", "build_cache_restore", step["name"], finish_measurement(measurement), step["restored"], settings)
+            if step["restored"]:
+                with open(os.path.join(build_dir, 'build-' + step["name"] + '.log'), "w") as log_file:
+                    log_file.write('Build outputs restored from the build cache entry {0}\n'.format(step["cache_key"]))
+                logging.info('-> Restored build outputs of repo {0} from the build cache.'.format(step["name"]))
+
+# the build cache key identifies everything that determines the build outputs: the exact commit that was
+# checked out, how and where it was built, and the cache keys of the repositories it depends on
+def get_build_cache_key(step, settings):
+    commit = Repo(os.path.join(settings.git_dir, step["name"])).head.commit.hexsha
+    key_source = json.dumps([step["repo"], commit, step["command"], step["sub_dir"], step["dependency_cache_keys"]])
+    return hashlib.sha256(key_source.encode("utf-8")).hexdigest()
+
+# returns (groupId, artifactId, version) defined by the given pom.xml file, or None if those can not be
+# determined without evaluating maven properties
+def get_maven_coordinates(pom_file_name):
+    root = ElementTree.parse(pom_file_name).getroot()
+    namespace = root.tag[:root.tag.index('}') + 1] if root.tag.startswith('{') else ''
+
+    def get_value(element, tag):
+        if element is None:
+            return None
+        child = element.find(namespace + tag)
+        return child.text.strip() if child is not None and child.text is not None else None
+
+    parent = root.find(namespace + 'parent')
+    group_id = get_value(root, 'groupId') or get_value(parent, 'groupId')
+    artifact_id = get_value(root, 'artifactId')
+    version = get_value(root, 'version') or get_value(parent, 'version')
+
+    for value in [group_id, artifact_id, version]:
+        if value is None or '${' in value:
+            return None
+    return (group_id, artifact_id, version)
+
+# returns the list of maven module directories (relative to the build directory), i.e. directories with a pom.xml file
+def find_maven_modules(build_dir):
+    modules = []
+    for root, dirs, files in os.walk(build_dir):
+        if 'pom.xml' in files:
+            modules.append(os.path.relpath(root, build_dir))
+        # build outputs and git metadata do not contain any modules
+        dirs[:] = [d for d in dirs if d not in ['target', '.git']]
+    return modules
+
+# hardlinks the file if possible (much faster than copying large distribution files), copies it otherwise
+def link_or_copy(source, destination):
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copy2(source, destination)
+
+# stores target/ folders of all the modules of the build and all the artifacts the build installed into
+# the local maven repository as a new entry in the build cache
+def store_build_outputs(step, build_dir, settings):
+    cache_key = step["cache_key"]
+    entry_dir = os.path.join(settings.build_cache_dir, cache_key)
+    temp_entry_dir = entry_dir + '.tmp'
+
+    try:
+        if os.path.isdir(temp_entry_dir):
+            shutil.rmtree(temp_entry_dir)
+        os.mkdir(temp_entry_dir)
+
+        manifest = {'repo': step["repo"], 'command': step["command"], 'sub_dir': step["sub_dir"], 'targets': [], 'm2': []}
+
+        for module in find_maven_modules(build_dir):
+            module_target_dir = os.path.join(build_dir, module, 'target')
+            if os.path.isdir(module_target_dir):
+                shutil.copytree(module_target_dir, os.path.join(temp_entry_dir, 'targets', module, 'target'),
+                                symlinks=True, copy_function=link_or_copy)
+                manifest['targets'].append(module)
+
+            coordinates = get_maven_coordinates(os.path.join(build_dir, module, 'pom.xml'))
+            if coordinates is None:
+                continue
+            group_id, artifact_id, version = coordinates
+            m2_path = os.path.join(*(group_id.split('.') + [artifact_id, version]))
+            if os.path.isdir(os.path.join(MAVEN_LOCAL_REPOSITORY, m2_path)) and m2_path not in manifest['m2']:
+                shutil.copytree(os.path.join(MAVEN_LOCAL_REPOSITORY, m2_path), os.path.join(temp_entry_dir, 'm2', m2_path))
+                manifest['m2'].append(m2_path)
+
+        with open(os.path.join(temp_entry_dir, BUILD_CACHE_MANIFEST_FILENAME), 'w') as manifest_file:
+            json.dump(manifest, manifest_file, indent=2)
+
+        if os.path.isdir(entry_dir):
+            shutil.rmtree(entry_dir)
+        os.rename(temp_entry_dir, entry_dir)
+
+        logging.info('Stored {0} target folders and {1} maven artifacts of repo {2} in the build cache'\
+                     .format(len(manifest['targets']), len(manifest['m2']), step["name"]))
+    except:
+        # the build itself was successful, so failing to cache its outputs is not an error
+        logging.error('Failed to store build outputs of repo {0} in the build cache: [{1}]'.format(step["name"], traceback.format_exc()))
+        if os.path.isdir(temp_entry_dir):
+            shutil.rmtree(temp_entry_dir, ignore_errors=True)
+
+# returns True if the outputs of the build were restored from the build cache, False otherwise
+def restore_build_outputs(cache_key, build_dir, settings):
+    entry_dir = os.path.join(settings.build_cache_dir, cache_key)
+    manifest_file_name = os.path.join(entry_dir, BUILD_CACHE_MANIFEST_FILENAME)
+    if not os.path.isfile(manifest_file_name):
+        return False
+
+    try:
+        with open(manifest_file_name) as manifest_file:
+            manifest = json.load(manifest_file)
+
+        for module in manifest['targets']:
+            module_target_dir = os.path.join(build_dir, module, 'target')
+            if os.path.isdir(module_target_dir):
+                shutil.rmtree(module_target_dir)
+            shutil.copytree(os.path.join(entry_dir, 'targets', module, 'target'), module_target_dir,
+                            symlinks=True, copy_function=link_or_copy)
+
+        for m2_path in manifest['m2']:
+            # copy next to the installed artifacts first, so that they are replaced by renames only
+            installed_dir = os.path.join(MAVEN_LOCAL_REPOSITORY, m2_path)
+            temp_installed_dir = installed_dir + '.restore.tmp'
+            old_installed_dir = installed_dir + '.old.tmp'
+            for temp_dir in [temp_installed_dir, old_installed_dir]:
+                if os.path.isdir(temp_dir):
+                    shutil.rmtree(temp_dir)
+            shutil.copytree(os.path.join(entry_dir, 'm2', m2_path), temp_installed_dir)
+            if os.path.isdir(installed_dir):
+                os.rename(installed_dir, old_installed_dir)
+            os.rename(temp_installed_dir, installed_dir)
+            if os.path.isdir(old_installed_dir):
+                shutil.rmtree(old_installed_dir)
+    except:
+        logging.error('Failed to restore build outputs from the build cache entry {0}: [{1}]'.format(cache_key, traceback.format_exc()))
+        return False
+
+    # the modification time of the entry is used to evict least recently used entries
+    os.utime(entry_dir)
+    return True
 
 
 def perform_deploy(deploy_instructions, settings):
     logging.info('==> Started deploy phase...')
 
+    # files deployed by the previous deployment, files which are unchanged are not deployed again
+    settings.deploy_manifest = {"previous": {}, "current": {}, "written": 0, "unchanged": 0}
+    if settings.incremental_deploy:
+        settings.deploy_manifest["previous"] = read_deploy_manifest(settings)
+
     index = 0
     for artefact in deploy_instructions:
         index += 1
@@ -137,6 +775,67 @@ def perform_deploy(deploy_instructions, settings):
         os.chdir(settings.start_directory)
         deploy_artefact(action, source_dir, source_files, target_dir_re, target_sub_dir, continue_on_fail, settings)
 
+    removed_files = remove_undeployed_files(settings)
+
+    logging.info('-> Deployed files: {0} written, {1} unchanged, {2} removed'\
+                 .format(settings.deploy_manifest["written"], settings.deploy_manifest["unchanged"], removed_files))
+
+    write_deploy_manifest(settings)
+
+def read_deploy_manifest(settings):
+    manifest_file_name = os.path.join(settings.this_build_deploy_dir, DEPLOY_MANIFEST_FILENAME)
+    if not os.path.isfile(manifest_file_name):
+        logging.info('No manifest of a previous deployment found, deploying all files')
+        return {}
+    with open(manifest_file_name) as manifest_file:
+        return json.load(manifest_file)
+
+def write_deploy_manifest(settings):
+    manifest_file_name = os.path.join(settings.this_build_deploy_dir, DEPLOY_MANIFEST_FILENAME)
+    with open(manifest_file_name + '.tmp', 'w') as manifest_file:
+        json.dump(settings.deploy_manifest["current"], manifest_file)
+    os.replace(manifest_file_name + '.tmp', manifest_file_name)
+
+# records that the file with the given size and hash is deployed to target_path; returns True if the
+# same file was deployed there by the previous deployment and is still there, i.e. it need not be written again
+def is_deployed_file_unchanged(target_path, size, file_hash, settings):
+    manifest = settings.deploy_manifest
+    relative_path = os.path.relpath(target_path, settings.this_build_deploy_dir)
+    manifest["current"][relative_path] = [size, file_hash]
+
+    unchanged = (manifest["previous"].get(relative_path) == [size, file_hash] and os.path.lexists(target_path)
+                 and (os.path.islink(target_path) or os.path.getsize(target_path) == size))
+    if unchanged:
+        manifest["unchanged"] += 1
+    else:
+        manifest["written"] += 1
+    return unchanged
+
+# removes files which were deployed by the previous deployment but are not part of this one;
+# files created by the instance itself (e.g. its data folder) are not in the manifest and are kept
+def remove_undeployed_files(settings):
+    removed_files = 0
+    for relative_path in settings.deploy_manifest["previous"]:
+        if relative_path in settings.deploy_manifest["current"]:
+            continue
+        file_path = os.path.join(settings.this_build_deploy_dir, relative_path)
+        if os.path.lexists(file_path):
+            os.remove(file_path)
+            removed_files += 1
+        # clean up folders left empty
+        folder = os.path.dirname(file_path)
+        while folder != settings.this_build_deploy_dir and os.path.isdir(folder) and not os.listdir(folder):
+            os.rmdir(folder)
+            folder = os.path.dirname(folder)
+    return removed_files
+
+def get_file_crc32(file_name):
+    crc = 0
+    with open(file_name, 'rb') as file:
+        for chunk in iter(lambda: file.read(UNZIP_BUFFER_SIZE), b''):
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
 def deploy_artefact(action, source_dir, source_files, target_dir_re, target_sub_dir, continue_on_fail, settings):
     assert os.path.isdir(source_dir)
 
@@ -161,14 +860,104 @@ def deploy_artefact_unzip(source_dir, file, target_dir, continue_on_fail, settin
     logging.info('-> Deploying by unzipping files from {0} to the target directory {1} ...'\
                  .format(source_file_full_path, target_dir))
 
-    log_file = setup_stdout_redirect_file('unzip.log')
-    retcode = subprocess.call(['unzip', source_file_full_path, '-d', target_dir], stdout=log_file, stderr=log_file)
-    if retcode != 0:
-        logging.error('Error: extracting {0} distribution files to the target installation directory {1} failed'\
-                      .format(source_file_full_path, target_dir))
+    # file names may be patterns, e.g. "phenomecentral-standalone*.zip"
+    zip_files = sorted(glob.glob(source_file_full_path))
+    if not zip_files:
+        logging.error('Error: no files matching {0} found'.format(source_file_full_path))
         if not continue_on_fail:
             exit_on_fail(settings)
-    logging.info('-> Finished extracting files from {0}'.format(source_file_full_path))
+
+    for zip_file in zip_files:
+        measurement = start_measurement()
+        try:
+            extracted_files, extracted_bytes = extract_zip(zip_file, target_dir, settings)
+            success = True
+        except (zipfile.BadZipFile, OSError):
+            logging.error('Error: extracting {0} distribution files to the target installation directory {1} failed: [{2}]'\
+                          .format(zip_file, target_dir, traceback.format_exc()))
+            extracted_files, extracted_bytes = 0, 0
+            success = False
+
+        metrics = finish_measurement(measurement)
+        metrics["bytes_written"] = extracted_bytes
+        record_metrics("deploy", "unzip", os.path.basename(zip_file), metrics, success, settings)
+
+        if not success:
+            if not continue_on_fail:
+                exit_on_fail(settings)
+            continue
+
+        logging.info('-> Finished extracting {0} files ({1} MB) from {2} in {3:.1f} seconds'\
+                     .format(extracted_files, extracted_bytes // (1024 * 1024), zip_file, metrics["wall_seconds"]))
+
+# streams all the entries of the zip file into the target directory, restoring unix permissions, symlinks
+# and modification times the way `unzip` does; large entries are extracted in parallel by a pool of workers.
+# Entries which are unchanged since the previous deployment are skipped.
+# Returns the number of extracted files and their total size.
+def extract_zip(zip_file_name, target_dir, settings):
+    extracted_files = 0
+    extracted_bytes = 0
+
+    with zipfile.ZipFile(zip_file_name) as archive:
+        with ThreadPoolExecutor(max_workers=settings.unzip_workers) as executor:
+            large_entries = []
+            for entry in archive.infolist():
+                target_path = get_zip_entry_target_path(entry, target_dir)
+                if target_path is None:
+                    logging.error('Skipping zip entry with an unsafe path [{0}]'.format(entry.filename))
+                    continue
+
+                if entry.is_dir():
+                    os.makedirs(target_path, exist_ok=True)
+                    continue
+
+                # the zip directory already has the size and the CRC of each entry, so this check is free
+                if is_deployed_file_unchanged(target_path, entry.file_size, '{0:08x}'.format(entry.CRC), settings):
+                    continue
+
+                os.makedirs(os.path.dirname(target_path), exist_ok=True)
+                if entry.file_size >= UNZIP_LARGE_ENTRY_SIZE:
+                    large_entries.append(executor.submit(extract_zip_entry, archive, entry, target_path))
+                else:
+                    extract_zip_entry(archive, entry, target_path)
+
+                extracted_files += 1
+                extracted_bytes += entry.file_size
+
+            # re-raises extraction errors (e.g. CRC mismatch) of the large entries
+            for future in large_entries:
+                future.result()
+
+    return extracted_files, extracted_bytes
+
+# returns the path the entry should be extracted to, or None if the entry would end up outside of the target directory
+def get_zip_entry_target_path(entry, target_dir):
+    name = entry.filename.replace('\\', '/')
+    parts = [part for part in name.split('/') if part not in ['', '.']]
+    if name.startswith('/') or '..' in parts or not parts:
+        return None
+    return os.path.join(target_dir, *parts)
+
+def extract_zip_entry(archive, entry, target_path):
+    # unix permissions (e.g. the executable bit of start.sh) are stored in the high bits of the external attributes
+    mode = entry.external_attr >> 16
+
+    if os.path.islink(target_path) or (stat.S_ISLNK(mode) and os.path.lexists(target_path)):
+        os.remove(target_path)
+
+    if stat.S_ISLNK(mode):
+        os.symlink(archive.read(entry).decode('utf-8'), target_path)
+        return
+
+    # ZipFile supports reading several entries at the same time, and
+    # verifies the CRC of the entry once all of its data has been read
+    with archive.open(entry) as source, open(target_path, 'wb') as target:
+        shutil.copyfileobj(source, target, UNZIP_BUFFER_SIZE)
+
+    if mode & 0o777:
+        os.chmod(target_path, stat.S_IMODE(mode))
+    timestamp = time.mktime(entry.date_time + (0, 0, -1))
+    os.utime(target_path, (timestamp, timestamp))
 
 def deploy_artefact_copy(source_dir, file, target_dir, continue_on_fail, settings):
     source_file_full_path = os.path.join(source_dir, file)
@@ -176,8 +965,38 @@ def deploy_artefact_copy(source_dir, file, target_dir, continue_on_fail, setting
     logging.info('-> Deploying by copying files from {0} to the target directory {1} ...'\
                  .format(source_file_full_path, target_dir))
 
-    retcode = subprocess.call('cp -t ' + target_dir + ' ' + source_file_full_path, shell=True)
-    if retcode != 0:
+    measurement = start_measurement()
+    copied_bytes = 0
+    success = True
+
+    # file names may be patterns, e.g. "pc-test-deploy*.jar"
+    source_files = sorted(glob.glob(source_file_full_path))
+    if not source_files:
+        logging.error('Error: no files matching {0} found'.format(source_file_full_path))
+        success = False
+
+    for source_file in source_files:
+        if not os.path.isfile(source_file):
+            # same as `cp` without `-r`
+            logging.error('Error: omitting directory {0}'.format(source_file))
+            success = False
+            continue
+        target_path = os.path.join(target_dir, os.path.basename(source_file))
+        size = os.path.getsize(source_file)
+        if is_deployed_file_unchanged(target_path, size, '{0:08x}'.format(get_file_crc32(source_file)), settings):
+            continue
+        try:
+            shutil.copy2(source_file, target_path)
+            copied_bytes += size
+        except OSError:
+            logging.error('Error: failed to copy {0} to {1}: [{2}]'.format(source_file, target_dir, traceback.format_exc()))
+            success = False
+
+    metrics = finish_measurement(measurement)
+    metrics["bytes_written"] = copied_bytes
+    record_metrics("deploy", "copy", file, metrics, success, settings)
+
+    if not success:
         logging.error('Error: failed to copy {0} to {1}'.format(source_file_full_path, target_dir))
         if not continue_on_fail:
             exit_on_fail(settings)
@@ -194,6 +1013,11 @@ def perform_start_instance(run_instructions, settings):
     for executable in run_instructions:
         index += 1
         logging.info('Executing step #{0}'.format(index))
+
+        if "wait_for" in executable:
+            perform_wait_for(executable, settings)
+            continue
+
         check_object_has_mandatory_keys(executable, ["command"], "execution instructions", settings)
 
         command = executable["command"]
@@ -224,24 +1048,100 @@ def perform_start_instance(run_instructions, settings):
             logging.info('-> Starting [{0}]'.format(command))
 
             p = subprocess.Popen(command, stdout=log_file, stderr=log_file, shell=True)
-            running_processes.append(p)
+            running_processes.append((p, command, time.time()))
 
             logging.info('-> <------ STARTED, PID = [{0}] ------>'.format(p.pid))
         else:
             logging.info('-> Running [{0}]'.format(command))
 
-            retcode = subprocess.call(command, stdout=log_file, stderr=log_file, shell=True)
+            retcode, metrics = run_measured(command, stdout=log_file, stderr=log_file, shell=True)
+            record_metrics("run", "run", command, metrics, retcode == 0, settings)
 
             logging.info('-> Finished (retcode: {0})'.format(retcode))
 
     if len(running_processes) > 0:
         # wait for the runnign processes to finish
         logging.info('-> Waiting for {0} processes to finish...'.format(len(running_processes)))
-        exit_codes = [p.wait() for p in running_processes]
+        exit_codes = []
+        for p, command, start_time in running_processes:
+            retcode, metrics = wait_measured(p, start_time)
+            record_metrics("run", "run", command, metrics, retcode == 0, settings)
+            exit_codes.append(retcode)
         logging.info('-> Done. Retcodes: [{0}]'.format(str(exit_codes)))
 
     logging.info('All done ===============================')
 
+# polls an HTTP URL or a TCP port with exponential backoff until it is ready or the timeout expires,
+# e.g. { "wait_for": { "url": "http://localhost:8080", "expected_status": [200, 302], "timeout": 600 } }
+def perform_wait_for(executable, settings):
+    condition = executable["wait_for"]
+    continue_on_fail = executable["continue_on_fail"] if "continue_on_fail" in executable else False
+
+    if "url" not in condition and "port" not in condition:
+        logging.error('Error: wait_for step [{0}...] is misconfigured - either "url" or "port" is required'.format(str(condition)[:20]))
+        exit_on_fail(settings)
+
+    timeout = condition["timeout"] if "timeout" in condition else DEFAULT_WAIT_FOR_TIMEOUT
+    interval = condition["initial_interval"] if "initial_interval" in condition else DEFAULT_WAIT_FOR_INITIAL_INTERVAL
+    max_interval = condition["max_interval"] if "max_interval" in condition else DEFAULT_WAIT_FOR_MAX_INTERVAL
+
+    if "url" in condition:
+        target = condition["url"]
+    else:
+        target = '{0}:{1}'.format(condition["host"] if "host" in condition else DEFAULT_WAIT_FOR_HOST, condition["port"])
+
+    logging.info('-> Waiting for [{0}] to become ready (timeout {1} seconds)...'.format(target, timeout))
+
+    start_time = time.time()
+    attempts = 0
+    while True:
+        attempts += 1
+        remaining = timeout - (time.time() - start_time)
+        ready = probe_wait_for_condition(condition, max(min(DEFAULT_WAIT_FOR_REQUEST_TIMEOUT, remaining), 0.1))
+        remaining = timeout - (time.time() - start_time)
+        if ready or remaining <= 0:
+            break
+        time.sleep(min(interval, remaining))
+        interval = min(interval * 2, max_interval)
+
+    time_to_ready = time.time() - start_time
+    record_metrics("run", "wait_for", target, {"wall_seconds": round(time_to_ready, 3), "attempts": attempts}, ready, settings)
+
+    if ready:
+        logging.info('-> [{0}] is ready after {1:.1f} seconds ({2} attempts)'.format(target, time_to_ready, attempts))
+    else:
+        logging.error('Error: [{0}] did not become ready in {1} seconds'.format(target, timeout))
+        if not continue_on_fail:
+            exit_on_fail(settings)
+
+def probe_wait_for_condition(condition, probe_timeout):
+    if "url" in condition:
+        expected_status = condition["expected_status"] if "expected_status" in condition else DEFAULT_WAIT_FOR_EXPECTED_STATUS
+        if not isinstance(expected_status, list):
+            expected_status = [expected_status]
+        return probe_url(condition["url"], expected_status, probe_timeout)
+    else:
+        host = condition["host"] if "host" in condition else DEFAULT_WAIT_FOR_HOST
+        return probe_port(host, condition["port"], probe_timeout)
+
+def probe_url(url, expected_status, probe_timeout):
+    try:
+        with urllib.request.urlopen(url, timeout=probe_timeout) as response:
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except (urllib.error.URLError, http.client.HTTPException, socket.error):
+        # connection refused, reset or timed out - the server is not up yet
+        return False
+    return status in expected_status
+
+def probe_port(host, port, probe_timeout):
+    try:
+        socket.create_connection((host, port), timeout=probe_timeout).close()
+    except socket.error:
+        return False
+    return True
+
 def merge_build_instruction_chunks(raw_metadata):
     if "build_instructions_num_chunks" not in raw_metadata:
         return raw_metadata
@@ -287,8 +1187,80 @@ def exit_on_fail(settings):
 def mark_progress(stage_name, settings = None):
     if settings is not None:
         os.chdir(settings.start_directory)
+        with deploy_metrics_lock:
+            deploy_metrics["stages"][stage_name] = time.time()
+            write_metrics_file(settings)
     open('__' + stage_name + '.indicator', 'w').close()
 
+# all the metrics of this deployment, written to DEPLOY_METRICS_FILENAME every time a step finishes
+deploy_metrics = {"stages": {}, "phases": [], "steps": []}
+deploy_metrics_lock = threading.Lock()
+
+def get_exit_code(wait_status):
+    if os.WIFSIGNALED(wait_status):
+        return -os.WTERMSIG(wait_status)
+    return os.WEXITSTATUS(wait_status)
+
+def get_usage_metrics(start_time, usage_list):
+    return {"wall_seconds": round(time.time() - start_time, 3),
+            "cpu_seconds": round(sum(usage.ru_utime + usage.ru_stime for usage in usage_list), 3),
+            # ru_maxrss is in kilobytes, ru_oublock is in 512-byte blocks
+            "peak_rss_bytes": max(usage.ru_maxrss for usage in usage_list) * 1024,
+            "bytes_written": sum(usage.ru_oublock for usage in usage_list) * 512}
+
+# runs the command (same arguments as subprocess.call()) and returns the return code
+# together with the resource usage of the process and all its children
+def run_measured(command, **popen_args):
+    start_time = time.time()
+    process = subprocess.Popen(command, **popen_args)
+    return wait_measured(process, start_time)
+
+def wait_measured(process, start_time):
+    _, wait_status, usage = os.wait4(process.pid, 0)
+    process.returncode = get_exit_code(wait_status)
+    return process.returncode, get_usage_metrics(start_time, [usage])
+
+# measures steps performed by the script itself; since builds and clones may run in parallel,
+# CPU time and bytes written of such steps include everything else the script was doing. There is no peak RSS
+# of a single step: ru_maxrss is only known per process lifetime, so max_rss_so_far_bytes is the maximum RSS
+# of the script or any of its finished children up to the end of the step, not just during it
+def start_measurement():
+    return (time.time(), resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN))
+
+def finish_measurement(measurement):
+    start_time, start_self_usage, start_children_usage = measurement
+    self_usage = resource.getrusage(resource.RUSAGE_SELF)
+    children_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return {"wall_seconds": round(time.time() - start_time, 3),
+            "cpu_seconds": round(self_usage.ru_utime + self_usage.ru_stime + children_usage.ru_utime + children_usage.ru_stime
+                                 - start_self_usage.ru_utime - start_self_usage.ru_stime
+                                 - start_children_usage.ru_utime - start_children_usage.ru_stime, 3),
+            "max_rss_so_far_bytes": max(self_usage.ru_maxrss, children_usage.ru_maxrss) * 1024,
+            "bytes_written": (self_usage.ru_oublock + children_usage.ru_oublock
+                              - start_self_usage.ru_oublock - start_children_usage.ru_oublock) * 512}
+
+def record_metrics(phase, step_type, name, metrics, success, settings):
+    step_metrics = {"phase": phase, "type": step_type, "name": name, "success": success}
+    step_metrics.update(metrics)
+    with deploy_metrics_lock:
+        deploy_metrics["steps"].append(step_metrics)
+        write_metrics_file(settings)
+
+def record_phase_metrics(phase, metrics, settings):
+    phase_metrics = {"phase": phase}
+    phase_metrics.update(metrics)
+    with deploy_metrics_lock:
+        deploy_metrics["phases"].append(phase_metrics)
+        write_metrics_file(settings)
+
+# the file is replaced atomically, so that it can be read at any time while the deployment is in progress
+def write_metrics_file(settings):
+    deploy_metrics["build_name"] = settings.build_name
+    metrics_file_name = os.path.join(settings.start_directory, DEPLOY_METRICS_FILENAME)
+    with open(metrics_file_name + '.tmp', 'w') as metrics_file:
+        json.dump(deploy_metrics, metrics_file, indent=2)
+    os.replace(metrics_file_name + '.tmp', metrics_file_name)
+
 def find_dir_by_regexp(containing_dir, dir_regexp):
     if dir_regexp is None or dir_regexp == "":
         return containing_dir
@@ -371,6 +1343,30 @@ def parse_args(vm_metadata):
                       action="store_true",
                       help="do not remove existing files from local coppies of git repositories (e.g. to perform only deploy after a build)")
 
+    parser.add_argument("--build-workers", dest='build_workers',
+                      type=int, default=DEFAULT_BUILD_WORKERS,
+                      help="maximum number of repositories built in parallel (by default {0}).\n".format(DEFAULT_BUILD_WORKERS) +
+                           "Repositories are built in parallel only when their build entries have a 'depends_on' list which allows it.\n" +
+                           "Parallel builds install into the same local maven repository at the same time, which maven does not support:\n" +
+                           "only use more than 1 worker for repositories which do not share any dependencies that may be downloaded or installed")
+
+    parser.add_argument("--clone-workers", dest='clone_workers',
+                      type=int, default=DEFAULT_CLONE_WORKERS,
+                      help="maximum number of repositories cloned in parallel before the builds start (by default {0})".format(DEFAULT_CLONE_WORKERS))
+
+    parser.add_argument("--clone-depth", dest='clone_depth',
+                      type=int, default=DEFAULT_CLONE_DEPTH,
+                      help="number of commits fetched for the requested branch of each repository (by default {0}, 0 fetches the full history)".format(DEFAULT_CLONE_DEPTH))
+
+    parser.add_argument("--unzip-workers", dest='unzip_workers',
+                      type=int, default=DEFAULT_UNZIP_WORKERS,
+                      help="number of threads extracting large files of the 'unzip' deploy artefacts (by default {0})".format(DEFAULT_UNZIP_WORKERS))
+
+    parser.add_argument("--incremental-deploy", dest='incremental_deploy',
+                      action="store_true",
+                      help="do not wipe the deployment folder of the build, only write the files which changed since the previous deployment\n" +
+                           "and remove the ones which are no longer deployed (keeps the data of the instance, e.g. its Solr index)")
+
     parser.add_argument("--build-name", dest='build_name',
                       default=use_build_name,
                       help=("custom build name which defines the folder the project will be deployed to (by default '{0}').\n" +
@@ -380,6 +1376,35 @@ def parse_args(vm_metadata):
                       default=os.path.join(script_dir, DEFAULT_GITHUB_FOLDER),
                       help="path to the GitHub directory to clone repositories (by default the 'github' folder in the directory from where the script runs)")
 
+    parser.add_argument("--git-cache-dir", dest='git_cache_dir',
+                      default=os.path.join(script_dir, DEFAULT_GIT_CACHE_FOLDER),
+                      help="path to the directory with bare mirrors of the repositories kept between deployments, so that only new commits are fetched\n" +
+                           "(by default the 'git_cache' folder in the directory from where the script runs)")
+
+    parser.add_argument("--git-cache-max-size", dest='git_cache_max_size',
+                      type=int, default=DEFAULT_GIT_CACHE_MAX_SIZE_MB,
+                      help="maximum size of the git cache in megabytes, least recently used mirrors are removed above it (by default {0})".format(DEFAULT_GIT_CACHE_MAX_SIZE_MB))
+
+    parser.add_argument("--git-cache", dest='use_git_cache',
+                      action="store_true",
+                      help="clone repositories from bare mirrors kept in the git cache, fetching only new commits into them.\n" +
+                           "Creating a mirror fetches all branches and tags, so this only pays off on VMs which deploy many times\n" +
+                           "(by default repositories are cloned directly from GitHub, with --clone-depth commits of the requested branch)")
+
+    parser.add_argument("--build-cache-dir", dest='build_cache_dir',
+                      default=os.path.join(script_dir, DEFAULT_BUILD_CACHE_FOLDER),
+                      help="path to the directory with build outputs kept between deployments, so that a repository is not rebuilt for the same commit\n" +
+                           "(by default the 'build_cache' folder in the directory from where the script runs)")
+
+    parser.add_argument("--build-cache-max-size", dest='build_cache_max_size',
+                      type=int, default=DEFAULT_BUILD_CACHE_MAX_SIZE_MB,
+                      help="maximum size of the build cache in megabytes, least recently used entries are removed above it (by default {0})".format(DEFAULT_BUILD_CACHE_MAX_SIZE_MB))
+
+    parser.add_argument("--build-cache", dest='use_build_cache',
+                      action="store_true",
+                      help="restore the outputs of repositories built before for the same commit, command and dependencies from the build cache\n" +
+                           "instead of building them again (by default all the repositories are always built)")
+
     parser.add_argument("--deployment-dir", dest='deploy_dir',
                       default=os.path.join(script_dir, DEFAULT_DEPLOY_ROOT_FOLDER),
                       help="path to the deployment folder that will contain folder for current installation (by default the 'deploy' folder in the directory from where the script runs)")
@@ -388,6 +1413,15 @@ def parse_args(vm_metadata):
 
     logging.info("Parsed command line args successfully")
 
+    if args.build_workers < 1:
+        parser.error("--build-workers should be at least 1")
+    if args.clone_workers < 1:
+        parser.error("--clone-workers should be at least 1")
+    if args.unzip_workers < 1:
+        parser.error("--unzip-workers should be at least 1")
+    if args.clone_depth < 0:
+        parser.error("--clone-depth can not be negative")
+
     if args.build_instructions_file is None:
         if build_instructions is None:
             logging.error("The build/deploy instructions were not provided.\n" +\
@@ -407,6 +1441,10 @@ def parse_args(vm_metadata):
 
     if not os.path.isabs(args.git_dir):
         args.git_dir = os.path.join(args.start_directory, args.git_dir)
+    if not os.path.isabs(args.git_cache_dir):
+        args.git_cache_dir = os.path.join(args.start_directory, args.git_cache_dir)
+    if not os.path.isabs(args.build_cache_dir):
+        args.build_cache_dir = os.path.join(args.start_directory, args.build_cache_dir)
     if not os.path.isabs(args.deploy_dir):
         args.deploy_dir = os.path.join(args.start_directory, args.deploy_dir)
     args.this_build_deploy_dir = os.path.join(args.deploy_dir, args.build_name)
@@ -435,19 +1473,27 @@ def main():
     logging.info('Build name: {0}'.format(settings.build_name))
     logging.info('Deployment directory: {0}'.format(settings.this_build_deploy_dir))
 
+    measurement = start_measurement()
     setup_folders(settings)
+    record_phase_metrics("setup", finish_measurement(measurement), settings)
 
     mark_progress("building", settings)
 
     if 'build' in settings.build_instructions:
+        measurement = start_measurement()
         perform_build(settings.build_instructions["build"], settings)
+        record_phase_metrics("build", finish_measurement(measurement), settings)
 
     if 'deploy' in settings.build_instructions:
+        measurement = start_measurement()
         perform_deploy(settings.build_instructions["deploy"], settings)
+        record_phase_metrics("deploy", finish_measurement(measurement), settings)
 
     if ('run' in settings.build_instructions) and (not settings.no_run):
         mark_progress("starting_instance", settings)
+        measurement = start_measurement()
         perform_start_instance(settings.build_instructions["run"], settings)
+        record_phase_metrics("run", finish_measurement(measurement), settings)
 
     mark_progress("finished", settings)
     logging.info('DONE')
@@ -5,11 +5,27 @@ Loads test patient data to a running PhenomeCentral instance:
 - assumes a "dataset" is represented by a folder in the "datasets" directory, folder name == dataset name
 - when uploading data, the directory is examined for the following files:
   1) dataset.xar - assumed to contain only the necessary files, all of the files in the dataset will be uploaded
-                  Note that due to the way filenames are passed to the XWiki if there are too many files (hundreds?) the upload will be broken
+                  (and imported in batches of pages, so that XARs with any number of files can be imported)
   2) P*****.json - each file is assumed to be a patient JSON. Those are uploaded via REST as new patients, and then granted all the hardcoded consents
+     P*****.ndjson - same as above, but each line of the file is a patient JSON
+     When the server supports it, patients are created and granted consents in batches, one request per batch
   3) (NOT WORKING YET) F*****.json - each file is assumed to be a family JSON. Those are uploaded via REST as new families
                                      (and all member patients are granted all the hardcoded consents)
-  4) (NOT WORKING YET) P00xxxx*.tsv - each file is assumed to be a processed VCF, those are uploaded for the patient matching the P00xxxx
+  4) P00xxxx.variants.tsv - each file is assumed to be a processed VCF, those are uploaded for the patient created from P00xxxx.json
+                            or, if there is no such file, for the patient P00xxxx imported from the XAR
+- several datasets can be uploaded to several servers in one run: each dataset is uploaded to each server, and each
+  server is authenticated only once
+- an upload which did not complete (e.g. because the script was killed) is resumed when the same dataset is uploaded
+  to the same server again: the XAR, patients and variants files recorded in the "upload_journals" directory
+  as already uploaded are skipped
+- when benchmarking an upload, the dataset is uploaded as usual and the latency of the requests to each endpoint
+  is reported, together with whether patients were uploaded in batches or one by one (--batch-size 1 benchmarks
+  the one by one upload on servers which support batch import), see also load_test_data_stub_server.py
+  to benchmark without a running instance
+- when generating data, a new dataset with the same layout is created by randomly sampling phenotypes, genes and variants
+  of existing datasets, to load-test instances with many more patients than the existing datasets have
+- when validating or summarizing variants, each P*.variants.tsv file of the dataset is converted to a compact columnar
+  P*.variants.bin file (with an index of the variants of each gene), which is memory-mapped instead of parsed again
 
 Prepequisite: script requires requests_toolbelt, zipfile and traceback Python libraries
               (pip install requests_toolbelt; pip install zipfile; pip install requests_toolbelt)
@@ -19,6 +35,7 @@ from __future__ import with_statement
 
 import sys
 import os
+import copy
 import subprocess
 import logging
 import json
@@ -26,10 +43,21 @@ import re
 import requests
 import zipfile
 import traceback
+import time
+import threading
+import random
+import shutil
+import array
+import math
+import mmap
+import struct
 
 from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
 from base64 import b64encode
+from urllib.parse import urlencode
 from requests import Session
+from requests.adapters import HTTPAdapter
 from requests_toolbelt.utils import dump
 from requests_toolbelt.multipart.encoder import MultipartEncoder
 
@@ -40,6 +68,57 @@ from requests_toolbelt.multipart.encoder import MultipartEncoder
 DATASETS_ROOT_FOLDERNAME = 'datasets'
 DATA_XAR_FILENAME = 'dataset.xar'
 DATASETS_LIST_FILENAME = 'datasets_list.txt'
+UPLOAD_JOURNALS_FOLDERNAME = 'upload_journals'
+BENCHMARK_RESULTS_FILENAME = 'upload_benchmark.json'
+# patients are uploaded in batches via PATIENTS_IMPORT_REST_URL when the server supports it, otherwise
+# one by one via PATIENTS_REST_URL with a separate request to grant consents (same as --batch-size 1)
+PATIENT_UPLOAD_MODE_BATCH = 'in batches'
+PATIENT_UPLOAD_MODE_ONE_BY_ONE = 'one by one'
+VARIANTS_FILE_SUFFIX = '.variants.tsv'
+DATASET_MARKER_FILE_PREFIX = '__TARGET_'
+#######################################################
+
+
+#######################################################
+# Dataset generator settings
+#######################################################
+DEFAULT_GENERATED_PATIENTS = 1000
+DEFAULT_GENERATED_VARIANTS_PER_PATIENT = 200
+DEFAULT_GENERATOR_RANDOM_SEED = 42
+GENERATED_FEATURES_PER_PATIENT = (1, 12)
+GENERATED_GENES_PER_PATIENT = (0, 3)
+GENERATED_CLINICAL_STATUSES = ["affected", "unaffected"]
+GENERATED_SEXES = ["M", "F", "O"]
+XAR_PHENOTYPE_REGEX = re.compile(r'<(?:negative_)?phenotype>\s*((?:<value>HP:\d+</value>\s*)+)</(?:negative_)?phenotype>')
+XAR_HPO_ID_REGEX = re.compile(r'HP:\d+')
+XAR_GENE_REGEX = re.compile(r'<gene>(ENSG\d+)</gene>')
+#######################################################
+
+
+#######################################################
+# Exomiser variants files
+#######################################################
+# columns of the processed VCF (Exomiser output) files, and how each of them is stored in the columnar files:
+# "uint" and "float" columns are stored as arrays of numbers, with MISSING_UINT_VALUE or NaN for missing ("."),
+# "dictionary" columns (few distinct values) as arrays of codes into a table of the distinct values,
+# and "text" columns (mostly distinct values) as arrays of offsets into the concatenated values
+VARIANTS_COLUMNS = [
+    ("#CHROM", "dictionary"), ("POS", "uint"), ("REF", "text"), ("ALT", "text"), ("QUAL", "float"),
+    ("FILTER", "dictionary"), ("GENOTYPE", "dictionary"), ("COVERAGE", "uint"), ("FUNCTIONAL_CLASS", "dictionary"),
+    ("HGVS", "text"), ("EXOMISER_GENE", "dictionary"), ("CADD(>0.483)", "float"), ("POLYPHEN(>0.956|>0.446)", "float"),
+    ("MUTATIONTASTER(>0.94)", "float"), ("SIFT(<0.06)", "float"), ("DBSNP_ID", "text"), ("MAX_FREQUENCY", "float"),
+    ("DBSNP_FREQUENCY", "float"), ("EVS_EA_FREQUENCY", "float"), ("EVS_AA_FREQUENCY", "float"),
+    ("EXOMISER_VARIANT_SCORE", "float"), ("EXOMISER_GENE_PHENO_SCORE", "float"), ("EXOMISER_GENE_VARIANT_SCORE", "float"),
+    ("EXOMISER_GENE_COMBINED_SCORE", "float")]
+VARIANTS_GENE_COLUMN = "EXOMISER_GENE"
+VARIANTS_SCORE_COLUMN = "EXOMISER_GENE_COMBINED_SCORE"
+VARIANTS_MISSING_VALUE = "."
+VARIANTS_COLUMNAR_FILE_SUFFIX = '.variants.bin'
+VARIANTS_COLUMNAR_FILE_MAGIC = b'PCVARS1\n'
+VARIANTS_COLUMNAR_FILE_VERSION = 1
+VARIANTS_MAX_REPORTED_ERRORS = 20
+VARIANTS_SUMMARY_TOP_GENES = 5
+MISSING_UINT_VALUE = 2**32 - 1
 #######################################################
 
 
@@ -48,17 +127,29 @@ DATASETS_LIST_FILENAME = 'datasets_list.txt'
 #######################################################
 DEFAULT_SERVER_PORT = "8080"
 DEFAULT_MAIL_SENDING_PORT = "2525"
+DEFAULT_UPLOAD_WORKERS = 8
+DEFAULT_BATCH_SIZE = 100
 CREDENTIALS = 'Admin:admin'
 CONSENT_URL = '/rest/patients/{0}/consents/assign'
 GRANT_CONSENT_NAMES = ["real", "genetic", "share_history", "share_images", "matching"]
 PATIENTS_REST_URL = '/rest/patients'
 PATIENTS_REINDEX_REST_URL = '/rest/patients/reindex'
+PATIENTS_REINDEX_JOB_REST_URL = '/rest/patients/reindex/jobs/{0}'
+REINDEX_REQUEST_TIMEOUT = 60
+REINDEX_JOB_TIMEOUT = 3600
+REINDEX_JOB_POLL_INTERVAL = 1
+REINDEX_JOB_MAX_POLL_INTERVAL = 15
+PATIENTS_IMPORT_REST_URL = '/rest/patients/import'
 XWIKI_PREFERENCES_URL = "/admin/XWiki/XWikiPreferences"
 XAR_UPLOAD_URL = '/upload/XWiki/XWikiPreferences'
-XAR_IMPORT_URL = '/import/XWiki/XWikiPreferences?'
-PROCESSED_EXOMISER_FILES_SRC_PATH = "exomiser"
-PROCESSED_EXOMISER_FILES_DEST_PATH = "/home/pcinstall/deploy/phenomecentral-standalone-1.2-SNAPSHOT/data/exomiser"
+XAR_IMPORT_URL = '/import/XWiki/XWikiPreferences'
+XAR_IMPORT_MAX_BATCH_SIZE = 32 * 1024
+PATIENT_VARIANTS_REST_URL = '/rest/patients/{0}/variants'
+VARIANTS_UPLOAD_CHUNK_SIZE = 1024 * 1024
 MAIL_SENDING_CONFIG_URL = "/saveandcontinue/Mail/MailConfig?"
+BENCHMARK_PERCENTILES = [50, 90, 95, 99]
+# parts of request paths which differ between requests to the same endpoint
+BENCHMARK_ENDPOINT_PATTERNS = [(re.compile(r'/P\d+(?=/|$)'), '/{patient}'), (re.compile(r'/jobs/[^/]+$'), '/jobs/{job}')]
 #######################################################
 
 
@@ -73,7 +164,53 @@ def compose_url(settings, resource_url):
     prefix = 'https://' if settings.use_https else 'http://'
     return prefix + settings.server_ip + resource_url;
 
-def upload_data(settings):
+# uploads each of settings.dataset_names to each of settings.server_ips, in the given order; each server is
+# authenticated once and its session (with its pool of keep-alive connections) is reused for all the datasets.
+# A failed upload does not stop the uploads to the other servers, the script exits with the exit code of the
+# first failed upload
+def upload_datasets(settings):
+    failed_uploads = []
+    exit_code = 0
+    for server_ip in settings.server_ips:
+        server_settings = copy.copy(settings)
+        server_settings.server_ip = server_ip
+        try:
+            session = get_session(server_settings)
+        except (SystemExit, requests.exceptions.RequestException, ValueError, KeyError) as e:
+            if not isinstance(e, SystemExit):
+                logging.error('Error: can not connect to server {0}: {1}'.format(server_ip, repr(e)))
+            failed_uploads.extend((server_ip, dataset_name) for dataset_name in settings.dataset_names)
+            exit_code = exit_code or get_upload_exit_code(e)
+            continue
+
+        for dataset_name in settings.dataset_names:
+            dataset_settings = copy.copy(server_settings)
+            dataset_settings.dataset_name = dataset_name
+            try:
+                upload_data(dataset_settings, session)
+            # ValueError and KeyError come from unexpected server responses or malformed dataset files
+            except (SystemExit, requests.exceptions.RequestException, ValueError, KeyError) as e:
+                if not isinstance(e, SystemExit):
+                    logging.error('Error: uploading data {0} to server {1} failed: {2}'.format(dataset_name, server_ip, repr(e)))
+                if get_upload_exit_code(e):
+                    failed_uploads.append((server_ip, dataset_name))
+                    exit_code = exit_code or get_upload_exit_code(e)
+        session.close()
+
+    if len(settings.server_ips) * len(settings.dataset_names) > 1:
+        logging.info('->Finished uploading {0} datasets to {1} servers: {2} uploads failed'\
+                     .format(len(settings.dataset_names), len(settings.server_ips), len(failed_uploads)))
+        for server_ip, dataset_name in failed_uploads:
+            logging.error('* failed to upload data {0} to server {1}'.format(dataset_name, server_ip))
+    if exit_code:
+        sys.exit(exit_code)
+
+def get_upload_exit_code(error):
+    if isinstance(error, SystemExit):
+        return error.code
+    return -1
+
+def upload_data(settings, session):
     logging.info('Starting uploading data {0} to server {1}'.format(settings.dataset_name, settings.server_ip))
 
     dataset_folder = os.path.join(DATASETS_ROOT_FOLDERNAME, settings.dataset_name)
@@ -83,28 +220,156 @@ def upload_data(settings):
     else:
         settings.dataset_folder = dataset_folder
 
-    # authorise
-    session = get_session(settings)
+    # resume a previous upload of the same dataset to the same server which did not complete
+    open_upload_journal(settings)
 
     # set mail sending port to DEFAULT_MAIL_SENDING_PORT
     set_mail_sending_port(settings, session)
 
     # load and, if upload is successful, import XAR file to the running instance
-    upload_xar(settings, session, DATA_XAR_FILENAME)
+    if DATA_XAR_FILENAME in settings.upload_journal["xar"]:
+        logging.info('Skipping XAR upload: file {0} was already imported'.format(DATA_XAR_FILENAME))
+    elif upload_xar(settings, session, DATA_XAR_FILENAME):
+        record_upload_journal_entries(settings, [{"xar": DATA_XAR_FILENAME}])
 
     # load patient data with consents via REST service: after uploading XARs, since XARs assume fixed
     # patient ids, while REST can create new patients with new IDs on top of those imported by XAR
-    upload_json_patients(settings, session)
+    created_patients, failed_files = upload_json_patients(settings, session)
 
-    # Copy sample of processed VCF file to "/data" installation directory
-    #copy_processed_VCFs()
+    # upload processed VCF files to the patients created above or imported from the XAR
+    failed_files.update(upload_variants_files(settings, session, created_patients))
 
     # Call patient reindexing because Solr does not reindex when XAR is imported
-    reindex_patients(session, settings)
+    patient_ids = sorted(set(get_xar_patient_ids(settings)) | set(created_patients.values()))
+    reindex_patients(session, settings, patient_ids)
+
+    if failed_files:
+        close_upload_journal(settings, False)
+        logging.error('Error: {0} files failed to upload: {1}'.format(len(failed_files), str(sorted(failed_files))))
+        sys.exit(-3)
 
+    close_upload_journal(settings, True)
     logging.info('Finished uploading data {0} to server {1}'.format(settings.dataset_name, settings.server_ip))
 
-def reindex_patients(session, settings):
+# the upload journal of a (server, dataset) pair records the XAR, patients and variants files uploaded so far, one
+# JSON object per line, so that an interrupted upload can be resumed without uploading anything twice; the journal
+# is removed once the upload is complete, since uploading the dataset again is then expected to add new patients
+def open_upload_journal(settings):
+    journal_file_name = os.path.join(UPLOAD_JOURNALS_FOLDERNAME, '{0}__{1}.journal'.format(
+        re.sub(r'[^A-Za-z0-9._-]', '_', settings.server_ip), re.sub(r'[^A-Za-z0-9._-]', '_', settings.dataset_name)))
+    journal = {"file_name": journal_file_name, "xar": set(), "patients": {}, "variants": {}, "lock": threading.Lock()}
+
+    if os.path.isfile(journal_file_name) and not settings.resume_upload:
+        logging.info('Discarding the journal of the previous incomplete upload {0}'.format(journal_file_name))
+        os.remove(journal_file_name)
+
+    if os.path.isfile(journal_file_name):
+        with open(journal_file_name, "rb+") as f:
+            content = f.read()
+            # the last entry may have been written only partially when the upload was interrupted
+            complete_length = content.rfind(b"\n") + 1
+            f.truncate(complete_length)
+        for line in content[:complete_length].decode("utf-8").splitlines():
+            entry = json.loads(line)
+            if "xar" in entry:
+                journal["xar"].add(entry["xar"])
+            elif "patient" in entry:
+                journal["patients"][entry["patient"]] = entry["id"]
+            elif "variants" in entry:
+                journal["variants"][entry["variants"]] = entry["id"]
+        logging.info('Resuming the incomplete upload recorded in {0}: {1} XAR files, {2} patients and {3} variants files were already uploaded'\
+                     .format(journal_file_name, len(journal["xar"]), len(journal["patients"]), len(journal["variants"])))
+    else:
+        os.makedirs(UPLOAD_JOURNALS_FOLDERNAME, exist_ok=True)
+
+    journal["file"] = open(journal_file_name, "a")
+    settings.upload_journal = journal
+
+# called by the upload threads as soon as something is uploaded; entries are on the disk when this returns
+def record_upload_journal_entries(settings, entries):
+    if not entries:
+        return
+    journal = settings.upload_journal
+    with journal["lock"]:
+        for entry in entries:
+            journal["file"].write(json.dumps(entry) + "\n")
+        journal["file"].flush()
+        os.fsync(journal["file"].fileno())
+
+def close_upload_journal(settings, upload_complete):
+    journal = settings.upload_journal
+    journal["file"].close()
+    if upload_complete:
+        os.remove(journal["file_name"])
+    else:
+        logging.info('Upload progress is kept in {0}: run the upload again to resume it'.format(journal["file_name"]))
+
+# reindexes only the given patients, unless a full reindex is requested or the server can only do a full reindex;
+# the server reindexes patients in a background job, which is polled until it is finished
+def reindex_patients(session, settings, patient_ids):
+    if settings.full_reindex:
+        logging.info('Reindexing all patients...')
+        request = {"async": True}
+    elif not patient_ids:
+        logging.info('Skipping reindexing: no patients were uploaded')
+        return
+    else:
+        logging.info('Reindexing {0} uploaded patients...'.format(len(patient_ids)))
+        request = {"ids": patient_ids, "async": True}
+
+    headers = {'Content-Type': 'application/json'}
+    reindex_rest_url = compose_url(settings, PATIENTS_REINDEX_REST_URL)
+    req = session.post(reindex_rest_url, data=json.dumps(request), headers=headers, timeout=REINDEX_REQUEST_TIMEOUT)
+    if req.status_code in [404, 405] or (settings.full_reindex and req.status_code == 400):
+        logging.info('* reindexing in a background job is not supported (HTTP status {0}), reindexing all patients'.format(req.status_code))
+        reindex_all_patients(session, settings)
+    elif req.status_code == 202:
+        wait_for_reindex_job(session, settings, req.json())
+    elif req.status_code in [200, 201]:
+        try:
+            job = req.json()
+        except ValueError:
+            # the old reindex resource answers with an empty (or non-JSON) body once it has reindexed all patients
+            logging.info('* patients were reindexed synchronously, the server did not report a reindexing job')
+            return
+        # servers which only reindex some patients synchronously
+        report_reindex_job(job)
+    else:
+        logging.error('Error during reindexing patients {0}'.format(req.status_code))
+
+def wait_for_reindex_job(session, settings, job):
+    logging.info('* started reindexing job {0}'.format(job["id"]))
+    job_rest_url = compose_url(settings, PATIENTS_REINDEX_JOB_REST_URL.format(job["id"]))
+    deadline = time.time() + REINDEX_JOB_TIMEOUT
+    poll_interval = REINDEX_JOB_POLL_INTERVAL
+    while job["state"] not in ["finished", "failed"]:
+        if time.time() > deadline:
+            logging.error('Error: reindexing job {0} did not finish in {1} seconds'.format(job["id"], REINDEX_JOB_TIMEOUT))
+            return
+        time.sleep(poll_interval)
+        poll_interval = min(poll_interval * 2, REINDEX_JOB_MAX_POLL_INTERVAL)
+
+        req = session.get(job_rest_url, timeout=REINDEX_REQUEST_TIMEOUT)
+        if req.status_code != 200:
+            logging.error('Error: getting the status of reindexing job {0} failed {1}'.format(job["id"], req.status_code))
+            return
+        job = req.json()
+        if job["state"] == "running":
+            eta = '{0}s'.format(job["eta"]) if job["eta"] >= 0 else 'unknown'
+            logging.info('* reindexed {0} of {1} patients ({2:.1f} patients/s, time left: {3})'\
+                         .format(job["indexed"] + len(job["failed"]), job["total"], job["rate"], eta))
+    report_reindex_job(job)
+
+def report_reindex_job(job):
+    if job["state"] == "failed":
+        logging.error('Error: reindexing patients failed')
+    elif job["failed"]:
+        logging.error('Error: failed to reindex patients {0}'.format(str(job["failed"])))
+    else:
+        rate = ' ({0:.1f} patients/s)'.format(job["rate"]) if "rate" in job else ''
+        logging.info('Reindexed {0} patients successfully{1}'.format(job["indexed"], rate))
+
+def reindex_all_patients(session, settings):
     logging.info('Reindexing patients...')
     reindex_rest_url = compose_url(settings, PATIENTS_REINDEX_REST_URL)
     req = session.get(reindex_rest_url)
@@ -114,33 +379,127 @@ def reindex_patients(session, settings):
         logging.error('Error during reindexing patients {0}'.format(req.status_code))
 
 
-def copy_processed_VCFs():
-    src = os.path.abspath(PROCESSED_EXOMISER_FILES_SRC_PATH)
-    dest = os.path.abspath(PROCESSED_EXOMISER_FILES_DEST_PAT)
-    logging.info('Copyting exomiser processed VCF files to {0} :'.format(dest))
-    if os.path.exists(dest):
-        logging.error('exomiser directory alredy exists, deleting it.')
-        shutil.rmtree(dest)
-    import errno
-    import shutil
+# uploads each P*.variants.tsv file of the dataset to the patient created from the P*.json file with the same name,
+# or else to the patient with the same ID imported from the XAR, using up to settings.upload_workers concurrent
+# uploads; files are streamed in chunks, never read into memory as a whole;
+# returns a dictionary of the files which failed to upload and the reasons they failed
+def upload_variants_files(settings, session, created_patients):
+    logging.info('Searching for variants files to be uploaded...')
+
+    patient_ids = dict(get_xar_patient_ids(settings))
+    for source, patient_id in created_patients.items():
+        if source.endswith(".json"):
+            patient_ids[os.path.basename(source)[:-len(".json")]] = patient_id
+
+    variants_files = []
+    failed_files = {}
+    for file_name in sorted(os.listdir(settings.dataset_folder)):
+        if file_name.startswith("P") and file_name.endswith(VARIANTS_FILE_SUFFIX):
+            full_file_name = os.path.join(settings.dataset_folder, file_name)
+            patient_name = file_name[:-len(VARIANTS_FILE_SUFFIX)]
+            if full_file_name in settings.upload_journal["variants"]:
+                logging.info('Skipping variants file {0}: already uploaded to patient {1}'\
+                             .format(full_file_name, settings.upload_journal["variants"][full_file_name]))
+            elif patient_name in patient_ids:
+                logging.info('Found variants file {0} for patient {1}'.format(full_file_name, patient_ids[patient_name]))
+                variants_files.append((full_file_name, patient_ids[patient_name]))
+            else:
+                logging.error('Error: variants file {0} does not match any uploaded patient'.format(full_file_name))
+                failed_files[full_file_name] = 'no matching patient'
+
+    if not variants_files:
+        logging.info('* no variants files to upload')
+        return failed_files
+
+    logging.info('Uploading {0} variants files using up to {1} concurrent uploads...'.format(len(variants_files), settings.upload_workers))
+
+    start_time = time.time()
+    uploaded_count = 0
+    uploaded_size = 0
+    with ThreadPoolExecutor(max_workers=settings.upload_workers) as executor:
+        futures = [executor.submit(upload_variants_file, settings, session, file_name, patient_id)
+                   for file_name, patient_id in variants_files]
+        for (file_name, patient_id), future in zip(variants_files, futures):
+            size, error = future.result()
+            if error is not None:
+                failed_files[file_name] = error
+            else:
+                uploaded_count += 1
+                uploaded_size += size
+    elapsed_time = time.time() - start_time
+
+    logging.info('->Finished uploading variants files: {0} uploaded, {1} failed, {2} in {3:.1f}s ({4}/s)'\
+                 .format(uploaded_count, len(failed_files), format_size(uploaded_size),
+                         elapsed_time, format_size(uploaded_size / max(elapsed_time, 0.001))))
+    return failed_files
+
+# patients in the XAR keep their IDs on import, e.g. data/P0000001.xml is patient P0000001
+def get_xar_patient_ids(settings):
+    full_file_name = os.path.join(settings.dataset_folder, DATA_XAR_FILENAME)
+    if not os.path.isfile(full_file_name):
+        return {}
+    patient_ids = {}
+    with zipfile.ZipFile(full_file_name) as xar:
+        for entry in xar.namelist():
+            if entry.startswith("data/P") and entry.endswith(".xml"):
+                patient_id = os.path.splitext(os.path.basename(entry))[0]
+                patient_ids[patient_id] = patient_id
+    return patient_ids
+
+# returns (uploaded size, None) on success, or (None, error description) on failure
+def upload_variants_file(settings, session, file_name, patient_id):
     try:
-        shutil.copytree(src, dest)
-    except OSError as e:
-        # If the error was caused because the source wasn't a directory, copy as a file
-        if e.errno == errno.ENOTDIR:
-            shutil.copy(src, dest)
-        else:
-            print('Exomiser directory not copied. Error: %s' % e)
+        start_time = time.time()
+        headers = {'Content-Type': 'text/plain'}
+        variants_rest_url = compose_url(settings, PATIENT_VARIANTS_REST_URL.format(patient_id))
+        with open(file_name, "rb") as f:
+            # a generator body is sent with chunked transfer encoding
+            req = session.put(variants_rest_url, data=read_file_chunks(f), headers=headers)
+        elapsed_time = time.time() - start_time
+    except Exception as e:
+        # e.g. connection errors: only this file fails, the rest of the files are still uploaded
+        logging.error('Error: uploading {0} failed: {1}'.format(file_name, str(e)))
+        return None, str(e)
+
+    if req.status_code not in [200, 201]:
+        logging.error('Error: Attempt to upload variants file {0} to patient {1} failed {2}'.format(file_name, patient_id, req.status_code))
+        return None, 'HTTP status {0}'.format(req.status_code)
+
+    record_upload_journal_entries(settings, [{"variants": file_name, "id": patient_id}])
+    size = os.path.getsize(file_name)
+    logging.info('* uploaded variants file {0} to patient {1}: {2} in {3:.1f}s ({4}/s)'\
+                 .format(file_name, patient_id, format_size(size), elapsed_time, format_size(size / max(elapsed_time, 0.001))))
+    return size, None
+
+def read_file_chunks(f):
+    while True:
+        chunk = f.read(VARIANTS_UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            return
+        yield chunk
+
+def format_size(size):
+    for unit in ['B', 'KB', 'MB']:
+        if size < 1024:
+            return '{0:.1f}{1}'.format(size, unit)
+        size /= 1024.0
+    return '{0:.1f}GB'.format(size)
 
 
 def get_session(settings):
     session = Session()
+    # patients are uploaded by several threads at once, each needs its own keep-alive connection
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.upload_workers)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
     auth = b64encode(CREDENTIALS.encode()).decode()
     session.headers.update({
             'Authorization': 'Basic {0}'.format(auth),
             'Content-Type': 'text/plain',
             'Accept': '*/*'
             })
+    if settings.action == 'benchmark-upload':
+        session.hooks['response'].append(get_request_metrics_hook(settings))
     base_url = compose_url(settings, '')
     logging.info('Using base server URL {0}'.format(base_url))
     session.head(base_url)
@@ -168,31 +527,187 @@ def get_form_token(settings, session):
     settings.form_token = form_token_match.group(1)
 
 
+# uploads all patients of the dataset using up to settings.upload_workers concurrent requests, in batches
+# of settings.batch_size patients per request if the server supports batch import; returns a dictionary of
+# the created patient IDs, and a dictionary of the patients which failed to upload and the reasons they failed
 def upload_json_patients(settings, session):
     logging.info('Searching for JSON files to be uploaded...')
 
-    files_found = False
-    for file_name in os.listdir(settings.dataset_folder):
-        if file_name.endswith(".json"):
+    patient_files = []
+    for file_name in sorted(os.listdir(settings.dataset_folder)):
+        if file_name.endswith(".json") or file_name.endswith(".ndjson"):
             if file_name.startswith("P"):
                 full_file_name = os.path.join(settings.dataset_folder, file_name)
                 logging.info('Found Patient JSON file {0}'.format(full_file_name))
-                files_found = True
-                internal_upload_patient_json(settings, session, full_file_name)
+                patient_files.append(full_file_name)
 
-    if not files_found:
-        logging.info('* no JSON files found')
+    # patients created by a previous incomplete upload are not created again
+    created_patients = dict(settings.upload_journal["patients"])
 
-def internal_upload_patient_json(settings, session, json_file_name):
-    f = open(json_file_name, "r") 
-    payload = f.read()
+    if not patient_files:
+        logging.info('* no JSON files found')
+        return created_patients, {}
 
+    if settings.batch_size > 1 and is_batch_import_available(settings, session):
+        logging.info('Uploading patients in batches of {0} using up to {1} concurrent uploads...'.format(settings.batch_size, settings.upload_workers))
+        upload_function = upload_patient_batch
+        batch_size = settings.batch_size
+        upload_mode = PATIENT_UPLOAD_MODE_BATCH
+    else:
+        logging.info('Uploading patients one by one using up to {0} concurrent uploads...'.format(settings.upload_workers))
+        upload_function = upload_patients_one_by_one
+        batch_size = 1
+        upload_mode = PATIENT_UPLOAD_MODE_ONE_BY_ONE
+    if settings.action == 'benchmark-upload':
+        # the two modes use different endpoints, so benchmarks report which one was measured
+        with settings.request_metrics["lock"]:
+            settings.request_metrics["patient_upload_modes"].add(upload_mode)
+
+    # NDJSON streams may contain many more patients than fit in memory at once: only keep
+    # as many batches in flight as there are workers
+    failed_files = {}
+    with ThreadPoolExecutor(max_workers=settings.upload_workers) as executor:
+        pending = []
+        for batch in read_patient_batches(patient_files, batch_size, created_patients):
+            if len(pending) >= settings.upload_workers:
+                collect_patient_batch_results(pending.pop(0), created_patients, failed_files)
+            pending.append(executor.submit(upload_and_record_patients, settings, session, batch, upload_function))
+        for future in pending:
+            collect_patient_batch_results(future, created_patients, failed_files)
+
+    logging.info('->Finished loading patients to PhenomeCentral instance: {0} uploaded, {1} failed'\
+                 .format(len(created_patients) - len(settings.upload_journal["patients"]), len(failed_files)))
+    return created_patients, failed_files
+
+def upload_and_record_patients(settings, session, batch, upload_function):
+    results = upload_function(settings, session, batch)
+    record_upload_journal_entries(settings, [{"patient": source, "id": new_patient_id}
+                                             for source, new_patient_id, error in results if error is None])
+    return results
+
+def collect_patient_batch_results(future, created_patients, failed_files):
+    for source, new_patient_id, error in future.result():
+        if error is not None:
+            failed_files[source] = error
+        else:
+            created_patients[source] = new_patient_id
+
+# yields lists of up to batch_size (source, patient JSON or None, error) tuples, where source is the file name
+# for P*.json files and "file name:line number" for P*.ndjson files, which contain one patient JSON per line;
+# patients with a source in skipped_sources are not read at all
+def read_patient_batches(patient_files, batch_size, skipped_sources):
+    batch = []
+    for source, payload, error in read_patient_records(patient_files, skipped_sources):
+        batch.append((source, payload, error))
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def read_patient_records(patient_files, skipped_sources):
+    for file_name in patient_files:
+        if file_name.endswith(".ndjson"):
+            with open(file_name, "r") as f:
+                for line_number, line in enumerate(f, 1):
+                    source = '{0}:{1}'.format(file_name, line_number)
+                    if line.strip() and source not in skipped_sources:
+                        yield parse_patient_json(source, line)
+        elif file_name not in skipped_sources:
+            with open(file_name, "r") as f:
+                yield parse_patient_json(file_name, f.read())
+
+def parse_patient_json(source, payload):
     try:
-        payload = json.loads(payload)
+        return source, json.loads(payload), None
     except:
-        logging.info('* [ERROR] file does not contain valid JSON data')
-        return
+        logging.info('* [ERROR] {0} does not contain valid JSON data'.format(source))
+        return source, None, 'invalid JSON'
+
+# an empty batch creates no patients, but tells if the server has the batch import REST resource
+def is_batch_import_available(settings, session):
+    headers = {'Content-Type': 'application/json'}
+    import_rest_url = compose_url(settings, PATIENTS_IMPORT_REST_URL)
+    try:
+        req = session.post(import_rest_url, data=json.dumps({"consents": [], "patients": []}), headers=headers)
+    except Exception as e:
+        logging.info('* batch patient import is not available: {0}'.format(str(e)))
+        return False
+    if req.status_code not in [200, 201]:
+        logging.info('* batch patient import is not available (HTTP status {0}), falling back to one request per patient'.format(req.status_code))
+        return False
+    # other resources (e.g. a login page or a generic patients resource) may answer with a 200 as well
+    try:
+        response = req.json()
+    except ValueError:
+        response = None
+    if isinstance(response, dict) and response.get("patients") == []:
+        return True
+    logging.info('* batch patient import is not available (unexpected response), falling back to one request per patient')
+    return False
+
+# returns a list of (source, new patient id, error) tuples, one per patient in the batch
+def upload_patient_batch(settings, session, batch):
+    results = [(source, None, error) for source, payload, error in batch if error is not None]
+    batch = [(source, payload) for source, payload, error in batch if error is None]
+    if not batch:
+        return results
+
+    try:
+        headers = {'Content-Type': 'application/json'}
+        import_rest_url = compose_url(settings, PATIENTS_IMPORT_REST_URL)
+        request = {"consents": GRANT_CONSENT_NAMES, "patients": [payload for source, payload in batch]}
+        req = session.post(import_rest_url, data=json.dumps(request), headers=headers)
+        if req.status_code not in [200, 201]:
+            logging.error('Error: Attempt to import a batch of {0} patients starting with {1} failed {2}'.format(len(batch), batch[0][0], req.status_code))
+            return results + [(source, None, 'HTTP status {0}'.format(req.status_code)) for source, payload in batch]
+        patient_results = req.json()["patients"]
+    except Exception as e:
+        # e.g. connection errors: only this batch fails, the rest of the batches are still uploaded
+        logging.error('Error: importing a batch of {0} patients starting with {1} failed: {2}'.format(len(batch), batch[0][0], str(e)))
+        return results + [(source, None, str(e)) for source, payload in batch]
+
+    if len(patient_results) != len(batch):
+        logging.error('Error: the import of a batch of {0} patients starting with {1} returned {2} results'\
+                      .format(len(batch), batch[0][0], len(patient_results)))
+
+    for (source, payload), result in zip(batch, patient_results):
+        if "error" in result or "id" not in result:
+            # a patient which was created but could not be deleted after a failed import still has its id
+            logging.error('Error: Attempt to load patient from {0} failed: {1}{2}'.format(source, result.get("error"),
+                          ' (partially imported as patient {0})'.format(result["id"]) if "id" in result else ''))
+            results.append((source, None, result.get("error", "unknown error")))
+        else:
+            logging.info('* created new patient {0} from {1}'.format(result["id"], source))
+            if not result.get("consents", False):
+                # this is ok, PT has no consents
+                logging.error('Error: Attempt to grant consents to patient {0} failed'.format(result["id"]))
+            results.append((source, result["id"], None))
+    for source, payload in batch[len(patient_results):]:
+        logging.error('Error: Attempt to load patient from {0} failed: missing from the import response'.format(source))
+        results.append((source, None, 'missing from the import response'))
+    return results
+
+def upload_patients_one_by_one(settings, session, batch):
+    results = []
+    for source, payload, error in batch:
+        if error is not None:
+            results.append((source, None, error))
+            continue
+        new_patient_id, error = upload_patient_json(settings, session, source, payload)
+        results.append((source, new_patient_id, error))
+    return results
 
+def upload_patient_json(settings, session, source, payload):
+    try:
+        return internal_upload_patient_json(settings, session, source, payload)
+    except Exception as e:
+        # e.g. connection errors: only this patient fails, the rest of the patients are still uploaded
+        logging.error('Error: uploading {0} failed: {1}'.format(source, str(e)))
+        return None, str(e)
+
+# returns (new patient id, None) on success, or (None, error description) on failure
+def internal_upload_patient_json(settings, session, source, payload):
     # sample data
     # payload = {
     #    "clinicalStatus" : "affected",
@@ -209,16 +724,16 @@ def internal_upload_patient_json(settings, session, json_file_name):
     patient_rest_url = compose_url(settings, PATIENTS_REST_URL)
     req = session.post(patient_rest_url, data=json.dumps(payload), headers=headers)
     if req.status_code in [200, 201]:
-        logging.info('* created new patient')
         new_patient_id = req.headers['Location'].rsplit("/",1)[1]
-        logging.info('* new patient id: {0}'.format(new_patient_id))
+        logging.info('* created new patient {0} from {1}'.format(new_patient_id, source))
         # grant predefined set of consents
         grant_consents(settings, session, new_patient_id, GRANT_CONSENT_NAMES)
+        return new_patient_id, None
     else:
-        logging.error('Error: Attempt to load patient failed {0}'.format(req.status_code))
+        logging.error('Error: Attempt to load patient from {0} failed {1}'.format(source, req.status_code))
         #d = dump.dump_all(req)
         #logging.error(d.decode('utf-8'))
-        sys.exit(-3)
+        return None, 'HTTP status {0}'.format(req.status_code)
 
 
 def grant_consents(settings, session, patient_id, consents):
@@ -234,9 +749,8 @@ def grant_consents(settings, session, patient_id, consents):
         # this is ok, PT has no consents
         # sys.exit(-4)
 
-    logging.info('->Finished loading patients to PhenomeCentral instance.')
-
 
+# returns True if the XAR was uploaded and imported, False if there is no such file in the dataset
 # see also:
 #   https://github.com/xwiki/xwiki-platform/blob/6bc521593a1e41f69f9a20d03ffe8b7b979f7b59/xwiki-platform-core/xwiki-platform-web/src/main/webapp/resources/uicomponents/widgets/upload.js#L229
 #   https://github.com/xwiki/xwiki-platform/blob/6bc521593a1e41f69f9a20d03ffe8b7b979f7b59/xwiki-platform-core/xwiki-platform-web/src/main/webapp/resources/js/xwiki/importer/import.js#L389
@@ -244,7 +758,7 @@ def upload_xar(settings, session, xar_file_name):
     full_file_name = os.path.join(settings.dataset_folder, xar_file_name)
     if not os.path.isfile(full_file_name):
         logging.info('Skipping XAR upload: file {0} is not included in the dataset'.format(xar_file_name))
-        return
+        return False
 
     logging.info('Uploading XAR {0} to the server...'.format(full_file_name))
 
@@ -264,42 +778,59 @@ def upload_xar(settings, session, xar_file_name):
     if req.status_code in [200, 201, 302]:
         logging.info('* uploaded xar file: {0}'.format(full_file_name))
         import_xar_files(settings, session, full_file_name, xar_file_name)
+        return True
     else:
         logging.error('Unexpected response ({0}) from uploading XAR file {1}'.format(req.status_code, xar_file_name))
         sys.exit(-7)
 
+# imports the pages of the uploaded XAR in batches of at most XAR_IMPORT_MAX_BATCH_SIZE bytes of form data:
+# a single request listing all the pages fails for XARs with hundreds of pages
 def import_xar_files(settings, session, full_file_name, xar_file_name):
     logging.info('Importing documents from an uploaded XAR file...')
 
-    payload = 'editor=globaladmin&section=Import&action=import&name=' + xar_file_name + '&historyStrategy=replace&importAsBackup=false&ajax=1'
-
-    # Parse XAR file, loop through list of its files and compose the payload
-    zip=zipfile.ZipFile(full_file_name)
-    filename_list = zip.namelist()
-    for file in filename_list:
-        filename = os.path.splitext(os.path.basename(file))[0]
-        file_space = os.path.dirname(file)
-        if filename in ['package','']:
-            continue
-        upload_file_name = file_space + "." + filename
-        logging.info('- adding file {0} as {1} to the list of imported files'.format(file, upload_file_name))
-        name = upload_file_name  + ':'
-        payload = payload + '&language_' + name + '=&pages=' + name
+    form = [('editor', 'globaladmin'), ('section', 'Import'), ('action', 'import'), ('name', xar_file_name),
+            ('historyStrategy', 'replace'), ('importAsBackup', 'false'), ('ajax', '1'), ('form_token', settings.form_token)]
+    form_size = len(urlencode(form))
+
+    batches = []
+    batch = []
+    batch_size = form_size
+    with zipfile.ZipFile(full_file_name) as xar:
+        for file in xar.namelist():
+            filename = os.path.splitext(os.path.basename(file))[0]
+            file_space = os.path.dirname(file)
+            if filename in ['package','']:
+                continue
+            upload_file_name = file_space + "." + filename
+            logging.info('- adding file {0} as {1} to the list of imported files'.format(file, upload_file_name))
+            name = upload_file_name + ':'
+            page_fields = [('language_' + name, ''), ('pages', name)]
+            page_size = len(urlencode(page_fields)) + 1
+            if batch and batch_size + page_size > XAR_IMPORT_MAX_BATCH_SIZE:
+                batches.append(batch)
+                batch = []
+                batch_size = form_size
+            batch.extend(page_fields)
+            batch_size += page_size
+    if batch:
+        batches.append(batch)
 
     headers = {'Content-Type': 'application/x-www-form-urlencoded; charset=UTF-8'}
     xar_import_url = compose_url(settings, XAR_IMPORT_URL)
 
-    #print("Payload: " + str(payload))
-    #print("Headers: " + str(headers))
+    start_time = time.time()
+    for batch_number, batch in enumerate(batches, 1):
+        batch_start_time = time.time()
+        req = session.post(xar_import_url, data=urlencode(form + batch), headers=headers)
+        if req.status_code not in [200, 201]:
+            logging.error('Error: Importing XAR files failed {0} (batch {1} of {2})'.format(req.status_code, batch_number, len(batches)))
+            sys.exit(-8)
+            # d = dump.dump_all(req)
+            # logging.error(d.decode('utf-8'))
+        logging.info('* imported batch {0} of {1}: {2} pages in {3:.1f}s'\
+                     .format(batch_number, len(batches), len(batch) // 2, time.time() - batch_start_time))
 
-    req = session.post(xar_import_url + payload, headers=headers)
-    if req.status_code in [200, 201]:
-        logging.info('Imported XWiki documents from XAR file')
-    else:
-        logging.error('Error: Importing XAR files failed {0}'.format(req.status_code))
-        sys.exit(-8)
-        # d = dump.dump_all(req)
-        # logging.error(d.decode('utf-8'))
+    logging.info('Imported XWiki documents from XAR file in {0:.1f}s'.format(time.time() - start_time))
 
 
 def set_mail_sending_port(settings, session):
@@ -317,10 +848,541 @@ def set_mail_sending_port(settings, session):
         logging.error('Error: Configuring mail sending port to {0} failed {1}'.format(DEFAULT_MAIL_SENDING_PORT, req.status_code))
         # do nothing: this is not a critical error
 
+# generates a synthetic dataset of settings.patients patients in the same layout as the existing datasets,
+# by sampling phenotypes, genes and variants of the seed datasets; patients are written one by one, so memory
+# use only depends on the size of the seed datasets and not on the number of generated patients
+def generate_dataset(settings):
+    dataset_folder = os.path.join(DATASETS_ROOT_FOLDERNAME, settings.dataset_name)
+    if os.path.exists(dataset_folder):
+        logging.error('Error: dataset folder {0} already exists'.format(dataset_folder))
+        sys.exit(-2)
+
+    seed_datasets = settings.seed_datasets
+    if not seed_datasets:
+        seed_datasets = sorted(os.listdir(DATASETS_ROOT_FOLDERNAME))
+    seed_folders = []
+    for seed_dataset in seed_datasets:
+        seed_folder = os.path.join(DATASETS_ROOT_FOLDERNAME, seed_dataset)
+        if not os.path.isdir(seed_folder):
+            logging.error('Error: seed dataset folder {0} does not exist'.format(seed_folder))
+            sys.exit(-2)
+        seed_folders.append(seed_folder)
+
+    logging.info('Generating dataset {0} with {1} patients from seed datasets {2} (random seed {3})...'\
+                 .format(settings.dataset_name, settings.patients, str(seed_datasets), settings.random_seed))
+
+    pool = read_seed_pool(seed_folders)
+    if not pool["features"]:
+        logging.error('Error: seed datasets contain no phenotypes to sample from')
+        sys.exit(-2)
+    logging.info('* sampling from {0} phenotypes, {1} genes and {2} variants'\
+                 .format(len(pool["features"]), len(pool["genes"]), len(pool["variants"])))
+
+    os.makedirs(dataset_folder)
+    copy_seed_dataset_files(settings, seed_folders, dataset_folder)
+
+    rng = random.Random(settings.random_seed)
+    progress_step = max(1, settings.patients // 10)
+    for patient_number in range(1, settings.patients + 1):
+        patient_name = 'P{0:07d}'.format(patient_number)
+        write_generated_patient(rng, pool, os.path.join(dataset_folder, patient_name + '.json'))
+        if pool["variants"] and settings.variants_per_patient > 0:
+            write_generated_variants(rng, pool, settings.variants_per_patient,
+                                     os.path.join(dataset_folder, patient_name + VARIANTS_FILE_SUFFIX))
+        if patient_number % progress_step == 0:
+            logging.info('* generated {0} of {1} patients'.format(patient_number, settings.patients))
+
+    logging.info('Finished generating dataset {0}'.format(settings.dataset_name))
+
+# collects distinct phenotypes and genes from patient JSONs and XAR patient documents, and distinct variants
+# from variant files of the seed datasets; variants are sorted by the Exomiser combined score, best first,
+# same as in the Exomiser output, so that a sorted sample of them is in the expected order as well
+def read_seed_pool(seed_folders):
+    features = {}
+    genes = {}
+    variants_header = None
+    variants = set()
+    for seed_folder in seed_folders:
+        for file_name in sorted(os.listdir(seed_folder)):
+            full_file_name = os.path.join(seed_folder, file_name)
+            if file_name.startswith("P") and file_name.endswith(".json"):
+                with open(full_file_name, "r") as f:
+                    patient = json.load(f)
+                for feature in patient.get("features", []):
+                    features.setdefault(feature["id"], feature)
+                for gene in patient.get("genes", []):
+                    gene_key = gene.get("id", gene.get("gene"))
+                    if gene_key is not None:
+                        genes.setdefault(gene_key, gene)
+            elif file_name == DATA_XAR_FILENAME:
+                read_xar_seed_pool(full_file_name, features, genes)
+            elif file_name.endswith(VARIANTS_FILE_SUFFIX):
+                with open(full_file_name, "r") as f:
+                    header = f.readline()
+                    if variants_header is None:
+                        variants_header = header
+                    elif header != variants_header:
+                        logging.info('* skipping variants file {0} with different columns'.format(full_file_name))
+                        continue
+                    for line in f:
+                        if line.strip():
+                            variants.add(line if line.endswith("\n") else line + "\n")
+
+    # sorted by the line as well, so that the order does not depend on the order of the set
+    variants = sorted(variants, key=get_variant_sort_key)
+    return {"features": [features[key] for key in sorted(features)],
+            "genes": [genes[key] for key in sorted(genes)],
+            "variants_header": variants_header,
+            "variants": variants}
+
+def read_xar_seed_pool(xar_file_name, features, genes):
+    with zipfile.ZipFile(xar_file_name) as xar:
+        for entry in xar.namelist():
+            if not entry.startswith("data/P") or not entry.endswith(".xml"):
+                continue
+            document = xar.read(entry).decode("utf-8", "replace")
+            for values in XAR_PHENOTYPE_REGEX.findall(document):
+                for hpo_id in XAR_HPO_ID_REGEX.findall(values):
+                    features.setdefault(hpo_id, {"id": hpo_id, "type": "phenotype", "observed": "yes"})
+            for gene_id in XAR_GENE_REGEX.findall(document):
+                genes.setdefault(gene_id, {"id": gene_id, "status": "candidate"})
+
+def get_variant_sort_key(line):
+    try:
+        combined_score = float(line.rstrip("\n").rsplit("\t", 1)[1])
+    except (IndexError, ValueError):
+        combined_score = 0.0
+    return -combined_score, line
+
+# the XAR (and the installation type/version markers) can only be copied from one of the seed datasets
+def copy_seed_dataset_files(settings, seed_folders, dataset_folder):
+    seed_folder = seed_folders[0]
+    if settings.include_xar:
+        xar_seed_folders = [folder for folder in seed_folders if os.path.isfile(os.path.join(folder, DATA_XAR_FILENAME))]
+        if not xar_seed_folders:
+            logging.info('* none of the seed datasets has a {0}, the generated dataset will not have one'.format(DATA_XAR_FILENAME))
+        else:
+            seed_folder = xar_seed_folders[0]
+            logging.info('* copying {0} from {1}'.format(DATA_XAR_FILENAME, seed_folder))
+            shutil.copy2(os.path.join(seed_folder, DATA_XAR_FILENAME), dataset_folder)
+    for file_name in os.listdir(seed_folder):
+        if file_name.startswith(DATASET_MARKER_FILE_PREFIX):
+            shutil.copy2(os.path.join(seed_folder, file_name), dataset_folder)
+
+def write_generated_patient(rng, pool, file_name):
+    features = rng.sample(pool["features"], min(len(pool["features"]), rng.randint(*GENERATED_FEATURES_PER_PATIENT)))
+    genes = rng.sample(pool["genes"], min(len(pool["genes"]), rng.randint(*GENERATED_GENES_PER_PATIENT)))
+    patient = {
+        "sex": rng.choice(GENERATED_SEXES),
+        "clinicalStatus": rng.choice(GENERATED_CLINICAL_STATUSES),
+        "genes": genes,
+        "features": features
+        }
+    with open(file_name, "w") as f:
+        json.dump(patient, f, indent=2)
+
+def write_generated_variants(rng, pool, variants_per_patient, file_name):
+    variants = pool["variants"]
+    indices = sorted(rng.sample(range(len(variants)), min(len(variants), variants_per_patient)))
+    with open(file_name, "w") as f:
+        f.write(pool["variants_header"])
+        for index in indices:
+            f.write(variants[index])
+
+
+# converts (if not done already) and validates all variants files of the dataset, see convert_variants_file()
+def validate_variants(settings):
+    invalid_count = 0
+    variants_files = find_variants_files(settings)
+    for variants_file in variants_files:
+        variants, errors = load_variants_file(variants_file)
+        if errors:
+            invalid_count += 1
+            logging.error('Error: variants file {0} is invalid:'.format(variants_file))
+            for error in errors:
+                logging.error('* {0}'.format(error))
+        else:
+            logging.info('* variants file {0} is valid: {1} variants of {2} genes'\
+                         .format(variants_file, variants["rows"], len(variants["genes"])))
+
+    logging.info('->Finished validating variants files: {0} valid, {1} invalid'.format(len(variants_files) - invalid_count, invalid_count))
+    if invalid_count > 0:
+        sys.exit(-9)
+
+# logs a summary of each variants file of the dataset: number of variants, genes, passed variants,
+# variants of each functional class and the top genes by the Exomiser combined score
+def summarize_variants(settings):
+    for variants_file in find_variants_files(settings):
+        variants, errors = load_variants_file(variants_file)
+        if errors:
+            logging.error('Error: variants file {0} is invalid, run `validate-variants` for details'.format(variants_file))
+            continue
+
+        functional_class_counts = count_variants_values(variants, "FUNCTIONAL_CLASS")
+        filter_counts = count_variants_values(variants, "FILTER")
+
+        gene_scores = []
+        scores = variants["columns"][VARIANTS_SCORE_COLUMN]["values"]
+        for gene_code, gene in enumerate(variants["genes"]):
+            best_score = max_variants_score(scores, get_gene_variant_rows(variants, gene_code))
+            if not math.isnan(best_score):
+                gene_scores.append((-best_score, gene))
+        gene_scores.sort()
+
+        logging.info('Variants file {0}:'.format(variants_file))
+        logging.info('* variants: {0}, genes: {1}, passed filters: {2}'\
+                     .format(variants["rows"], len(variants["genes"]), filter_counts.get("PASS", 0)))
+        logging.info('* functional classes: {0}'.format(', '.join('{0}: {1}'.format(value, -count) for count, value in
+                                                                  sorted((-count, value) for value, count in functional_class_counts.items()))))
+        logging.info('* top genes: {0}'.format(', '.join('{0} ({1:.4f})'.format(gene, -score) for score, gene in
+                                                         gene_scores[:VARIANTS_SUMMARY_TOP_GENES])))
+
+def find_variants_files(settings):
+    dataset_folder = os.path.join(DATASETS_ROOT_FOLDERNAME, settings.dataset_name)
+    if not os.path.isdir(dataset_folder):
+        logging.error('Error: dataset folder {0} does not exist'.format(dataset_folder))
+        sys.exit(-2)
+    variants_files = [os.path.join(dataset_folder, file_name) for file_name in sorted(os.listdir(dataset_folder))
+                      if file_name.startswith("P") and file_name.endswith(VARIANTS_FILE_SUFFIX)]
+    logging.info('Found {0} variants files in dataset {1}'.format(len(variants_files), settings.dataset_name))
+    return variants_files
+
+def count_variants_values(variants, column_name):
+    column = variants["columns"][column_name]
+    counts = [0] * len(column["dictionary"])
+    for code in column["values"]:
+        counts[code] += 1
+    return dict(zip(column["dictionary"], counts))
+
+def max_variants_score(scores, rows):
+    best_score = float("nan")
+    for row in rows:
+        if not math.isnan(scores[row]) and not best_score >= scores[row]:
+            best_score = scores[row]
+    return best_score
+
+# returns (variants, None), see read_variants_columnar_file(), or (None, a list of errors) if the variants file
+# is not valid; the columnar file next to the variants file is (re)created when missing or older than the variants file
+def load_variants_file(variants_file):
+    columnar_file = variants_file[:-len(VARIANTS_FILE_SUFFIX)] + VARIANTS_COLUMNAR_FILE_SUFFIX
+    if not os.path.isfile(columnar_file) or os.path.getmtime(columnar_file) < os.path.getmtime(variants_file):
+        errors = convert_variants_file(variants_file, columnar_file)
+        if errors:
+            return None, errors
+    return read_variants_columnar_file(columnar_file), None
+
+# streams the variants file line by line into compact per-column arrays and writes them, together with an index
+# of the variants of each gene, to the columnar file; returns the list of (at most VARIANTS_MAX_REPORTED_ERRORS)
+# problems found in the variants file, in which case the columnar file is not written
+#
+# columnar file layout: VARIANTS_COLUMNAR_FILE_MAGIC, the header length (4 bytes), the JSON header describing
+# the location of the sections relative to the end of the header, followed by the sections, each aligned to 8 bytes
+def convert_variants_file(variants_file, columnar_file):
+    errors = []
+    columns = []
+    for name, encoding in VARIANTS_COLUMNS:
+        column = {"name": name, "encoding": encoding}
+        if encoding == "uint":
+            column["values"] = array.array('I')
+        elif encoding == "float":
+            column["values"] = array.array('f')
+        elif encoding == "dictionary":
+            column["values"] = array.array('I')
+            column["codes"] = {}
+        else:
+            column["values"] = array.array('Q', [0])
+            column["data"] = bytearray()
+        columns.append(column)
+
+    rows = 0
+    with open(variants_file, "r") as f:
+        header = f.readline().rstrip("\n").split("\t")
+        if header != [name for name, encoding in VARIANTS_COLUMNS]:
+            return ['unexpected columns {0}'.format(str(header))]
+        for line_number, line in enumerate(f, 2):
+            fields = line.rstrip("\n").split("\t")
+            if fields == [""]:
+                continue
+            row_errors = parse_variant_fields(fields, columns)
+            if row_errors:
+                errors.extend('line {0}: {1}'.format(line_number, error) for error in row_errors)
+                if len(errors) >= VARIANTS_MAX_REPORTED_ERRORS:
+                    errors = errors[:VARIANTS_MAX_REPORTED_ERRORS]
+                    errors.append('... (validation stopped)')
+                    return errors
+            else:
+                rows += 1
+
+    if errors:
+        return errors
+
+    sections = []
+    header_columns = []
+    for column in columns:
+        values = column["values"]
+        if column["encoding"] == "dictionary":
+            values = narrow_uint_array(values, len(column["codes"]) - 1)
+        elif column["encoding"] == "text":
+            values = narrow_uint_array(values, len(column["data"]))
+        header_column = {"name": column["name"], "encoding": column["encoding"],
+                         "values": add_variants_section(sections, values)}
+        if column["encoding"] == "dictionary":
+            header_column["dictionary"] = sorted(column["codes"], key=column["codes"].get)
+        elif column["encoding"] == "text":
+            header_column["data"] = add_variants_section(sections, column["data"])
+        header_columns.append(header_column)
+
+    gene_column = columns[[name for name, encoding in VARIANTS_COLUMNS].index(VARIANTS_GENE_COLUMN)]
+    gene_offsets, gene_rows = build_gene_index(gene_column["values"], len(gene_column["codes"]))
+
+    header = json.dumps({
+        "version": VARIANTS_COLUMNAR_FILE_VERSION,
+        "byteorder": sys.byteorder,
+        "rows": rows,
+        "columns": header_columns,
+        "gene_index": {"column": VARIANTS_GENE_COLUMN,
+                       "offsets": add_variants_section(sections, gene_offsets),
+                       "rows": add_variants_section(sections, gene_rows)}
+        }).encode("utf-8")
+
+    with open(columnar_file + '.tmp', "wb") as f:
+        f.write(VARIANTS_COLUMNAR_FILE_MAGIC)
+        f.write(struct.pack('<I', len(header)))
+        f.write(header)
+        f.write(get_variants_section_padding(f.tell()))
+        for data in sections:
+            f.write(data)
+            f.write(get_variants_section_padding(len(data)))
+    os.replace(columnar_file + '.tmp', columnar_file)
+    return []
+
+# appends the values of one row to the column arrays; returns the list of problems with the row, in which
+# case nothing is appended
+def parse_variant_fields(fields, columns):
+    if len(fields) != len(columns):
+        return ['expected {0} columns, found {1}'.format(len(columns), len(fields))]
+
+    errors = []
+    values = []
+    for column, field in zip(columns, fields):
+        if column["encoding"] == "uint":
+            if field == VARIANTS_MISSING_VALUE:
+                values.append(MISSING_UINT_VALUE)
+            elif field.isdigit() and int(field) < MISSING_UINT_VALUE:
+                values.append(int(field))
+            else:
+                errors.append('{0} is not a non-negative integer: {1}'.format(column["name"], field))
+        elif column["encoding"] == "float":
+            if field == VARIANTS_MISSING_VALUE:
+                values.append(float("nan"))
+            else:
+                try:
+                    values.append(float(field))
+                except ValueError:
+                    errors.append('{0} is not a number: {1}'.format(column["name"], field))
+        else:
+            values.append(field)
+    if errors:
+        return errors
+    if values[1] == MISSING_UINT_VALUE:
+        return ['POS is missing']
+
+    for column, value in zip(columns, values):
+        if column["encoding"] == "dictionary":
+            column["values"].append(column["codes"].setdefault(value, len(column["codes"])))
+        elif column["encoding"] == "text":
+            column["data"].extend(value.encode("utf-8"))
+            column["values"].append(len(column["data"]))
+        else:
+            column["values"].append(value)
+    return []
+
+# the rows of the variants of gene N are gene_rows[gene_offsets[N]:gene_offsets[N + 1]], in file order
+def build_gene_index(gene_codes, gene_count):
+    gene_offsets = array.array('I', [0] * (gene_count + 1))
+    for code in gene_codes:
+        gene_offsets[code + 1] += 1
+    for code in range(gene_count):
+        gene_offsets[code + 1] += gene_offsets[code]
+    next_positions = array.array('I', gene_offsets)
+    gene_rows = array.array('I', [0] * len(gene_codes))
+    for row, code in enumerate(gene_codes):
+        gene_rows[next_positions[code]] = row
+        next_positions[code] += 1
+    return gene_offsets, gene_rows
+
+# dictionary codes and text offsets mostly fit in 1 or 2 bytes instead of 4 or 8
+def narrow_uint_array(values, max_value):
+    for typecode in ['B', 'H', 'I']:
+        if max_value < 2**(8 * array.array(typecode).itemsize):
+            return array.array(typecode, values)
+    return values
+
+def add_variants_section(sections, data):
+    offset = sum(len(section) + len(get_variants_section_padding(len(section))) for section in sections)
+    if isinstance(data, array.array):
+        typecode = data.typecode
+        data = data.tobytes()
+    else:
+        typecode = 'B'
+        data = bytes(data)
+    sections.append(data)
+    return {"offset": offset, "length": len(data), "typecode": typecode}
+
+def get_variants_section_padding(length):
+    return b'\0' * (-length % 8)
+
+# memory-maps the columnar file; returns a dictionary with the number of "rows", the "columns" by name (each with
+# the "values" as a memoryview over the file, the "dictionary" of values for dictionary columns and the "data" for
+# text columns, with the value of row N at data[values[N]:values[N + 1]]) and the list of "genes" (the values of
+# the gene column), see get_variants_value() and get_gene_variant_rows()
+def read_variants_columnar_file(columnar_file):
+    with open(columnar_file, "rb") as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if data[:len(VARIANTS_COLUMNAR_FILE_MAGIC)] != VARIANTS_COLUMNAR_FILE_MAGIC:
+        raise ValueError('{0} is not a variants columnar file'.format(columnar_file))
+    header_start = len(VARIANTS_COLUMNAR_FILE_MAGIC) + 4
+    header_length = struct.unpack('<I', data[len(VARIANTS_COLUMNAR_FILE_MAGIC):header_start])[0]
+    header = json.loads(data[header_start:header_start + header_length].decode("utf-8"))
+    if header["version"] != VARIANTS_COLUMNAR_FILE_VERSION or header["byteorder"] != sys.byteorder:
+        raise ValueError('{0} was written by an incompatible version or platform'.format(columnar_file))
+
+    sections_start = header_start + header_length
+    sections_start += len(get_variants_section_padding(sections_start))
+    view = memoryview(data)
+
+    columns = {}
+    for header_column in header["columns"]:
+        column = {"encoding": header_column["encoding"],
+                  "values": get_variants_section(view, sections_start, header_column["values"])}
+        if "dictionary" in header_column:
+            column["dictionary"] = header_column["dictionary"]
+        if "data" in header_column:
+            column["data"] = get_variants_section(view, sections_start, header_column["data"])
+        columns[header_column["name"]] = column
+
+    gene_index = header["gene_index"]
+    return {"rows": header["rows"],
+            "columns": columns,
+            "genes": columns[gene_index["column"]]["dictionary"],
+            "gene_offsets": get_variants_section(view, sections_start, gene_index["offsets"]),
+            "gene_rows": get_variants_section(view, sections_start, gene_index["rows"])}
+
+def get_variants_section(view, sections_start, section):
+    start = sections_start + section["offset"]
+    return view[start:start + section["length"]].cast(section["typecode"])
+
+# returns the value of the column in the given row, as in the variants file (missing values are None)
+def get_variants_value(variants, column_name, row):
+    column = variants["columns"][column_name]
+    value = column["values"][row]
+    if column["encoding"] in ["dictionary", "text"]:
+        if column["encoding"] == "dictionary":
+            value = column["dictionary"][value]
+        else:
+            value = bytes(column["data"][value:column["values"][row + 1]]).decode("utf-8")
+        return None if value == VARIANTS_MISSING_VALUE else value
+    if column["encoding"] == "uint":
+        return None if value == MISSING_UINT_VALUE else value
+    return None if math.isnan(value) else value
+
+def get_gene_variant_rows(variants, gene_code):
+    return variants["gene_rows"][variants["gene_offsets"][gene_code]:variants["gene_offsets"][gene_code + 1]]
+
+
+# uploads the dataset as usual, recording the latency of every request, then reports latency percentiles and
+# requests per second for each endpoint, e.g. to compare changes to the loader against the stub server
+# (see load_test_data_stub_server.py); the report is also saved to BENCHMARK_RESULTS_FILENAME
+def benchmark_upload(settings):
+    # every run uploads the whole dataset, otherwise runs are not comparable
+    settings.resume_upload = False
+    settings.request_metrics = {"lock": threading.Lock(), "requests": {}, "patient_upload_modes": set()}
+
+    start_time = time.time()
+    exit_code = 0
+    try:
+        upload_datasets(settings)
+    except SystemExit as e:
+        exit_code = e.code
+    elapsed_time = time.time() - start_time
+
+    endpoints = {}
+    for endpoint, endpoint_requests in sorted(settings.request_metrics["requests"].items()):
+        endpoints[endpoint] = get_endpoint_metrics(endpoint_requests)
+    results = {
+        "server": settings.server_ip,
+        "dataset": settings.dataset_name,
+        "upload_workers": settings.upload_workers,
+        "batch_size": settings.batch_size,
+        "patient_upload_modes": sorted(settings.request_metrics["patient_upload_modes"]),
+        "total_time": elapsed_time,
+        "exit_code": exit_code,
+        "endpoints": endpoints
+        }
+
+    logging.info('Benchmark results ({0:.2f}s in total, patients uploaded {1}):'.format(elapsed_time,
+                 ' and '.join(results["patient_upload_modes"]) or 'not uploaded'))
+    for endpoint, metrics in sorted(endpoints.items()):
+        logging.info('* {0}: {1} requests ({2} failed), {3:.1f} requests/s, latency {4}, max {5:.1f}ms'.format(
+            endpoint, metrics["count"], metrics["errors"], metrics["requests_per_second"],
+            ', '.join('p{0} {1:.1f}ms'.format(percentile, metrics["p{0}".format(percentile)]) for percentile in BENCHMARK_PERCENTILES),
+            metrics["max"]))
+
+    with open(BENCHMARK_RESULTS_FILENAME, "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    logging.info('Saved benchmark results to {0}'.format(BENCHMARK_RESULTS_FILENAME))
+
+    if exit_code:
+        sys.exit(exit_code)
+
+def get_request_metrics_hook(settings):
+    def record_request_metrics(response, *args, **kwargs):
+        end_time = time.time()
+        latency = response.elapsed.total_seconds()
+        endpoint = response.request.method + ' ' + get_benchmark_endpoint(response.request.path_url)
+        with settings.request_metrics["lock"]:
+            settings.request_metrics["requests"].setdefault(endpoint, []).append(
+                (end_time - latency, end_time, latency, response.status_code >= 400))
+    return record_request_metrics
+
+def get_benchmark_endpoint(path_url):
+    path = path_url.split('?', 1)[0]
+    for pattern, replacement in BENCHMARK_ENDPOINT_PATTERNS:
+        path = pattern.sub(replacement, path)
+    return path
+
+# latencies in milliseconds; requests per second over the time between the first request to the endpoint
+# started and the last one finished, since requests to different endpoints run one after the other
+def get_endpoint_metrics(endpoint_requests):
+    latencies = sorted(latency * 1000 for start_time, end_time, latency, failed in endpoint_requests)
+    active_time = max(end_time for start_time, end_time, latency, failed in endpoint_requests) - \
+                  min(start_time for start_time, end_time, latency, failed in endpoint_requests)
+    metrics = {
+        "count": len(endpoint_requests),
+        "errors": len([failed for start_time, end_time, latency, failed in endpoint_requests if failed]),
+        "requests_per_second": len(endpoint_requests) / max(active_time, 0.001),
+        "mean": sum(latencies) / len(latencies),
+        "max": latencies[-1]
+        }
+    for percentile in BENCHMARK_PERCENTILES:
+        # nearest-rank percentile
+        metrics["p{0}".format(percentile)] = latencies[max(0, int(math.ceil(percentile / 100.0 * len(latencies))) - 1)]
+    return metrics
+
+
 def setup_logfile(settings):
     if settings.action == 'list-datasets':
         log_name = "dataset_list.log"
         web_accessible_log_file = None
+    elif settings.action == 'generate-dataset':
+        log_name = "generate_dataset.log"
+        web_accessible_log_file = None
+    elif settings.action in ['validate-variants', 'summarize-variants']:
+        log_name = "variants.log"
+        web_accessible_log_file = None
+    elif settings.action == 'benchmark-upload':
+        log_name = "benchmark_upload.log"
+        web_accessible_log_file = None
     else:
         log_name = "upload_data.log";
         web_accessible_log_file = 'webapps/phenotips/resources/latest_data_upload.log'
@@ -347,21 +1409,70 @@ def setup_logfile(settings):
 def parse_args(args):
     parser = ArgumentParser()
     parser.add_argument("--action", dest='action', required=True,
-                      help="either `list-datasets` or `upload-dataset`");
-    parser.add_argument("--ip", dest='server_ip',
-                      help="when uploading datasets, the base address of the server that should get the dataset (e.g. `localhost:8080`)");
-    parser.add_argument("--dataset-name", dest='dataset_name',
-                      help="when uploading datasets, the name of the dataset to be uploaded");
+                      help="either `list-datasets`, `upload-dataset`, `benchmark-upload`, `generate-dataset`, `validate-variants` or `summarize-variants`");
+    parser.add_argument("--ip", dest='server_ips',
+                      action="append", default=[],
+                      help="when uploading datasets, the base address of the server that should get the dataset (e.g. `localhost:8080`), can be used multiple times");
+    parser.add_argument("--dataset-name", dest='dataset_names',
+                      action="append", default=[],
+                      help="when uploading datasets, the name of the dataset to be uploaded, can be used multiple times; when generating datasets, the name of the generated dataset");
+    parser.add_argument("--seed-dataset", dest='seed_datasets',
+                      action="append", default=[],
+                      help="when generating datasets, the name of a dataset to sample patients from, can be used multiple times (by default all datasets)");
+    parser.add_argument("--patients", dest='patients',
+                      type=int, default=DEFAULT_GENERATED_PATIENTS,
+                      help="when generating datasets, the number of patients to generate (by default {0})".format(DEFAULT_GENERATED_PATIENTS));
+    parser.add_argument("--variants-per-patient", dest='variants_per_patient',
+                      type=int, default=DEFAULT_GENERATED_VARIANTS_PER_PATIENT,
+                      help="when generating datasets, the number of variants in each generated variants file, 0 to not generate variants files (by default {0})".format(DEFAULT_GENERATED_VARIANTS_PER_PATIENT));
+    parser.add_argument("--random-seed", dest='random_seed',
+                      type=int, default=DEFAULT_GENERATOR_RANDOM_SEED,
+                      help="when generating datasets, the random seed: the same seed datasets and random seed always generate the same dataset (by default {0})".format(DEFAULT_GENERATOR_RANDOM_SEED));
+    parser.add_argument("--include-xar", dest='include_xar',
+                      action="store_true",
+                      help="when generating datasets, copy the {0} of the first seed dataset which has one".format(DATA_XAR_FILENAME));
+    parser.add_argument("--upload-workers", dest='upload_workers',
+                      type=int, default=DEFAULT_UPLOAD_WORKERS,
+                      help="when uploading datasets, the maximum number of patients uploaded at the same time (by default {0})".format(DEFAULT_UPLOAD_WORKERS));
+    parser.add_argument("--batch-size", dest='batch_size',
+                      type=int, default=DEFAULT_BATCH_SIZE,
+                      help="when uploading datasets, the maximum number of patients created by one request if the server supports batch import, 1 disables batch import (by default {0})".format(DEFAULT_BATCH_SIZE));
+    parser.add_argument("--no-resume", dest='resume_upload',
+                      action="store_false",
+                      help="when uploading datasets, upload the whole dataset even if a previous upload of it to the same server did not complete");
+    parser.add_argument("--full-reindex", dest='full_reindex',
+                      action="store_true",
+                      help="when uploading datasets, reindex all patients of the server instead of only the uploaded patients");
     parser.add_argument("--use-https", dest='use_https',
                       action="store_true",
                       help="use HTTPS instead of HTTp to connect to the server")
     args = parser.parse_args()
 
-    if args.action == 'upload-dataset' and (args.server_ip is None or args.dataset_name is None):
-        parser.error("Action 'upload-dataset' requires --ip and --dataset-name")
+    if args.action in ['upload-dataset', 'benchmark-upload'] and (not args.server_ips or not args.dataset_names):
+        parser.error("Action '{0}' requires --ip and --dataset-name".format(args.action))
+
+    if args.action in ['generate-dataset', 'validate-variants', 'summarize-variants'] and not args.dataset_names:
+        parser.error("Action '{0}' requires --dataset-name".format(args.action))
+
+    # only uploads can be done for several servers and datasets at once
+    if args.action != 'upload-dataset' and (len(args.server_ips) > 1 or len(args.dataset_names) > 1):
+        parser.error("Action '{0}' takes only one --ip and one --dataset-name".format(args.action))
+
+    if args.patients < 1:
+        parser.error("--patients should be at least 1")
+
+    if args.variants_per_patient < 0:
+        parser.error("--variants-per-patient should not be negative")
+
+    if args.upload_workers < 1:
+        parser.error("--upload-workers should be at least 1")
+
+    if args.batch_size < 1:
+        parser.error("--batch-size should be at least 1")
 
-    if args.server_ip is not None and ":" not in args.server_ip:
-        args.server_ip += ":" + DEFAULT_SERVER_PORT
+    args.server_ips = [server_ip if ":" in server_ip else server_ip + ":" + DEFAULT_SERVER_PORT for server_ip in args.server_ips]
+    args.server_ip = args.server_ips[0] if args.server_ips else None
+    args.dataset_name = args.dataset_names[0] if args.dataset_names else None
 
     return args
 
@@ -372,8 +1483,16 @@ def main(args=sys.argv[1:]):
     try:
         if settings.action == 'list-datasets':
             list_datasets()
+        elif settings.action == 'generate-dataset':
+            generate_dataset(settings)
+        elif settings.action == 'validate-variants':
+            validate_variants(settings)
+        elif settings.action == 'summarize-variants':
+            summarize_variants(settings)
+        elif settings.action == 'benchmark-upload':
+            benchmark_upload(settings)
         else:
-            upload_data(settings)
+            upload_datasets(settings)
     except Exception:
         logging.error('Exception: [{0}]'.format(traceback.format_exc()))
         sys.exit(-1)
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3.6
+
+"""
+A local stand-in for a running PhenomeCentral instance, to run load_test_data.py against without deploying one,
+e.g. to benchmark changes to the loader with `load_test_data.py --action benchmark-upload --ip localhost:8097 ...`.
+
+Mimics only what load_test_data.py uses, and does not keep any uploaded data:
+- the XWiki preferences page with the form token, mail settings, XAR upload and XAR import
+- REST patient creation (with the new patient in the `Location` header) and consents
+- the test deployment REST services: batch patient import, variants upload and reindexing jobs
+  (not available with --legacy, same as on instances without the pc-test-deploy-rest module)
+
+Every request is answered after the configured --latency, to approximate a remote server.
+"""
+
+import sys
+import time
+import json
+import threading
+
+from argparse import ArgumentParser
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+
+#######################################################
+# Stub server settings
+#######################################################
+DEFAULT_STUB_SERVER_PORT = 8097
+DEFAULT_STUB_SERVER_LATENCY = 0.0
+FORM_TOKEN = 'stub-form-token'
+PATIENT_ID_FORMAT = 'P{0:07d}'
+XWIKI_PREFERENCES_PAGE = '<html><head><meta name="form_token" content="' + FORM_TOKEN + '" /></head><body></body></html>'
+#######################################################
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+# the loader keeps connections alive, so HTTP/1.1 with a Content-Length on every response
+class StubRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        if self.server.settings.verbose:
+            BaseHTTPRequestHandler.log_message(self, format, *args)
+
+    def do_HEAD(self):
+        self.respond(200)
+
+    def do_GET(self):
+        self.read_body()
+        path = self.path.split('?', 1)[0]
+        if path.startswith('/admin/XWiki/XWikiPreferences'):
+            self.respond(200, XWIKI_PREFERENCES_PAGE, 'text/html')
+        elif path == '/rest/patients/reindex':
+            self.respond(200)
+        elif path.startswith('/rest/patients/reindex/jobs/') and not self.server.settings.legacy:
+            job = get_reindex_job(self.server, path.rsplit('/', 1)[1])
+            if job is None:
+                self.respond(404)
+            else:
+                self.respond_json(200, job)
+        else:
+            self.respond(404)
+
+    def do_POST(self):
+        body = self.read_body()
+        path = self.path.split('?', 1)[0]
+        if path in ['/upload/XWiki/XWikiPreferences', '/saveandcontinue/Mail/MailConfig']:
+            self.respond(302 if path.startswith('/upload') else 200)
+        elif path == '/import/XWiki/XWikiPreferences':
+            self.respond(200)
+        elif path == '/rest/patients':
+            json.loads(body.decode('utf-8'))
+            patient_id = create_patient_id(self.server)
+            self.respond(201, headers={'Location': self.get_base_url() + '/rest/patients/' + patient_id})
+        elif path == '/rest/patients/import' and not self.server.settings.legacy:
+            request = json.loads(body.decode('utf-8'))
+            results = [{"id": create_patient_id(self.server), "consents": True} for patient in request["patients"]]
+            self.respond_json(200, {"patients": results})
+        elif path == '/rest/patients/reindex' and not self.server.settings.legacy:
+            request = json.loads(body.decode('utf-8'))
+            job = create_reindex_job(self.server, request.get("ids", []))
+            self.respond_json(202 if request.get("async", False) else 200, job)
+        else:
+            self.respond(404)
+
+    def do_PUT(self):
+        body = self.read_body()
+        path = self.path.split('?', 1)[0]
+        if path.startswith('/rest/patients/') and path.endswith('/consents/assign'):
+            self.respond(200)
+        elif path.startswith('/rest/patients/') and path.endswith('/variants') and not self.server.settings.legacy:
+            self.respond_json(200, {"size": len(body)})
+        else:
+            self.respond(404)
+
+    def read_body(self):
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            body = bytearray()
+            while True:
+                chunk_size = int(self.rfile.readline().split(b';', 1)[0].strip(), 16)
+                if chunk_size == 0:
+                    # skip the (empty) trailer
+                    self.rfile.readline()
+                    return bytes(body)
+                body.extend(self.rfile.read(chunk_size))
+                self.rfile.readline()
+        return self.rfile.read(int(self.headers.get('Content-Length') or 0))
+
+    def get_base_url(self):
+        return 'http://' + self.headers.get('Host', 'localhost')
+
+    def respond_json(self, status_code, content):
+        self.respond(status_code, json.dumps(content), 'application/json')
+
+    def respond(self, status_code, content='', content_type='text/plain', headers={}):
+        if self.server.settings.latency > 0:
+            time.sleep(self.server.settings.latency)
+        data = content.encode('utf-8')
+        self.send_response(status_code)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(data)
+
+
+def create_patient_id(server):
+    with server.lock:
+        server.patient_count += 1
+        return PATIENT_ID_FORMAT.format(server.patient_count)
+
+# reindexing is instant: jobs are finished as soon as they are created
+def create_reindex_job(server, patient_ids):
+    with server.lock:
+        job_id = str(len(server.reindex_jobs) + 1)
+        now = int(time.time() * 1000)
+        server.reindex_jobs[job_id] = {"id": job_id, "state": "finished", "total": len(patient_ids),
+                                       "indexed": len(patient_ids), "failed": [], "started": now, "finished": now,
+                                       "rate": 0.0, "eta": 0}
+        return server.reindex_jobs[job_id]
+
+def get_reindex_job(server, job_id):
+    with server.lock:
+        return server.reindex_jobs.get(job_id)
+
+def parse_args(args):
+    parser = ArgumentParser()
+    parser.add_argument("--port", dest='port',
+                      type=int, default=DEFAULT_STUB_SERVER_PORT,
+                      help="the port to listen on (by default {0})".format(DEFAULT_STUB_SERVER_PORT))
+    parser.add_argument("--latency", dest='latency',
+                      type=float, default=DEFAULT_STUB_SERVER_LATENCY,
+                      help="seconds to wait before answering each request (by default {0})".format(DEFAULT_STUB_SERVER_LATENCY))
+    parser.add_argument("--legacy", dest='legacy',
+                      action="store_true",
+                      help="only provide the services of instances without the test deployment REST module")
+    parser.add_argument("--verbose", dest='verbose',
+                      action="store_true",
+                      help="log every request")
+    args = parser.parse_args(args)
+
+    if args.latency < 0:
+        parser.error("--latency should not be negative")
+
+    return args
+
+def main(args=sys.argv[1:]):
+    settings = parse_args(args)
+
+    server = ThreadingHTTPServer(('localhost', settings.port), StubRequestHandler)
+    server.settings = settings
+    server.lock = threading.Lock()
+    server.patient_count = 0
+    server.reindex_jobs = {}
+
+    print('Stub PhenomeCentral server listening on localhost:{0}'.format(settings.port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3.6
+
+"""
+Code shared by openstack_vm_deploy.py and openstack_vm_deploy_v2.py, which should be copied next to them.
+
+Provides the cache of OpenStack resource lookups, the cache of Keystone tokens, and the saved server list
+with its background refresher.
+"""
+
+import sys
+import os
+import logging
+import subprocess
+import traceback
+import json
+import time
+import shutil
+try:
+    import fcntl
+except ImportError:
+    # no background refresher of the server list on Windows
+    fcntl = None
+
+# the file read by the deployment service
+SERVER_LIST_FILE_NAME = "server_list.txt"
+
+# the list action copies the server list saved in settings.server_list_snapshot_file_name to SERVER_LIST_FILE_NAME
+# if it is at most --max-staleness seconds old, otherwise lists the servers itself; the refresher saves a new list
+# every --refresh-interval seconds, and stops when the list action was not used for SERVER_LIST_REFRESHER_IDLE_TIMEOUT
+# seconds (the list action touches settings.server_list_refresher_lock_file_name)
+DEFAULT_SERVER_LIST_MAX_STALENESS = 60
+DEFAULT_SERVER_LIST_REFRESH_INTERVAL = 20
+SERVER_LIST_REFRESHER_IDLE_TIMEOUT = 3600
+# touched whenever servers are deployed or deleted by either script: saved lists are kept with the time their
+# listing started, and lists which started before the last change are not used
+SERVER_LIST_INVALIDATION_FILE_NAME = "server_list.invalidated"
+
+# the IDs (and other attributes used by the scripts) of the image, flavor, networks, keypair and security groups
+# are remembered for RESOURCE_CACHE_TTL seconds, so that most runs do not need to look them up
+RESOURCE_CACHE_FILE_NAME = "openstack_resource_cache.json"
+RESOURCE_CACHE_TTL = 24 * 3600
+
+# the Keystone token is saved (readable only by the current user) and reused by the next runs until it expires
+TOKEN_CACHE_FILE_NAME = "openstack_token_cache.json"
+
+# lists the servers with list_servers(conn), saves the list for the next list actions, and publishes it
+def publish_listed_servers(settings, conn, list_servers):
+    start_time = time.time()
+    data = list_servers(conn)
+    save_server_list(settings, data, start_time)
+    write_server_list_file(SERVER_LIST_FILE_NAME, data)
+
+# saves the list of servers listed at listing_start_time, unless servers were changed since then
+def save_server_list(settings, data, listing_start_time):
+    if get_server_list_invalidation_time() >= listing_start_time:
+        logging.info("Servers were changed while they were being listed, not saving the server list")
+        return
+    write_server_list_file(settings.server_list_snapshot_file_name, data, listing_start_time)
+
+# the list may be read at any time by the list action: replace the file atomically
+def write_server_list_file(file_name, data, listing_start_time=None):
+    temp_file_name = "{0}.{1}.tmp".format(file_name, os.getpid())
+    with open(temp_file_name, "w") as server_list_file:
+        print(data, file=server_list_file)
+    if listing_start_time is not None:
+        os.utime(temp_file_name, (listing_start_time, listing_start_time))
+    os.replace(temp_file_name, file_name)
+
+# the saved list is only copied to the file read by the deployment service when listing, since the deploy
+# scripts save their lists to different files
+def publish_server_list(settings):
+    temp_file_name = "{0}.{1}.tmp".format(SERVER_LIST_FILE_NAME, os.getpid())
+    shutil.copyfile(settings.server_list_snapshot_file_name, temp_file_name)
+    os.replace(temp_file_name, SERVER_LIST_FILE_NAME)
+
+# returns True if the saved server list is at most settings.max_staleness seconds old, in which case the list
+# action does not need to do anything else; starts the refresher if it is not running
+def use_saved_server_list(settings):
+    # record that the list was requested, so that the refresher keeps running
+    with open(settings.server_list_refresher_lock_file_name, "a"):
+        os.utime(settings.server_list_refresher_lock_file_name, None)
+    if fcntl is not None and not is_server_list_refresher_running(settings):
+        start_server_list_refresher(settings)
+
+    try:
+        listing_start_time = os.path.getmtime(settings.server_list_snapshot_file_name)
+        if listing_start_time <= get_server_list_invalidation_time():
+            # saved by a listing which started before servers were changed, and finished after that
+            logging.info("Servers were changed after the saved server list was listed, listing servers")
+            return False
+        age = time.time() - listing_start_time
+        if age > settings.max_staleness:
+            logging.info("Saved server list is {0:.0f}s old, listing servers".format(age))
+            return False
+        publish_server_list(settings)
+    except (IOError, OSError):
+        # there is no saved list, or it has just been invalidated
+        return False
+    logging.info("Using the server list listed {0:.0f}s ago".format(age))
+    return True
+
+def invalidate_server_list(settings):
+    with open(SERVER_LIST_INVALIDATION_FILE_NAME, "a"):
+        os.utime(SERVER_LIST_INVALIDATION_FILE_NAME, None)
+    if os.path.isfile(settings.server_list_snapshot_file_name):
+        os.remove(settings.server_list_snapshot_file_name)
+
+def get_server_list_invalidation_time():
+    try:
+        return os.path.getmtime(SERVER_LIST_INVALIDATION_FILE_NAME)
+    except (IOError, OSError):
+        return 0
+
+# the refresher holds an exclusive lock on the lock file while it is running
+def is_server_list_refresher_running(settings):
+    with open(settings.server_list_refresher_lock_file_name, "a") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except (IOError, OSError):
+            return True
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+        return False
+
+# runs the refresh-list action of the deploy script which is running, with settings.server_list_refresher_args
+def start_server_list_refresher(settings):
+    logging.info("Starting the server list refresher")
+    devnull = open(os.devnull, "r+")
+    subprocess.Popen([sys.executable, os.path.abspath(sys.argv[0]), "--action", "refresh-list",
+                      "--refresh-interval", str(settings.refresh_interval)] + settings.server_list_refresher_args,
+                     stdin=devnull, stdout=devnull, stderr=devnull, start_new_session=True)
+
+# saves the server list returned by list_servers(conn) every settings.refresh_interval seconds, until the list
+# action was not used for SERVER_LIST_REFRESHER_IDLE_TIMEOUT seconds
+def refresh_server_list(settings, conn, list_servers):
+    lock_file = open(settings.server_list_refresher_lock_file_name, "a")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except (IOError, OSError):
+        logging.info("The server list refresher is already running")
+        return
+
+    while time.time() - os.path.getmtime(settings.server_list_refresher_lock_file_name) < SERVER_LIST_REFRESHER_IDLE_TIMEOUT:
+        start_time = time.time()
+        try:
+            save_server_list(settings, list_servers(conn), start_time)
+            logging.info("Refreshed the server list in {0:.1f}s".format(time.time() - start_time))
+            # the token may have been renewed
+            save_auth_token(conn)
+        except Exception:
+            logging.error('Error: refreshing the server list failed: [{0}]'.format(traceback.format_exc()))
+        time.sleep(max(settings.refresh_interval - (time.time() - start_time), 0))
+    logging.info("Servers were not listed for {0}s, stopping the server list refresher".format(SERVER_LIST_REFRESHER_IDLE_TIMEOUT))
+
+# returns the given attributes of the resource of the given kind with the given name as a dictionary, or None if
+# there is no such resource: from the resource cache if use_cache is True and the cached attributes are not older
+# than RESOURCE_CACHE_TTL, otherwise via find(name), in which case the attributes are saved to the cache
+def find_resource(find, kind, name, attributes, use_cache):
+    key = kind + ':' + name
+    cache = read_resource_cache()
+    entry = cache.get(key)
+    if use_cache and entry is not None and time.time() - entry['time'] < RESOURCE_CACHE_TTL \
+            and all(attribute in entry['attributes'] for attribute in attributes):
+        return entry['attributes']
+
+    resource = find(name)
+    if resource is None:
+        cache.pop(key, None)
+        write_resource_cache(cache)
+        return None
+    resource_attributes = {}
+    for attribute in attributes:
+        resource_attributes[attribute] = getattr(resource, attribute)
+    if entry is not None and entry['attributes'].get('id') == resource_attributes.get('id'):
+        # keep the attributes cached for other uses of the resource
+        entry['attributes'].update(resource_attributes)
+        resource_attributes = entry['attributes']
+    cache[key] = {'time': time.time(), 'attributes': resource_attributes}
+    write_resource_cache(cache)
+    return resource_attributes
+
+def read_resource_cache():
+    try:
+        with open(RESOURCE_CACHE_FILE_NAME) as cache_file:
+            return json.load(cache_file)
+    except (IOError, ValueError):
+        return {}
+
+# the cache is shared by all runs of both scripts, which may run at the same time: replace the file atomically
+def write_resource_cache(cache):
+    temp_file_name = "{0}.{1}.tmp".format(RESOURCE_CACHE_FILE_NAME, os.getpid())
+    with open(temp_file_name, "w") as cache_file:
+        json.dump(cache, cache_file, indent=2, sort_keys=True)
+    os.replace(temp_file_name, RESOURCE_CACHE_FILE_NAME)
+
+# authenticates the connection, with the token saved by a previous run if it has not expired yet,
+# and saves the token for the next runs
+def authenticate(conn):
+    auth = conn.session.auth
+    cache_id = auth.get_cache_id()
+    auth_state = read_token_cache().get(cache_id)
+    if auth_state is not None:
+        auth.set_auth_state(auth_state)
+    # only authenticates if there is no token or it expires soon
+    conn.session.get_token()
+    save_auth_token(conn)
+
+def save_auth_token(conn):
+    auth = conn.session.auth
+    cache_id = auth.get_cache_id()
+    auth_state = auth.get_auth_state()
+    cache = read_token_cache()
+    if cache_id is None or auth_state is None or cache.get(cache_id) == auth_state:
+        return
+    cache[cache_id] = auth_state
+    temp_file_name = "{0}.{1}.tmp".format(TOKEN_CACHE_FILE_NAME, os.getpid())
+    with os.fdopen(os.open(temp_file_name, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w") as cache_file:
+        json.dump(cache, cache_file)
+    os.replace(temp_file_name, TOKEN_CACHE_FILE_NAME)
+
+def read_token_cache():
+    try:
+        with open(TOKEN_CACHE_FILE_NAME) as cache_file:
+            return json.load(cache_file)
+    except (IOError, ValueError):
+        return {}
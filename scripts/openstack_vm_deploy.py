@@ -2,6 +2,10 @@
 
 """
 Provides ability to start a VM (with provided metadata), list available VMs and kill an existing VM.
+
+Listing VMs returns the list saved by the last listing if it is recent enough, without connecting to OpenStack.
+The list is kept recent by a background refresher ('refresh-list' action), which the list action starts when it
+is not running, and which stops once VMs were not listed for a while.
 """
 from __future__ import with_statement
 
@@ -10,9 +14,9 @@ import os
 import logging
 import subprocess
 import traceback
-# openstack source: https://github.com/openstack/openstacksdk/tree/master/openstack/network/v2
-import openstack
-from novaclient import client
+
+from openstack_common import find_resource, authenticate, publish_listed_servers, use_saved_server_list, \
+    invalidate_server_list, refresh_server_list, DEFAULT_SERVER_LIST_MAX_STALENESS, DEFAULT_SERVER_LIST_REFRESH_INTERVAL
 
 #####################################################
 # OpenStack parameters
@@ -28,9 +32,12 @@ OS_TENANT_NAME="HSC_CCM_PhenoTips"
 #####################################################
 
 # script parameters
-SERVER_LIST_FILE_NAME = "server_list.txt"
 DEFAULT_BRANCH_NAME = 'master'
 
+# the server list saved by the last listing, and the lock file of its background refresher (see openstack_common.py)
+SERVER_LIST_SNAPSHOT_FILE_NAME = "pc_server_list.snapshot"
+SERVER_LIST_REFRESHER_LOCK_FILE_NAME = "pc_server_list_refresher.lock"
+
 # list of supported projects, and repositories needed to build each project
 PROJECTS = { "PhenomeCentral": { "pn": "Patient Network",
                                  "rm": "Remote Matching",
@@ -41,6 +48,13 @@ PROJECTS = { "PhenomeCentral": { "pn": "Patient Network",
            }
 
 def script(settings):
+    if settings.action == 'list' and use_saved_server_list(settings):
+        sys.exit(0)
+
+    # openstack is imported only when needed, since importing it takes longer than returning a saved server list
+    # openstack source: https://github.com/openstack/openstacksdk/tree/master/openstack/network/v2
+    import openstack
+
     # Initialize and turn on debug openstack logging
     openstack.enable_logging(debug=True)
     logging.info("Initialize and turn on debug openstack logging")
@@ -49,10 +63,15 @@ def script(settings):
     credentials = get_credentials()
     logging.info("Got OpenStack credentials {0}".format(credentials))
     conn = openstack.connect(**credentials)
+    authenticate(conn)
     logging.info("Connected to OpenStack")
 
     if settings.action == 'list':
-        list_servers(conn)
+        publish_listed_servers(settings, conn, list_servers)
+        sys.exit(0)
+
+    if settings.action == 'refresh-list':
+        refresh_server_list(settings, conn, list_servers)
         sys.exit(0)
 
     if settings.action == 'deploy':
@@ -68,21 +87,25 @@ def script(settings):
             settings.build_name = "_".join(settings.branch_names.values())
             logging.info("Setting build name to {0}".format(settings.build_name))
 
-    # find if there already exists a VM with the build name
-    server = conn.compute.find_server(settings.build_name)
+    try:
+        # find if there already exists a VM with the build name
+        server = conn.compute.find_server(settings.build_name)
 
-    # if a VM with the same build name already exists - delete it
-    if server:
-        logging.info("Server for build %s exists, deleting server.........." % settings.build_name)
-        conn.compute.delete_server(server, ignore_missing=True, force=True)
-        conn.compute.wait_for_delete(server)
-        logging.info("Server %s deleted" % settings.build_name)
+        # if a VM with the same build name already exists - delete it
+        if server:
+            logging.info("Server for build %s exists, deleting server.........." % settings.build_name)
+            conn.compute.delete_server(server, ignore_missing=True, force=True)
+            conn.compute.wait_for_delete(server)
+            logging.info("Server %s deleted" % settings.build_name)
 
-    if settings.action == 'delete':
-        sys.exit(0)
+        if settings.action == 'delete':
+            sys.exit(0)
 
-    server = create_server(conn, settings)
-    add_floatingip(conn, server)
+        server = create_server(conn, settings)
+        add_floatingip(conn, server)
+    finally:
+        # the servers have changed: the next list action should not return the saved list
+        invalidate_server_list(settings)
 
 def add_floatingip(conn, server):
     logging.info("Assigning floating IPs..........")
@@ -95,18 +118,7 @@ def add_floatingip(conn, server):
         logging.info("-- FLOATING IP ASSOCIATED: {0}".format(fip))
 
 def create_server(conn, settings):
-    image = conn.compute.find_image(SNAPSHOT_NAME)
-    flavor = conn.compute.find_flavor(FLAVOR)
-    network = conn.network.find_network(NETWORK_NAME)
-    keypair = conn.compute.find_keypair(KEYPAIR_NAME)
-    sgroups = []
-    for group in SECURITY_GROUPS:
-        sgroup = conn.network.find_security_group(group)
-        if sgroup is not None:
-            sgroups.append({"name": sgroup.name})
-        else:
-            logging.error("Security group {0} not found".format(group))
-            # keep going, this is a minor error
+    resources = find_server_resources(conn, True)
 
     metadatau = {}
     metadatau['pr'] = settings.project
@@ -118,10 +130,15 @@ def create_server(conn, settings):
     logging.info("Creating a new VM..........")
 
     try:
-        server = conn.compute.create_server(
-            name=settings.build_name, image_id=image.id, flavor_id=flavor.id,
-            networks=[{"uuid": network.id}], security_groups=sgroups,
-            key_name=keypair.name, metadata=metadatau)
+        try:
+            server = start_server(conn, resources, settings.build_name, metadatau)
+        except Exception:
+            # the VM may have failed to be created because a cached ID is stale, e.g. the base image was re-created
+            current_resources = find_server_resources(conn, False)
+            if current_resources == resources:
+                raise
+            logging.info("Cached OpenStack resources were out of date, retrying with {0}".format(current_resources))
+            server = start_server(conn, current_resources, settings.build_name, metadatau)
 
         # Wait for a server to be in a status='ACTIVE'
         # interval - Number of seconds to wait before to consecutive checks. Default to 2.
@@ -137,6 +154,30 @@ def create_server(conn, settings):
             logging.info("-- VM with name {0} not found".format(settings.build_name))
         sys.exit(-3)
 
+# resolves the image, flavor, network, keypair and security groups used by all new VMs,
+# from the resource cache if use_cache is True
+def find_server_resources(conn, use_cache):
+    resources = {}
+    resources['image'] = find_resource(conn.compute.find_image, 'image', SNAPSHOT_NAME, ['id'], use_cache)
+    resources['flavor'] = find_resource(conn.compute.find_flavor, 'flavor', FLAVOR, ['id'], use_cache)
+    resources['network'] = find_resource(conn.network.find_network, 'network', NETWORK_NAME, ['id'], use_cache)
+    resources['keypair'] = find_resource(conn.compute.find_keypair, 'keypair', KEYPAIR_NAME, ['name'], use_cache)
+    resources['security_groups'] = []
+    for group in SECURITY_GROUPS:
+        sgroup = find_resource(conn.network.find_security_group, 'security_group', group, ['name'], use_cache)
+        if sgroup is not None:
+            resources['security_groups'].append({"name": sgroup['name']})
+        else:
+            logging.error("Security group {0} not found".format(group))
+            # keep going, this is a minor error
+    return resources
+
+def start_server(conn, resources, build_name, metadata):
+    return conn.compute.create_server(
+        name=build_name, image_id=resources['image']['id'], flavor_id=resources['flavor']['id'],
+        networks=[{"uuid": resources['network']['id']}], security_groups=resources['security_groups'],
+        key_name=resources['keypair']['name'], metadata=metadata)
+
 def list_servers(conn):
     # openstack server list
     servers_list = conn.compute.servers()
@@ -161,12 +202,9 @@ def list_servers(conn):
             ipf = "not assigned"
         data['servers'].append({'id' : server.id, 'name' : server.name, 'ip' : ipf, 'created' : server.created_at, 'status' : server.vm_state, 'metadata' : server.metadata})
 
-    # Get CPU and memory usage stats via nova
-    credentials = get_credentials()
-    credentials['version'] = 2
-    nova = client.Client(**credentials)
-    logging.info("Authorised with nova")
-    usage = nova.limits.get("HSC_CCM_PhenoTips").to_dict()
+    # Get CPU and memory usage stats from the compute API, with the same session (the same as the
+    # novaclient limits, including reserved resources)
+    usage = conn.compute.get('/limits?reserved=1').json()['limits']
     logging.info("Got usage info")
     logging.info(usage)
     data['usage'] = usage['absolute']
@@ -174,23 +212,22 @@ def list_servers(conn):
     data['usage']['maxTotalRAMSize'] = round(data['usage']['maxTotalRAMSize'] / 1024)
 
     # Add flavor required VCPUs number and RAM to spin one more server
-    flavor = conn.compute.find_flavor(FLAVOR)
-    flavor = nova.flavors.get(flavor.id)
-    data['usage']['requiredRAM'] = round(flavor.ram / 1024)
-    data['usage']['requiredCores'] = flavor.vcpus
-    data['usage']['requiredDisc'] = flavor.disk
+    flavor = find_resource(conn.compute.find_flavor, 'flavor', FLAVOR, ['id', 'ram', 'vcpus', 'disk'], True)
+    data['usage']['requiredRAM'] = round(flavor['ram'] / 1024)
+    data['usage']['requiredCores'] = flavor['vcpus']
+    data['usage']['requiredDisc'] = flavor['disk']
 
-    print(data, file=open(SERVER_LIST_FILE_NAME, "w"))
+    return data
 
 # Retrieves an un-associated floating ip if available (once that dont have Fixed IP Address), or allocates 1 from pool
 def get_floating_ip(conn):
-    kid_network = conn.network.find_network(KID_NETWORK_NAME)
     fip = conn.network.find_available_ip()
     if fip:
         logging.info('FLOATING IP: {0}'.format(fip))
     else:
         # Create Floating IP
-        fip = conn.network.create_ip(floating_network_id=kid_network.id)
+        kid_network = find_resource(conn.network.find_network, 'network', KID_NETWORK_NAME, ['id'], True)
+        fip = conn.network.create_ip(floating_network_id=kid_network['id'])
         logging.info("->CREATED FLOATING IP: {0}".format(fip))
     return fip
 
@@ -245,7 +282,7 @@ def parse_args(args):
     from argparse import ArgumentParser
     parser = ArgumentParser()
     parser.add_argument("--action", dest='action', required=True,
-                      help="action that user intented to do: kill a running VM ('delete'), get list of currently running VMs to the 'serever_list.txt' file ('list'), or spin a new one ('deploy')")
+                      help="action that user intented to do: kill a running VM ('delete'), get list of currently running VMs to the 'serever_list.txt' file ('list'), keep that list up to date in the background ('refresh-list'), or spin a new one ('deploy')")
 
     parser.add_argument("--project", dest='project',
                       default=None,
@@ -259,11 +296,25 @@ def parse_args(args):
                       default=DEFAULT_BRANCH_NAME,
                       help="custom build name (by default '{0}' or '[pn_branch_name]_[rm_branch_name]_[pc_branch_name]') if any of branch names provided)".format(DEFAULT_BRANCH_NAME))
 
+    parser.add_argument("--max-staleness", dest='max_staleness',
+                      type=int, default=DEFAULT_SERVER_LIST_MAX_STALENESS,
+                      help="when listing VMs, the maximum age in seconds of a saved list which can be returned instead of listing the VMs again (default: {0}, 0 to always list the VMs)".format(DEFAULT_SERVER_LIST_MAX_STALENESS))
+    parser.add_argument("--refresh-interval", dest='refresh_interval',
+                      type=int, default=DEFAULT_SERVER_LIST_REFRESH_INTERVAL,
+                      help="when listing VMs, the number of seconds between two listings of the background refresher (default: {0})".format(DEFAULT_SERVER_LIST_REFRESH_INTERVAL))
+
     args = parser.parse_args()
 
     if args.action == "deploy" and args.project is None:
         parser.error("Deploy actions requires a project to be selected")
 
+    if args.refresh_interval < 1:
+        parser.error("Refresh interval should be at least 1 second")
+
+    args.server_list_snapshot_file_name = SERVER_LIST_SNAPSHOT_FILE_NAME
+    args.server_list_refresher_lock_file_name = SERVER_LIST_REFRESHER_LOCK_FILE_NAME
+    args.server_list_refresher_args = []
+
     return args
 
 def main(args=sys.argv[1:]):
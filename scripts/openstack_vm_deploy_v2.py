@@ -2,6 +2,17 @@
 
 """
 Provides ability to start a VM (with provided metadata), list available VMs and kill an existing VM.
+
+Several VMs can be deployed at once (a "fleet"), either by repeating --build-name and --build-instructions-file
+or with a --fleet-file: all VMs are created at once, their status is checked together and floating IPs are
+assigned in parallel, so deploying a fleet takes about as long as deploying one VM.
+
+When deploying or deleting, the time each VM took to become ACTIVE or to be deleted is logged and saved
+to "openstack_<build name or fleet>_metrics.json".
+
+Listing VMs returns the list saved by the last listing if it is recent enough, without connecting to OpenStack.
+The list is kept recent by a background refresher ('refresh-list' action), which the list action starts when it
+is not running, and which stops once VMs were not listed for a while.
 """
 
 import sys
@@ -11,9 +22,12 @@ import subprocess
 import traceback
 import re
 import json
-# openstack source: https://github.com/openstack/openstacksdk/tree/master/openstack/network/v2
-import openstack
-from novaclient import client
+import time
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+from openstack_common import find_resource, authenticate, publish_listed_servers, use_saved_server_list, \
+    invalidate_server_list, refresh_server_list, DEFAULT_SERVER_LIST_MAX_STALENESS, DEFAULT_SERVER_LIST_REFRESH_INTERVAL
 
 #####################################################
 # OpenStack parameters
@@ -29,9 +43,32 @@ OS_TENANT_NAME="HSC_CCM_PhenoTips"
 #####################################################
 
 # script parameters
-SERVER_LIST_FILE_NAME = "server_list.txt"
+
+# the server list saved by the last listing, and the lock file of its background refresher (see openstack_common.py)
+SERVER_LIST_SNAPSHOT_FILE_NAME = "server_list.snapshot"
+SERVER_LIST_REFRESHER_LOCK_FILE_NAME = "server_list_refresher.lock"
+
+# server status checks: the status of all servers being started or deleted is checked with one request,
+# first after SERVER_STATUS_MIN_INTERVAL seconds, then at intervals SERVER_STATUS_BACKOFF times longer each time,
+# up to SERVER_STATUS_MAX_INTERVAL seconds; each interval is randomly shortened by up to SERVER_STATUS_JITTER of it,
+# so that deployments started at the same time do not check at the same time
+SERVER_STATUS_MIN_INTERVAL = 1
+SERVER_STATUS_MAX_INTERVAL = 15
+SERVER_STATUS_BACKOFF = 1.5
+SERVER_STATUS_JITTER = 0.5
+SERVER_START_TIMEOUT = 1200
+SERVER_DELETE_TIMEOUT = 600
+# assigning floating IPs runs the openstack client, once for each server
+MAX_FLOATING_IP_WORKERS = 10
 
 def perform_action(settings):
+    if settings.action == 'list' and use_saved_server_list(settings):
+        sys.exit(0)
+
+    # openstack is imported only when needed, since importing it takes longer than returning a saved server list
+    # openstack source: https://github.com/openstack/openstacksdk/tree/master/openstack/network/v2
+    import openstack
+
     # Initialize and turn on debug openstack logging
     openstack.enable_logging(debug=True)
     logging.info("Initialize and turn on debug openstack logging")
@@ -40,97 +77,229 @@ def perform_action(settings):
     credentials = get_credentials()
     logging.info("Got OpenStack credentials {0}".format(credentials))
     conn = openstack.connect(**credentials)
+    authenticate(conn)
     logging.info("Connected to OpenStack")
 
     if settings.action == 'list':
-        list_servers(conn)
+        publish_listed_servers(settings, conn, list_servers)
         sys.exit(0)
 
+    if settings.action == 'refresh-list':
+        refresh_server_list(settings, conn, list_servers)
+        return
+
     if settings.action == 'deploy':
-        if settings.build_name == "":
+        if "" in settings.build_names:
             logging.info("Can't deploy a new VM: no build name is provided")
             sys.exit(-2)
 
-    # find if there already exists a VM with the build name
-    server = conn.compute.find_server(settings.build_name)
-
-    # if a VM with the same build name already exists - delete it
-    if server:
-        logging.info("Server for build %s exists, deleting server.........." % settings.build_name)
-        conn.compute.delete_server(server, ignore_missing=True, force=True)
-        conn.compute.wait_for_delete(server)
-        logging.info("Server %s deleted" % settings.build_name)
-
-    if settings.action == 'delete':
-        return
-
-    if settings.action == 'deploy':
-        server = create_server(conn, settings)
-        add_floatingip(conn, server)
+    if settings.action in ['delete', 'deploy']:
+        metrics = {'action': settings.action, 'servers': {}, 'status_checks': {}}
+        try:
+            # if VMs with the same build names already exist - delete them
+            if not delete_servers(conn, settings.build_names, metrics):
+                sys.exit(-5)
+
+            if settings.action == 'deploy':
+                deploy_servers(conn, settings.builds, metrics)
+        finally:
+            write_metrics(settings, metrics)
+            # the servers have changed: the next list action should not return the saved list
+            invalidate_server_list(settings)
         return
 
     logging.error('Error: unsuported action {0}'.format(settings.action))
     sys.exit(-2)
 
-def add_floatingip(conn, server):
-    logging.info("Assigning floating IPs..........")
-    fip = get_floating_ip(conn)
-    retcode = subprocess.call(['openstack', 'server', 'add', 'floating', 'ip', server.name, fip.floating_ip_address])
-    if retcode != 0:
-        logging.error('Error: assiging floating_ip_address {0} failed'.format(fip.floating_ip_address))
+# deletes the servers with the given build names, if they exist, and waits until all of them are deleted;
+# returns False if some of them could not be deleted in SERVER_DELETE_TIMEOUT seconds
+def delete_servers(conn, build_names, metrics):
+    servers = []
+    start_times = {}
+    for build_name in build_names:
+        server = conn.compute.find_server(build_name)
+        if server:
+            logging.info("Server for build %s exists, deleting server.........." % build_name)
+            conn.compute.delete_server(server, ignore_missing=True, force=True)
+            servers.append(server)
+            start_times[server.id] = time.time()
+
+    deleted_servers, remaining_servers, wait_times, status_checks = \
+        wait_for_servers(conn.compute, servers, start_times, None, SERVER_DELETE_TIMEOUT)
+    metrics['status_checks']['delete'] = status_checks
+    for server in deleted_servers:
+        logging.info("Server %s deleted in %.1fs" % (server.name, wait_times[server.id]))
+        metrics['servers'].setdefault(server.name, {})['time_to_deleted'] = round(wait_times[server.id], 1)
+    for server in remaining_servers:
+        logging.error("Error: server {0} was not deleted, status: {1}".format(server.name, server.status))
+    return len(remaining_servers) == 0
+
+# creates the servers for all the (build name, build instructions) pairs at once, waits until all of them
+# are ACTIVE, then assigns them floating IPs in parallel
+def deploy_servers(conn, builds, metrics):
+    resources = find_server_resources(conn, True)
+    resources_cached = True
+
+    servers = []
+    start_times = {}
+    failed_builds = []
+    for build_name, build_instructions in builds:
+        server = create_server(conn, resources, build_name, build_instructions)
+        if server is None and resources_cached:
+            # the VM may have failed to be created because a cached ID is stale, e.g. the base image was re-created
+            resources_cached = False
+            current_resources = find_server_resources(conn, False)
+            if current_resources != resources:
+                logging.info("Cached OpenStack resources were out of date, retrying with {0}".format(current_resources))
+                resources = current_resources
+                server = create_server(conn, resources, build_name, build_instructions)
+        if server is not None:
+            servers.append(server)
+            start_times[server.id] = time.time()
+        else:
+            failed_builds.append(build_name)
+
+    active_servers, failed_servers, wait_times, status_checks = \
+        wait_for_servers(conn.compute, servers, start_times, 'ACTIVE', SERVER_START_TIMEOUT)
+    metrics['status_checks']['start'] = status_checks
+    for server in active_servers:
+        logging.info("-- VM {0} is ACTIVE after {1:.1f}s".format(server.name, wait_times[server.id]))
+        metrics['servers'].setdefault(server.name, {})['time_to_active'] = round(wait_times[server.id], 1)
+    for server in failed_servers:
+        logging.info("-- FAILED TO START A VM {0} (timeout?)".format(server.name))
+        logging.info("-- STATUS: {0}".format(server.status))
+        failed_builds.append(server.name)
+
+    failed_floating_ips = add_floatingips(conn, active_servers)
+
+    if len(builds) > 1:
+        logging.info("->Deployed {0} of {1} VMs".format(len(active_servers) - len(failed_floating_ips), len(builds)))
+    if failed_builds:
+        logging.error("Error: VMs failed to start: {0}".format(str(failed_builds)))
+        sys.exit(-3)
+    if failed_floating_ips:
         sys.exit(-4)
-    else:
-        logging.info("-- FLOATING IP ASSOCIATED: {0}".format(fip))
-
-def create_server(conn, settings):
-    image = conn.compute.find_image(SNAPSHOT_NAME)
-    flavor = conn.compute.find_flavor(FLAVOR)
-    network = conn.network.find_network(NETWORK_NAME)
-    keypair = conn.compute.find_keypair(KEYPAIR_NAME)
-    sgroups = []
+
+# checks the status of all the servers with one request (compute is the OpenStack compute API, or anything else
+# with a servers() method listing all servers) at intervals given by get_status_check_intervals, until all of them
+# have the given status (or, if status is None, are deleted) or timeout seconds have passed.
+# Returns the list of the servers which reached the status, the list of those which did not (with their last known
+# status), the seconds each server took to reach the status since its start time and the number of status checks
+def wait_for_servers(compute, servers, start_times, status, timeout, clock=time.time, sleep=time.sleep):
+    done_servers = []
+    failed_servers = []
+    pending_servers = list(servers)
+    wait_times = {}
+    status_checks = 0
+    intervals = get_status_check_intervals()
+    deadline = clock() + timeout
+    while pending_servers and clock() < deadline:
+        sleep(min(next(intervals), max(deadline - clock(), 0)))
+
+        current_servers = {}
+        for server in compute.servers():
+            current_servers[server.id] = server
+        status_checks += 1
+        check_time = clock()
+
+        still_pending_servers = []
+        for server in pending_servers:
+            current_server = current_servers.get(server.id)
+            if current_server is None:
+                if status is None:
+                    done_servers.append(server)
+                    wait_times[server.id] = check_time - start_times[server.id]
+                else:
+                    logging.error("Error: server {0} does not exist anymore".format(server.name))
+                    server.status = 'DELETED'
+                    failed_servers.append(server)
+            elif current_server.status == status:
+                done_servers.append(current_server)
+                wait_times[server.id] = check_time - start_times[server.id]
+            elif current_server.status == 'ERROR' and status is not None:
+                logging.error("Error: server {0} is in ERROR status".format(current_server.name))
+                failed_servers.append(current_server)
+            else:
+                still_pending_servers.append(current_server)
+        pending_servers = still_pending_servers
+    return done_servers, failed_servers + pending_servers, wait_times, status_checks
+
+# exponential backoff with jitter: servers are checked often at first, since deleting takes seconds,
+# and less and less often while they take longer
+def get_status_check_intervals():
+    interval = SERVER_STATUS_MIN_INTERVAL
+    while True:
+        yield interval * (1 - SERVER_STATUS_JITTER * random.random())
+        interval = min(interval * SERVER_STATUS_BACKOFF, SERVER_STATUS_MAX_INTERVAL)
+
+def write_metrics(settings, metrics):
+    with open(settings.metrics_file, "w") as metrics_file:
+        json.dump(metrics, metrics_file, indent=2, sort_keys=True)
+    logging.info("Saved metrics to {0}".format(settings.metrics_file))
+
+# assigns a floating IP to each of the servers in parallel; returns the names of the servers which did not get one
+def add_floatingips(conn, servers):
+    if not servers:
+        return []
+    logging.info("Assigning floating IPs..........")
+    fips = get_floating_ips(conn, len(servers))
+    failed_servers = []
+    with ThreadPoolExecutor(max_workers=min(len(servers), MAX_FLOATING_IP_WORKERS)) as executor:
+        retcodes = list(executor.map(add_floatingip, servers, fips))
+    for server, fip, retcode in zip(servers, fips, retcodes):
+        if retcode != 0:
+            logging.error('Error: assiging floating_ip_address {0} to {1} failed'.format(fip.floating_ip_address, server.name))
+            failed_servers.append(server.name)
+        else:
+            logging.info("-- FLOATING IP ASSOCIATED TO {0}: {1}".format(server.name, fip))
+    return failed_servers
+
+def add_floatingip(server, fip):
+    return subprocess.call(['openstack', 'server', 'add', 'floating', 'ip', server.name, fip.floating_ip_address])
+
+# resolves the image, flavor, network, keypair and security groups used by all new VMs,
+# from the resource cache if use_cache is True
+def find_server_resources(conn, use_cache):
+    resources = {}
+    resources['image'] = find_resource(conn.compute.find_image, 'image', SNAPSHOT_NAME, ['id'], use_cache)
+    resources['flavor'] = find_resource(conn.compute.find_flavor, 'flavor', FLAVOR, ['id'], use_cache)
+    resources['network'] = find_resource(conn.network.find_network, 'network', NETWORK_NAME, ['id'], use_cache)
+    resources['keypair'] = find_resource(conn.compute.find_keypair, 'keypair', KEYPAIR_NAME, ['name'], use_cache)
+    resources['security_groups'] = []
     for group in SECURITY_GROUPS:
-        sgroup = conn.network.find_security_group(group)
+        sgroup = find_resource(conn.network.find_security_group, 'security_group', group, ['name'], use_cache)
         if sgroup is not None:
-            sgroups.append({"name": sgroup.name})
+            resources['security_groups'].append({"name": sgroup['name']})
         else:
             logging.error("Security group {0} not found".format(group))
             # keep going, this is a minor error
+    return resources
 
+# starts creating a VM, without waiting for it to be ACTIVE; returns None if the VM could not be created
+def create_server(conn, resources, build_name, build_instructions):
     metadatau = {}
-    metadatau['build_name'] = settings.build_name
+    metadatau['build_name'] = build_name
 
     # openstack VM metadata can't be longer than 256 characters.
     # ...so the solution is to split instructions into chunks
-    instructions_chunks = [settings.build_instructions[i:i+254] for i in range(0, len(settings.build_instructions), 254)]
+    instructions_chunks = [build_instructions[i:i+254] for i in range(0, len(build_instructions), 254)]
 
     metadatau['build_instructions_num_chunks'] = str(len(instructions_chunks))
     for i, chunk in enumerate(instructions_chunks):
         metadatau['build_instructions_'+str(i)] = chunk
 
-    logging.info("Setting VM metadata to {0}".format(str(metadatau)))
-    logging.info("Creating a new VM..........")
+    logging.info("Setting VM {0} metadata to {1}".format(build_name, str(metadatau)))
+    logging.info("Creating a new VM {0}..........".format(build_name))
 
     try:
-        server = conn.compute.create_server(
-            name=settings.build_name, image_id=image.id, flavor_id=flavor.id,
-            networks=[{"uuid": network.id}], security_groups=sgroups,
-            key_name=keypair.name, metadata=metadatau)
-
-        # Wait for a server to be in a status='ACTIVE'
-        # interval - Number of seconds to wait before to consecutive checks. Default to 2.
-        # wait - Maximum number of seconds to wait before the change. Default to 120.
-        server = conn.compute.wait_for_server(server, interval=30, wait=1200)
-        return server
-    except:
-        logging.info("-- FAILED TO START A VM (timeout?)")
-        #logging.info("Exception info: ", sys.exc_info()[1])
-
-        server = conn.compute.find_server(settings.build_name)
-        if server:
-            logging.info("-- STATUS: {0}".format(server.status))
-        else:
-            logging.info("-- VM with name {0} not found".format(settings.build_name))
-        sys.exit(-3)
+        return conn.compute.create_server(
+            name=build_name, image_id=resources['image']['id'], flavor_id=resources['flavor']['id'],
+            networks=[{"uuid": resources['network']['id']}], security_groups=resources['security_groups'],
+            key_name=resources['keypair']['name'], metadata=metadatau)
+    except Exception:
+        logging.info("-- FAILED TO START A VM {0}".format(build_name))
+        logging.info("Exception info: {0}".format(sys.exc_info()[1]))
+        return None
 
 def merge_build_instruction_chunks(raw_metadata):
     if "build_instructions_num_chunks" not in raw_metadata:
@@ -177,12 +346,9 @@ def list_servers(conn):
 
         data['servers'].append({'id' : server.id, 'name' : server.name, 'ip' : ipf, 'created' : server.created_at, 'status' : server.vm_state, 'metadata' : metadata})
 
-    # Get CPU and memory usage stats via nova
-    credentials = get_credentials()
-    credentials['version'] = 2
-    nova = client.Client(**credentials)
-    logging.info("Authorised with nova")
-    usage = nova.limits.get("HSC_CCM_PhenoTips").to_dict()
+    # Get CPU and memory usage stats from the compute API, with the same session (the same as the
+    # novaclient limits, including reserved resources)
+    usage = conn.compute.get('/limits?reserved=1').json()['limits']
     logging.info("Got usage info")
     logging.info(usage)
     data['usage'] = usage['absolute']
@@ -190,25 +356,29 @@ def list_servers(conn):
     data['usage']['maxTotalRAMSize'] = round(data['usage']['maxTotalRAMSize'] / 1024)
 
     # Add flavor required VCPUs number and RAM to spin one more server
-    flavor = conn.compute.find_flavor(FLAVOR)
-    flavor = nova.flavors.get(flavor.id)
-    data['usage']['requiredRAM'] = round(flavor.ram / 1024)
-    data['usage']['requiredCores'] = flavor.vcpus
-    data['usage']['requiredDisc'] = flavor.disk
-
-    print(data, file=open(SERVER_LIST_FILE_NAME, "w"))
-
-# Retrieves an un-associated floating ip if available (once that dont have Fixed IP Address), or allocates 1 from pool
-def get_floating_ip(conn):
-    kid_network = conn.network.find_network(KID_NETWORK_NAME)
-    fip = conn.network.find_available_ip()
-    if fip:
+    flavor = find_resource(conn.compute.find_flavor, 'flavor', FLAVOR, ['id', 'ram', 'vcpus', 'disk'], True)
+    data['usage']['requiredRAM'] = round(flavor['ram'] / 1024)
+    data['usage']['requiredCores'] = flavor['vcpus']
+    data['usage']['requiredDisc'] = flavor['disk']
+
+    return data
+
+# Retrieves count un-associated floating ips if available (ones that dont have Fixed IP Address), and allocates the rest from pool
+def get_floating_ips(conn, count):
+    fips = []
+    for fip in conn.network.ips(port_id=''):
+        if len(fips) == count:
+            break
         logging.info('FLOATING IP: {0}'.format(fip))
-    else:
-        # Create Floating IP
-        fip = conn.network.create_ip(floating_network_id=kid_network.id)
-        logging.info("->CREATED FLOATING IP: {0}".format(fip))
-    return fip
+        fips.append(fip)
+    if len(fips) < count:
+        kid_network = find_resource(conn.network.find_network, 'network', KID_NETWORK_NAME, ['id'], True)
+        while len(fips) < count:
+            # Create Floating IP
+            fip = conn.network.create_ip(floating_network_id=kid_network['id'])
+            logging.info("->CREATED FLOATING IP: {0}".format(fip))
+            fips.append(fip)
+    return fips
 
 # get credentials from Environment Variables set by running HSC_CCM_PhenoTips-openrc.sh
 def get_credentials():
@@ -232,10 +402,11 @@ def setup_logfile(settings):
         logname = settings.action
         web_accessible_log_file = None
     else:
-        logname = settings.build_name
+        logname = settings.build_name if len(settings.builds) == 1 else 'fleet'
         web_accessible_log_file = os.path.join(settings.log_folder, 'latest_deploy_v2.log')
 
     main_log_file = 'openstack_{0}.log'.format(logname)
+    settings.metrics_file = 'openstack_{0}_metrics.json'.format(logname)
 
     format_string = '%(levelname)s: %(asctime)s: %(message)s'
 
@@ -280,15 +451,27 @@ def parse_args(args):
     from argparse import ArgumentParser
     parser = ArgumentParser()
     parser.add_argument("--action", dest='action', required=True,
-                      help="action that user intented to do: kill a running VM ('delete'), get list of currently running VMs to the 'serever_list.txt' file ('list'), or spin a new one ('deploy') (REQUIRED)")
+                      help="action that user intented to do: kill a running VM ('delete'), get list of currently running VMs to the 'serever_list.txt' file ('list'), keep that list up to date in the background ('refresh-list'), or spin a new one ('deploy') (REQUIRED)")
 
-    parser.add_argument("--build-name", dest='build_name',
-                      default=None,
-                      help="build name, the name given to the VM which can be used to manipulate the VM (list, get properties, delete, etc.)")
+    parser.add_argument("--build-name", dest='build_names',
+                      action="append", default=[],
+                      help="build name, the name given to the VM which can be used to manipulate the VM (list, get properties, delete, etc.); can be used multiple times to deploy or delete several VMs")
 
-    parser.add_argument("--build-instructions-file", dest='build_instructions_file',
+    parser.add_argument("--build-instructions-file", dest='build_instructions_files',
+                      action="append", default=[],
+                      help="a name of a JSON file containing deploy instrctions to be executed inside the newly created VM; when deploying several VMs, one for each --build-name, in the same order")
+
+    parser.add_argument("--fleet-file", dest='fleet_file',
                       default=None,
-                      help="a name of a JSON file containing deploy instrctions to be executed inside the newly created VM")
+                      help="a name of a JSON file listing VMs to deploy or delete, as [{\"build_name\": ..., \"build_instructions_file\": ...}, ...] (instructions files are relative to the fleet file)")
+
+    parser.add_argument("--max-staleness", dest='max_staleness',
+                      type=int, default=DEFAULT_SERVER_LIST_MAX_STALENESS,
+                      help="when listing VMs, the maximum age in seconds of a saved list which can be returned instead of listing the VMs again (default: {0}, 0 to always list the VMs)".format(DEFAULT_SERVER_LIST_MAX_STALENESS))
+
+    parser.add_argument("--refresh-interval", dest='refresh_interval',
+                      type=int, default=DEFAULT_SERVER_LIST_REFRESH_INTERVAL,
+                      help="when listing VMs, the number of seconds between two listings of the background refresher (default: {0})".format(DEFAULT_SERVER_LIST_REFRESH_INTERVAL))
 
     parser.add_argument("--log-folder", dest='log_folder',
                       default="",
@@ -296,16 +479,34 @@ def parse_args(args):
 
     args = parser.parse_args()
 
+    if args.fleet_file is not None:
+        fleet_folder = os.path.dirname(args.fleet_file)
+        with open(args.fleet_file) as fleet_file:
+            for build in json.load(fleet_file):
+                args.build_names.append(build["build_name"])
+                if "build_instructions_file" in build:
+                    args.build_instructions_files.append(os.path.join(fleet_folder, build["build_instructions_file"]))
+
     if args.action == "deploy" or args.action == "delete":
-        if args.build_name is None:
+        if not args.build_names:
             parser.error("Delete and deploy actions requires build name to be provided")
+        if len(set(args.build_names)) != len(args.build_names):
+            parser.error("Build names should be unique")
 
     if args.action == "deploy":
-        if args.build_instructions_file is None:
-            parser.error("Deploy actions requires build instructions to be provided")
+        if len(args.build_instructions_files) != len(args.build_names):
+            parser.error("Deploy actions requires build instructions to be provided for each build name")
+
+    if args.refresh_interval < 1:
+        parser.error("Refresh interval should be at least 1 second")
+
+    args.server_list_snapshot_file_name = SERVER_LIST_SNAPSHOT_FILE_NAME
+    args.server_list_refresher_lock_file_name = SERVER_LIST_REFRESHER_LOCK_FILE_NAME
+    args.server_list_refresher_args = ["--log-folder", args.log_folder]
 
-    if args.build_instructions_file is not None:
-        args.build_instructions = read_instructions_file(args.build_instructions_file)
+    args.build_name = args.build_names[0] if args.build_names else None
+    args.builds = [(build_name, read_instructions_file(build_instructions_file))
+                   for build_name, build_instructions_file in zip(args.build_names, args.build_instructions_files)]
 
     return args
 
@@ -12,10 +12,12 @@ import os
 import subprocess
 import logging
 import shutil
+import socket
 import time
 import json
 import platform
 import traceback
+from urllib.parse import urlparse
 from git import Repo
 from argparse import ArgumentParser
 from argparse import RawTextHelpFormatter
@@ -47,6 +49,8 @@ DEFAULT_BUILD_NAME = DEFAULT_BRANCH_NAME
 
 PARENT_PHENOTIPS_GIT_URL = 'https://github.com/phenotips/'
 TRIGGER_INITIALIZATION_UTL = 'http://localhost:8080'
+SERVER_STARTUP_TIMEOUT = 600
+SERVER_STARTUP_MAX_POLL_INTERVAL = 10
 
 DEPLOYMENT_TOOLS_REPOSITORY_NAME = 'deployment-tools'
 DEPLOYMENT_BRANCH_NAME = 'master'
@@ -170,7 +174,7 @@ def start_instance(settings):
     logging.info('<------{0} STARTED------>'.format(settings.project))
 
     # wait until web server initializes and starts listening to the incoming connections
-    time.sleep(30)
+    wait_for_server_port(TRIGGER_INITIALIZATION_UTL)
 
     logging.info('Sending first request to start {0} initialization process...'.format(settings.project))
 
@@ -183,6 +187,27 @@ def start_instance(settings):
     p.wait()
 
 
+# polls the port of the given URL with exponential backoff until it accepts connections
+def wait_for_server_port(url):
+    address = urlparse(url)
+    port = address.port if address.port is not None else 80
+
+    start_time = time.time()
+    interval = 0.5
+    while True:
+        try:
+            socket.create_connection((address.hostname, port), timeout=SERVER_STARTUP_MAX_POLL_INTERVAL).close()
+            logging.info('Web server is listening on port {0} after {1:.1f} seconds'.format(port, time.time() - start_time))
+            return
+        except socket.error:
+            pass
+        if time.time() - start_time > SERVER_STARTUP_TIMEOUT:
+            logging.error('Web server is not listening on port {0} after {1} seconds, trying to proceed anyway'.format(port, SERVER_STARTUP_TIMEOUT))
+            return
+        time.sleep(interval)
+        interval = min(interval * 2, SERVER_STARTUP_MAX_POLL_INTERVAL)
+
+
 def read_vm_metadata():
     # Fetch server metadata (to be used as default values for script parameters)
     response = subprocess.Popen(['curl', '-s', VM_METADATA_URL], stdout=subprocess.PIPE)
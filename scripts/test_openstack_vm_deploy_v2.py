@@ -0,0 +1,155 @@
+#!/usr/bin/env python3.6
+
+"""
+Tests of the server status checks of openstack_vm_deploy_v2.py, with a fake clock and a fake compute API.
+
+Run from the scripts folder with `python3 -m unittest test_openstack_vm_deploy_v2`.
+"""
+
+import unittest
+
+import openstack_vm_deploy_v2 as deploy
+
+START_TIME = 1000.0
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = START_TIME
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        assert seconds >= 0
+        self.now += seconds
+
+class FakeServer(object):
+    def __init__(self, server_id, name, status):
+        self.id = server_id
+        self.name = name
+        self.status = status
+
+# the compute API of a cloud where each server has a status timeline: a list of (time, status) pairs, sorted
+# by time; a None status means the server is deleted from that time on
+class FakeCompute(object):
+    def __init__(self, clock, timelines):
+        self.clock = clock
+        self.timelines = timelines
+        self.check_times = []
+
+    def servers(self):
+        self.check_times.append(self.clock.now)
+        servers = []
+        for server_id, timeline in sorted(self.timelines.items()):
+            status = None
+            for change_time, change_status in timeline:
+                if change_time <= self.clock.now:
+                    status = change_status
+            if status is not None:
+                servers.append(FakeServer(server_id, 'build_' + server_id, status))
+        return iter(servers)
+
+class WaitForServersTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def wait_for_servers(self, timelines, status, timeout):
+        self.compute = FakeCompute(self.clock, timelines)
+        servers = [FakeServer(server_id, 'build_' + server_id, 'BUILD') for server_id in sorted(timelines)]
+        start_times = dict((server.id, START_TIME) for server in servers)
+        return deploy.wait_for_servers(self.compute, servers, start_times, status, timeout,
+                                       clock=self.clock.time, sleep=self.clock.sleep)
+
+    def test_active_detection_lag(self):
+        timelines = {'a': [(START_TIME, 'BUILD'), (START_TIME + 2, 'ACTIVE')],
+                     'b': [(START_TIME, 'BUILD'), (START_TIME + 95, 'ACTIVE')]}
+        done, failed, wait_times, status_checks = self.wait_for_servers(timelines, 'ACTIVE', 1200)
+
+        self.assertEqual(['a', 'b'], sorted(server.id for server in done))
+        self.assertEqual([], failed)
+        self.assertEqual(len(self.compute.check_times), status_checks)
+        # detected at the first check after becoming ACTIVE, at most one (backed off) interval later
+        self.assertGreaterEqual(wait_times['a'], 2)
+        self.assertLess(wait_times['a'], 2 + deploy.SERVER_STATUS_MIN_INTERVAL * deploy.SERVER_STATUS_BACKOFF ** 2)
+        self.assertGreaterEqual(wait_times['b'], 95)
+        self.assertLess(wait_times['b'], 95 + deploy.SERVER_STATUS_MAX_INTERVAL)
+        # checking stops as soon as all servers are ACTIVE
+        self.assertEqual(START_TIME + wait_times['b'], self.compute.check_times[-1])
+
+    def test_check_intervals_back_off(self):
+        timelines = {'a': [(START_TIME, 'BUILD')]}
+        self.wait_for_servers(timelines, 'ACTIVE', 600)
+
+        check_times = [START_TIME] + self.compute.check_times
+        intervals = [later - earlier for earlier, later in zip(check_times, check_times[1:])]
+        for index, interval in enumerate(intervals):
+            backed_off_interval = min(deploy.SERVER_STATUS_MIN_INTERVAL * deploy.SERVER_STATUS_BACKOFF ** index,
+                                      deploy.SERVER_STATUS_MAX_INTERVAL)
+            self.assertLessEqual(interval, backed_off_interval + 1e-9)
+            # the last interval is shortened to end at the timeout
+            if index < len(intervals) - 1:
+                self.assertGreaterEqual(interval, backed_off_interval * (1 - deploy.SERVER_STATUS_JITTER) - 1e-9)
+
+    def test_stops_at_timeout(self):
+        timelines = {'a': [(START_TIME, 'BUILD')],
+                     'b': [(START_TIME, 'BUILD'), (START_TIME + 10, 'ACTIVE')]}
+        done, failed, wait_times, status_checks = self.wait_for_servers(timelines, 'ACTIVE', 100)
+
+        self.assertEqual(['b'], [server.id for server in done])
+        self.assertEqual(['a'], [server.id for server in failed])
+        self.assertEqual('BUILD', failed[0].status)
+        self.assertNotIn('a', wait_times)
+        # the last check is exactly at the timeout, not up to an interval after it
+        self.assertAlmostEqual(START_TIME + 100, self.clock.now, places=6)
+        self.assertAlmostEqual(START_TIME + 100, self.compute.check_times[-1], places=6)
+        self.assertEqual(len(self.compute.check_times), status_checks)
+
+    def test_error_status(self):
+        timelines = {'a': [(START_TIME, 'BUILD'), (START_TIME + 5, 'ERROR')],
+                     'b': [(START_TIME, 'BUILD'), (START_TIME + 30, 'ACTIVE')]}
+        done, failed, wait_times, status_checks = self.wait_for_servers(timelines, 'ACTIVE', 1200)
+
+        # a server in ERROR does not stop waiting for the other servers
+        self.assertEqual(['b'], [server.id for server in done])
+        self.assertEqual(['a'], [server.id for server in failed])
+        self.assertEqual('ERROR', failed[0].status)
+        self.assertLess(self.clock.now, START_TIME + 30 + deploy.SERVER_STATUS_MAX_INTERVAL)
+
+    def test_vanished_server(self):
+        timelines = {'a': [(START_TIME, 'BUILD'), (START_TIME + 5, None)],
+                     'b': [(START_TIME, 'BUILD'), (START_TIME + 30, 'ACTIVE')]}
+        done, failed, wait_times, status_checks = self.wait_for_servers(timelines, 'ACTIVE', 1200)
+
+        self.assertEqual(['b'], [server.id for server in done])
+        self.assertEqual(['a'], [server.id for server in failed])
+        self.assertEqual('DELETED', failed[0].status)
+        self.assertNotIn('a', wait_times)
+
+    def test_delete(self):
+        timelines = {'a': [(START_TIME, 'ACTIVE'), (START_TIME + 3, None)],
+                     'b': [(START_TIME, 'ACTIVE'), (START_TIME + 4, 'ERROR'), (START_TIME + 8, None)]}
+        done, failed, wait_times, status_checks = self.wait_for_servers(timelines, None, 600)
+
+        # when deleting, servers are done once they disappear, even if they went through ERROR
+        self.assertEqual(['a', 'b'], sorted(server.id for server in done))
+        self.assertEqual([], failed)
+        self.assertGreaterEqual(wait_times['a'], 3)
+        self.assertGreaterEqual(wait_times['b'], 8)
+        self.assertLess(wait_times['b'], 8 + deploy.SERVER_STATUS_MAX_INTERVAL)
+
+    def test_delete_timeout(self):
+        timelines = {'a': [(START_TIME, 'ACTIVE')]}
+        done, failed, wait_times, status_checks = self.wait_for_servers(timelines, None, 60)
+
+        self.assertEqual([], done)
+        self.assertEqual(['a'], [server.id for server in failed])
+        self.assertAlmostEqual(START_TIME + 60, self.clock.now, places=6)
+
+    def test_no_servers(self):
+        done, failed, wait_times, status_checks = self.wait_for_servers({}, 'ACTIVE', 1200)
+
+        self.assertEqual(([], [], {}, 0), (done, failed, wait_times, status_checks))
+        self.assertEqual(START_TIME, self.clock.now)
+
+if __name__ == '__main__':
+    unittest.main()